@@ -19,7 +19,8 @@ Riak objects, run Javascript (and Erlang) based Map/Reduce
 operations, and run Linkwalking operations.
 """
 
-from riak.riak_error import RiakError, ConflictError, ListError
+from riak.riak_error import RiakError, ConflictError, ListError, \
+    PoolExhausted
 from riak.client import RiakClient
 from riak.bucket import RiakBucket, BucketType
 from riak.table import Table
@@ -31,6 +32,7 @@ from riak.mapreduce import RiakKeyFilter, RiakMapReduce, RiakLink
 __all__ = ['RiakBucket', 'Table', 'BucketType', 'RiakNode',
            'RiakObject', 'RiakClient', 'RiakMapReduce', 'RiakKeyFilter',
            'RiakLink', 'RiakError', 'ConflictError', 'ListError',
+           'PoolExhausted',
            'ONE', 'ALL', 'QUORUM', 'key_filter',
            'disable_list_exceptions']
 
@@ -0,0 +1,75 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compares writing PB frames by joining the header and body (as
+# TcpConnection did before) with writing them via sendmsg. Needs no
+# Riak node: frames are written to one end of a socket pair and
+# drained from the other by a thread. Requires Python 3.
+
+import os
+import socket
+import threading
+
+import riak.benchmark as benchmark
+
+from riak.pb.messages import MSG_CODE_PUT_REQ
+from riak.transports.tcp.connection import TcpConnection
+
+sizes = [('1KB', 1024), ('64KB', 65536), ('1MB', 1048576)]
+total = 256 * 1048576
+
+writer, reader = socket.socketpair()
+
+
+def drain():
+    buf = bytearray(1048576)
+    while reader.recv_into(buf):
+        pass
+
+
+drainer = threading.Thread(target=drain)
+drainer.daemon = True
+drainer.start()
+
+conn = TcpConnection()
+conn._socket = writer
+
+print("Benchmarking frame writes:")
+print("    Frames: {0} of data per size".format(total))
+print()
+for label, size in sizes:
+    print("{0:>5s} frames: joining copies {1} bytes per frame, "
+          "sendmsg copies none".format(label, size))
+print()
+
+for b in benchmark.measure_with_rehearsal():
+    for label, size in sizes:
+        data = os.urandom(size)
+        count = total // size
+        with b.report('join ' + label):
+            for _ in range(count):
+                conn._non_connect_sendall(
+                    conn._encode_msg(MSG_CODE_PUT_REQ, data))
+        with b.report('sendmsg ' + label):
+            for _ in range(count):
+                conn._non_connect_send_msg(MSG_CODE_PUT_REQ, data)
+        msgs = [(MSG_CODE_PUT_REQ, data)] * 16
+        with b.report('batch ' + label):
+            for _ in range(count // 16):
+                buffers = []
+                for msg_code, body in msgs:
+                    buffers.extend(conn._frame_buffers(msg_code, body))
+                conn._non_connect_send_buffers(buffers)
+
+writer.close()
@@ -69,6 +69,8 @@ class RiakBucket(object):
         self._encoders = {}
         self._decoders = {}
         self._resolver = None
+        self._retry_policy = None
+        self._object_cache = None
 
     def __hash__(self):
         return hash((self.bucket_type.name, self.name, self._client))
@@ -192,12 +194,16 @@ class RiakBucket(object):
         return obj
 
     def get(self, key, r=None, pr=None, timeout=None, include_context=None,
-            basic_quorum=None, notfound_ok=None, head_only=False):
+            basic_quorum=None, notfound_ok=None, head_only=False,
+            hedge=None, retry_policy=None):
         """
         Retrieve a :class:`~riak.riak_object.RiakObject` or
         :class:`~riak.datatypes.Datatype`, based on the presence and value
         of the :attr:`datatype <BucketType.datatype>` bucket property.
 
+        Objects are read through the :attr:`object_cache`, if one is
+        set, unless ``head_only`` is given.
+
         :param key: Name of the key.
         :type key: string
         :param r: R-Value of the request (defaults to bucket's R)
@@ -217,6 +223,14 @@ class RiakBucket(object):
         :param head_only: whether to fetch without value, so only metadata
            (only available on PB transport)
         :type head_only: bool
+        :param hedge: if no reply arrives after this many seconds, or
+           after a delay derived from recent latencies if True, also
+           send the request to a different node; see
+           :meth:`RiakClient.get <riak.client.RiakClient.get>`
+        :type hedge: float, bool
+        :param retry_policy: the retry policy of this request, instead
+           of :attr:`retry_policy`
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         :rtype: :class:`RiakObject <riak.riak_object.RiakObject>` or
            :class:`~riak.datatypes.Datatype`
 
@@ -227,13 +241,22 @@ class RiakBucket(object):
                                                timeout=timeout,
                                                include_context=include_context,
                                                basic_quorum=basic_quorum,
-                                               notfound_ok=notfound_ok)
+                                               notfound_ok=notfound_ok,
+                                               hedge=hedge,
+                                               retry_policy=retry_policy)
         else:
             obj = RiakObject(self._client, self, key)
+            cache = self.object_cache
+            if cache is not None and not head_only:
+                return cache.fetch(obj, r=r, pr=pr, timeout=timeout,
+                                   basic_quorum=basic_quorum,
+                                   notfound_ok=notfound_ok, hedge=hedge,
+                                   retry_policy=retry_policy)
             return obj.reload(r=r, pr=pr, timeout=timeout,
                               basic_quorum=basic_quorum,
                               notfound_ok=notfound_ok,
-                              head_only=head_only)
+                              head_only=head_only, hedge=hedge,
+                              retry_policy=retry_policy)
 
     def multiget(self, keys, r=None, pr=None, timeout=None,
                  basic_quorum=None, notfound_ok=None,
@@ -286,6 +309,34 @@ class RiakBucket(object):
                            bucket. If the resolver is not set, the
                            client's resolver will be used.""")
 
+    def _get_retry_policy(self):
+        return self._retry_policy or self._client.retry_policy
+
+    def _set_retry_policy(self, value):
+        self._retry_policy = value
+
+    retry_policy = property(_get_retry_policy, _set_retry_policy,
+                            doc="""The
+                               :class:`~riak.client.retry.RetryPolicy`
+                               of operations on this bucket. If it is
+                               not set, the client's policy will be
+                               used.""")
+
+    def _get_object_cache(self):
+        if self._object_cache is not None:
+            return self._object_cache
+        return self._client.object_cache
+
+    def _set_object_cache(self, value):
+        self._object_cache = value
+
+    object_cache = property(_get_object_cache, _set_object_cache,
+                            doc="""The
+                               :class:`~riak.client.cache.ObjectCache`
+                               used by :meth:`get`, or None to always
+                               fetch from Riak. If it is not set, the
+                               client's cache will be used.""")
+
     n_val = bucket_property('n_val', doc="""
     N-value for this bucket, which is the number of replicas
     that will be written of each object in the bucket.
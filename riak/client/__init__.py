@@ -21,7 +21,7 @@ import random
 
 from weakref import WeakValueDictionary
 from riak.client.operations import RiakClientOperations
-from riak.node import RiakNode
+from riak.node import ConcurrencyLimit, RiakNode
 from riak.bucket import RiakBucket, BucketType
 from riak.mapreduce import RiakMapReduceChain
 from riak.resolver import default_resolver
@@ -32,6 +32,8 @@ from riak.security import SecurityCreds
 from riak.util import lazy_property, bytes_to_str, str_to_bytes
 from six import string_types, PY2
 from riak.client.multi import MultiGetPool, MultiPutPool
+from riak.client.routing import PreflistCache, DEFAULT_PREFLIST_TTL
+from riak.client.coalesce import SingleFlight
 
 
 def default_encoder(obj):
@@ -82,9 +84,18 @@ class RiakClient(RiakMapReduceChain, RiakClientOperations):
     #: The supported protocols
     PROTOCOLS = ['http', 'pbc']
 
+    #: The supported strategies for choosing nodes
+    NODE_SELECTIONS = ['random', 'least_loaded']
+
     def __init__(self, protocol='pbc', transport_options={},
                  nodes=None, credentials=None,
                  multiget_pool_size=None, multiput_pool_size=None,
+                 prewarm=None, token_aware=False,
+                 preflist_ttl=DEFAULT_PREFLIST_TTL,
+                 node_selection='random', health_check_interval=None,
+                 retry_policy=None, object_cache=None,
+                 coalesce_reads=False, node_max_in_flight=None,
+                 adaptive_concurrency=False, ts_schema_ttl=None,
                  **kwargs):
         """
         Construct a new ``RiakClient`` object.
@@ -96,34 +107,103 @@ class RiakClient(RiakMapReduceChain, RiakClientOperations):
            'host', 'http_port', and 'pb_port'
         :type nodes: list
         :param transport_options: Optional key-value args to pass to
-                                  the transport constructor
+                                  the transport constructor. Setting
+                                  ``pipeline_depth`` makes :meth:`multiget`
+                                  and :meth:`multiput` pipeline their
+                                  requests over Protocol Buffers.
+                                  ``max_size``, ``min_idle``,
+                                  ``acquire_timeout``, ``max_idle_time``
+                                  and ``max_lifetime`` bound each
+                                  connection pool; see
+                                  :class:`~riak.transports.pool.Pool`.
         :type transport_options: dict
         :param credentials: optional object of security info
         :type credentials: :class:`~riak.security.SecurityCreds` or dict
         :param multiget_pool_size: the number of threads to use in
-           :meth:`multiget` operations. Defaults to a factor of the number of
-           CPUs in the system
+           :meth:`multiget` operations. By default a process-wide pool
+           with a thread per CPU in the system is shared
         :type multiget_pool_size: int
         :param multiput_pool_size: the number of threads to use in
-           :meth:`multiput` operations. Defaults to a factor of the number of
-           CPUs in the system
+           :meth:`multiput` operations. By default a process-wide pool
+           with a thread per CPU in the system is shared
         :type multiput_pool_size: int
+        :param prewarm: the number of connections to open to each node
+           before returning; see :meth:`warm_up`
+        :type prewarm: int
+        :param token_aware: whether to send single-key operations to a
+           node that owns the key; see :ref:`token-aware-routing`
+        :type token_aware: boolean
+        :param preflist_ttl: the number of seconds the owners of a key
+           are cached when ``token_aware`` is set
+        :type preflist_ttl: float
+        :param node_selection: how nodes are chosen for operations and
+           new connections, one of :attr:`NODE_SELECTIONS`. The
+           default, ``'random'``, picks any node without recent
+           errors; ``'least_loaded'`` picks the less loaded of two
+           such nodes by recent latency and requests in flight.
+        :type node_selection: string
+        :param health_check_interval: if set, the number of seconds
+           between background runs of :meth:`check_health`
+        :type health_check_interval: float
+        :param retry_policy: how failed operations are retried; see
+           :class:`~riak.client.retry.RetryPolicy`
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
+        :param object_cache: a cache of fetched objects used by
+           :meth:`RiakBucket.get <riak.bucket.RiakBucket.get>`
+        :type object_cache: :class:`~riak.client.cache.ObjectCache`
+        :param coalesce_reads: whether concurrent gets of the same key
+           with the same options share one request; see :meth:`get`
+        :type coalesce_reads: boolean
+        :param node_max_in_flight: if set, the most requests sent to
+           each node at once. Requests wait for a node with room,
+           which spreads bulk operations such as :meth:`multiget`
+           across the cluster. Nodes given their own ``max_in_flight``
+           keep it.
+        :type node_max_in_flight: int
+        :param adaptive_concurrency: whether each node's limit adapts
+           to its latency and errors; see
+           :class:`~riak.node.ConcurrencyLimit`
+        :type adaptive_concurrency: boolean
+        :param ts_schema_ttl: the number of seconds the schemas of
+           timeseries tables are cached, or None to cache them until
+           refreshed; see :meth:`Table.schema <riak.table.Table.schema>`
+        :type ts_schema_ttl: float
         """
+        # Until the pools are created, the client counts as closed, so
+        # that __del__ has nothing to do if an argument is invalid
+        self._closed = True
         kwargs = kwargs.copy()
+        if node_selection not in self.NODE_SELECTIONS:
+            raise ValueError("invalid node selection %s" % node_selection)
 
         if nodes is None:
             self.nodes = [self._create_node(kwargs), ]
         else:
             self.nodes = [self._create_node(n) for n in nodes]
+        if node_max_in_flight:
+            for node in self.nodes:
+                if node.concurrency is None:
+                    node.concurrency = ConcurrencyLimit(
+                        node_max_in_flight, adaptive=adaptive_concurrency)
 
         self._multiget_pool_size = multiget_pool_size
         self._multiput_pool_size = multiput_pool_size
+        self._pipeline_depth = transport_options.get('pipeline_depth')
+        self._node_selection = node_selection
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        self.object_cache = object_cache
+        self.ts_schema_ttl = ts_schema_ttl
+        if coalesce_reads:
+            self._single_flight = SingleFlight()
         self.protocol = protocol or 'pbc'
         self._resolver = None
         self._credentials = self._create_credentials(credentials)
         self._http_pool = HttpPool(self, **transport_options)
         self._tcp_pool = TcpPool(self, **transport_options)
         self._closed = False
+        if token_aware:
+            self._preflists = PreflistCache(ttl=preflist_ttl)
 
         if PY2:
             self._encoders = {'application/json': default_encoder,
@@ -144,6 +224,14 @@ class RiakClient(RiakMapReduceChain, RiakClientOperations):
         self._buckets = WeakValueDictionary()
         self._bucket_types = WeakValueDictionary()
         self._tables = WeakValueDictionary()
+        # Table name -> cached schema; kept here since Table objects
+        # are only weakly held
+        self._ts_schemas = {}
+
+        if health_check_interval:
+            self._start_health_checks(health_check_interval)
+        if prewarm:
+            self.warm_up(prewarm)
 
     def __del__(self):
         self.close()
@@ -322,12 +410,13 @@ class RiakClient(RiakMapReduceChain, RiakClientOperations):
         """
         if not self._closed:
             self._closed = True
+            self._stop_health_checks()
             self._stop_multi_pools()
             if self._http_pool is not None:
-                self._http_pool.clear()
+                self._http_pool.close()
                 self._http_pool = None
             if self._tcp_pool is not None:
-                self._tcp_pool.clear()
+                self._tcp_pool.close()
                 self._tcp_pool = None
 
     def _stop_multi_pools(self):
@@ -368,8 +457,9 @@ class RiakClient(RiakMapReduceChain, RiakClientOperations):
 
     def _choose_node(self, nodes=None):
         """
-        Chooses a random node from the list of nodes in the client,
-        taking into account each node's recent error rate.
+        Chooses a node from the list of nodes in the client, taking
+        into account each node's circuit breaker, recent error rate
+        and, when ``node_selection`` is ``'least_loaded'``, its load.
         :rtype RiakNode
         """
         if not nodes:
@@ -380,11 +470,18 @@ class RiakClient(RiakMapReduceChain, RiakClientOperations):
         def _error_rate(node):
             return node.error_rate.value()
 
-        good = [n for n in nodes if _error_rate(n) < 0.1]
+        available = [n for n in nodes if n.available()]
+        good = [n for n in available if _error_rate(n) < 0.1]
+        # Then nodes with room under their concurrency limit
+        good = [n for n in good if not n.saturated()] or good
 
         if len(good) is 0:
-            # Fall back to a minimally broken node
-            return min(nodes, key=_error_rate)
+            # Fall back to a minimally broken node, open breakers last
+            return min(available or nodes, key=_error_rate)
+        elif self._node_selection == 'least_loaded' and len(good) > 1:
+            # Power of two choices: comparing two random nodes avoids
+            # herding every request onto the single least loaded one
+            return min(random.sample(good, 2), key=lambda n: n.load())
         else:
             return random.choice(good)
 
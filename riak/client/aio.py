@@ -0,0 +1,410 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A native asyncio client for Riak over Protocol Buffers. Requires
+Python 3.6 or later.
+"""
+
+import asyncio
+import six
+import time
+
+from weakref import WeakValueDictionary
+
+from riak import RiakError
+from riak.client import RiakClient, binary_json_encoder, \
+    binary_json_decoder, binary_encoder_decoder
+from riak.client.transport import DEFAULT_RETRY_COUNT, _is_retryable
+from riak.datatypes import TYPES
+from riak.transports.pool import BadResource
+from riak.transports.tcp.aio import AsyncTcpPool
+from riak.util import bytes_to_str, str_to_bytes, _validate_timeout
+
+__all__ = ['AsyncRiakClient']
+
+#: The number of times a stream is retried if it fails to start, as
+#: with the default retry policy of the blocking client
+STREAM_RETRIES = 1
+
+
+class AsyncRiakClient(object):
+    """
+    An asyncio counterpart of :class:`~riak.client.RiakClient`. All
+    operations are coroutines that share a pool of non-blocking
+    Protocol Buffers connections, so many requests can be in flight
+    without a thread per request::
+
+        client = AsyncRiakClient(nodes=[{'host': '127.0.0.1'}])
+        bucket = client.bucket('users')
+        obj = await client.get(bucket.new('alice'))
+        async for keys in client.stream_index(bucket, 'age_int', 20, 30):
+            do_something(keys)
+        client.close()
+
+    Buckets, bucket types and tables are created as with the blocking
+    client, but operations must be awaited on this client rather than
+    called on those objects; for example use ``await client.put(obj)``
+    instead of ``obj.store()``.
+    """
+
+    def __init__(self, transport_options={}, nodes=None, credentials=None,
+                 retries=DEFAULT_RETRY_COUNT, node_selection='random',
+                 **kwargs):
+        """
+        :param transport_options: Optional key-value args to pass to
+           each connection. ``max_connections`` bounds the number of
+           open connections.
+        :type transport_options: dict
+        :param nodes: a list of node configurations, as for
+           :class:`~riak.client.RiakClient`
+        :type nodes: list
+        :param credentials: optional object of security info
+        :type credentials: :class:`~riak.security.SecurityCreds` or dict
+        :param retries: the number of times retryable operations will
+           be retried
+        :type retries: int
+        :param node_selection: how nodes are chosen for new
+           connections, as for :class:`~riak.client.RiakClient`
+        :type node_selection: string
+        """
+        kwargs = kwargs.copy()
+        if node_selection not in RiakClient.NODE_SELECTIONS:
+            raise ValueError("invalid node selection %s" % node_selection)
+        if nodes is None:
+            self.nodes = [self._create_node(kwargs), ]
+        else:
+            self.nodes = [self._create_node(n) for n in nodes]
+        self.retries = retries
+        self._node_selection = node_selection
+        self._resolver = None
+        self._credentials = self._create_credentials(credentials)
+        self._pool = AsyncTcpPool(self, **transport_options)
+        self._closed = False
+        self._encoders = {'application/json': binary_json_encoder,
+                          'text/json': binary_json_encoder,
+                          'text/plain': str_to_bytes,
+                          'binary/octet-stream': binary_encoder_decoder}
+        self._decoders = {'application/json': binary_json_decoder,
+                          'text/json': binary_json_decoder,
+                          'text/plain': bytes_to_str,
+                          'binary/octet-stream': binary_encoder_decoder}
+        self._buckets = WeakValueDictionary()
+        self._bucket_types = WeakValueDictionary()
+        self._tables = WeakValueDictionary()
+        self._ts_schemas = {}
+
+    # Object construction and serialization behave exactly as they do
+    # on the blocking client.
+    resolver = RiakClient.resolver
+    get_encoder = RiakClient.get_encoder
+    set_encoder = RiakClient.set_encoder
+    get_decoder = RiakClient.get_decoder
+    set_decoder = RiakClient.set_decoder
+    bucket = RiakClient.bucket
+    bucket_type = RiakClient.bucket_type
+    table = RiakClient.table
+    _create_node = RiakClient._create_node
+    _create_credentials = RiakClient._create_credentials
+    _choose_node = RiakClient._choose_node
+    _setdefault_handle_none = RiakClient._setdefault_handle_none
+    __hash__ = RiakClient.__hash__
+
+    def close(self):
+        """
+        Closes all idle connections. Connections in use are closed as
+        they are released.
+        """
+        if not self._closed:
+            self._closed = True
+            self._pool.clear()
+
+    async def _connect(self, skip_nodes):
+        """
+        Claims a pooled connection, preferring nodes not in
+        ``skip_nodes``. A node that cannot be connected to is marked as
+        failing and added to ``skip_nodes``.
+
+        :param skip_nodes: nodes that have already failed
+        :type skip_nodes: list
+        :rtype: :class:`~riak.transports.tcp.aio.AsyncTcpConnection`
+        """
+        if self._closed:
+            raise RuntimeError("Client is closed.")
+
+        def _skip_bad_nodes(conn):
+            return conn._node not in skip_nodes and conn._node.available()
+
+        node = self._choose_node([n for n in self.nodes
+                                  if n not in skip_nodes])
+        try:
+            return await self._pool.acquire(_filter=_skip_bad_nodes,
+                                            node=node)
+        except (IOError, asyncio.TimeoutError):
+            # NB: nothing has been sent yet, so any failure to connect
+            # is safe to retry elsewhere
+            node.record_error()
+            node.invalidate_features()
+            skip_nodes.append(node)
+            raise
+
+    async def _with_retries(self, fn):
+        """
+        Awaits ``fn(connection)`` with a pooled connection, retrying
+        connection and network failures on other nodes.
+        """
+        skip_nodes = []
+        attempt = 0
+        while True:
+            try:
+                conn = await self._connect(skip_nodes)
+            except (IOError, asyncio.TimeoutError):
+                if attempt < self.retries:
+                    attempt += 1
+                    continue
+                raise
+            if not conn._node.admit() and conn._node not in skip_nodes and \
+                    any(n is not conn._node and n not in skip_nodes and
+                        n.available() for n in self.nodes):
+                # Another request is probing the node
+                skip_nodes.append(conn._node)
+                self._pool.release(conn)
+                continue
+            errored = False
+            conn._node.request_started()
+            started = time.time()
+            elapsed = None
+            try:
+                result = await fn(conn)
+                elapsed = time.time() - started
+                return result
+            except (IOError, BadResource) as e:
+                errored = True
+                if attempt < self.retries and _is_retryable(e):
+                    conn._node.record_error()
+                    conn._node.invalidate_features()
+                    skip_nodes.append(conn._node)
+                    attempt += 1
+                    continue
+                raise
+            finally:
+                conn._node.request_finished(elapsed)
+                self._pool.release(conn, errored or self._closed)
+
+    async def ping(self):
+        """
+        Checks that a node is reachable.
+
+        :rtype: boolean
+        """
+        return await self._with_retries(lambda conn: conn.ping())
+
+    async def get(self, robj, r=None, pr=None, timeout=None,
+                  basic_quorum=None, notfound_ok=None, head_only=False):
+        """
+        Fetches the contents of a Riak object. See
+        :meth:`RiakClient.get <riak.client.RiakClient.get>`.
+
+        :rtype: :class:`~riak.riak_object.RiakObject`
+        """
+        _validate_timeout(timeout)
+        if not isinstance(robj.key, six.string_types):
+            raise TypeError(
+                'key must be a string, instead got {0}'.format(repr(robj.key)))
+        return await self._with_retries(
+            lambda conn: conn.get(robj, r=r, pr=pr, timeout=timeout,
+                                  basic_quorum=basic_quorum,
+                                  notfound_ok=notfound_ok,
+                                  head_only=head_only))
+
+    async def put(self, robj, w=None, dw=None, pw=None, return_body=None,
+                  if_none_match=None, timeout=None):
+        """
+        Stores an object. See :meth:`RiakClient.put
+        <riak.client.RiakClient.put>`.
+
+        :rtype: :class:`~riak.riak_object.RiakObject`
+        """
+        _validate_timeout(timeout)
+        return await self._with_retries(
+            lambda conn: conn.put(robj, w=w, dw=dw, pw=pw,
+                                  return_body=return_body,
+                                  if_none_match=if_none_match,
+                                  timeout=timeout))
+
+    async def delete(self, robj, rw=None, r=None, w=None, dw=None,
+                     pr=None, pw=None, timeout=None):
+        """
+        Deletes an object. See :meth:`RiakClient.delete
+        <riak.client.RiakClient.delete>`.
+        """
+        _validate_timeout(timeout)
+        return await self._with_retries(
+            lambda conn: conn.delete(robj, rw=rw, r=r, w=w, dw=dw,
+                                     pr=pr, pw=pw, timeout=timeout))
+
+    async def fetch_datatype(self, bucket, key, r=None, pr=None,
+                             basic_quorum=None, notfound_ok=None,
+                             timeout=None, include_context=None):
+        """
+        Fetches the value of a Riak Datatype. See
+        :meth:`RiakClient.fetch_datatype
+        <riak.client.RiakClient.fetch_datatype>`.
+
+        :rtype: :class:`~riak.datatypes.Datatype`
+        """
+        _validate_timeout(timeout)
+        dtype, value, context = await self._with_retries(
+            lambda conn: conn.fetch_datatype(
+                bucket, key, r=r, pr=pr, basic_quorum=basic_quorum,
+                notfound_ok=notfound_ok, timeout=timeout,
+                include_context=include_context))
+        return TYPES[dtype](bucket=bucket, key=key, value=value,
+                            context=context)
+
+    async def update_datatype(self, datatype, w=None, dw=None, pw=None,
+                              return_body=None, timeout=None,
+                              include_context=None):
+        """
+        Sends the pending updates of a Riak Datatype. Like the blocking
+        client, a sent update is not retried, but failures to connect
+        are retried on other nodes. Pending operations are cleared once
+        the update succeeds.
+        """
+        _validate_timeout(timeout)
+        skip_nodes = []
+        attempt = 0
+        while True:
+            try:
+                conn = await self._connect(skip_nodes)
+                break
+            except (IOError, asyncio.TimeoutError):
+                if attempt < self.retries:
+                    attempt += 1
+                    continue
+                raise
+        errored = False
+        try:
+            rv = await conn.update_datatype(datatype, w=w, dw=dw, pw=pw,
+                                            return_body=return_body,
+                                            timeout=timeout,
+                                            include_context=include_context)
+        except (IOError, BadResource):
+            errored = True
+            raise
+        finally:
+            self._pool.release(conn, errored or self._closed)
+        datatype.clear()
+        return rv
+
+    async def stream_index(self, bucket, index, startkey, endkey=None,
+                           return_terms=None, max_results=None,
+                           continuation=None, timeout=None, term_regex=None):
+        """
+        Queries a secondary index, yielding lists of matching keys (or
+        of ``(term, key)`` pairs when ``return_terms`` is set) as they
+        arrive. When ``max_results`` is reached the last item yielded is
+        a :data:`~riak.client.index_page.CONTINUATION` for the next
+        page. See :meth:`RiakClient.stream_index
+        <riak.client.RiakClient.stream_index>` for the options.
+        """
+        _validate_timeout(timeout, infinity_ok=True)
+        skip_nodes = []
+        retried = 0
+        while True:
+            try:
+                conn = await self._connect(skip_nodes)
+            except (IOError, asyncio.TimeoutError):
+                if retried < STREAM_RETRIES:
+                    retried += 1
+                    continue
+                raise
+            started = False
+            finished = False
+            try:
+                async for results in conn.stream_index(
+                        bucket, index, startkey, endkey,
+                        return_terms=return_terms, max_results=max_results,
+                        continuation=continuation, timeout=timeout,
+                        term_regex=term_regex):
+                    started = True
+                    yield results
+                finished = True
+                return
+            except BadResource as e:
+                # NB: *only* re-try if the connection failed before the
+                # stream started
+                if not started and not e.mid_stream and \
+                        retried < STREAM_RETRIES:
+                    conn._node.record_error()
+                    conn._node.invalidate_features()
+                    skip_nodes.append(conn._node)
+                    retried += 1
+                    continue
+                raise
+            finally:
+                # NB: a partially-read stream leaves replies on the
+                # socket, so that connection must not be re-used
+                self._pool.release(conn, not finished or self._closed)
+
+    async def ts_get(self, table, key):
+        """
+        Retrieves a timeseries value by key.
+
+        :rtype: :class:`~riak.ts_object.TsObject`
+        """
+        t = self._table(table)
+        return await self._with_retries(lambda conn: conn.ts_get(t, key))
+
+    async def ts_put(self, tsobj):
+        """
+        Stores timeseries data. As with :meth:`RiakClient.ts_put
+        <riak.client.RiakClient.ts_put>`, the first put to a table
+        fetches its schema to encode the rows with.
+
+        :rtype: boolean
+        """
+        table = tsobj.table
+        if getattr(table._client, '_ts_schemas', None) is not None and \
+                table._cache_entry() is None:
+            try:
+                description = await self.ts_query(table, 'DESCRIBE {table}')
+            except RiakError:
+                description = None
+            table._cache_schema(description)
+        return await self._with_retries(lambda conn: conn.ts_put(tsobj))
+
+    async def ts_delete(self, table, key):
+        """
+        Deletes a timeseries value by key.
+
+        :rtype: boolean
+        """
+        t = self._table(table)
+        return await self._with_retries(lambda conn: conn.ts_delete(t, key))
+
+    async def ts_query(self, table, query, interpolations=None):
+        """
+        Queries timeseries data.
+
+        :rtype: :class:`~riak.ts_object.TsObject`
+        """
+        t = self._table(table)
+        return await self._with_retries(
+            lambda conn: conn.ts_query(t, query, interpolations))
+
+    def _table(self, table):
+        if isinstance(table, six.string_types):
+            return self.table(table)
+        return table
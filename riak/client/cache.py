@@ -0,0 +1,253 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+from riak.content import RiakContent
+from riak.riak_object import RiakObject
+
+__all__ = ['ObjectCache']
+
+#: The most bytes of object values an :class:`ObjectCache` holds by
+#: default
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+#: The number of seconds an :class:`ObjectCache` keeps an object by
+#: default
+DEFAULT_CACHE_TTL = 30
+
+#: Fetch options that change which replicas answer, so a fetch using
+#: them bypasses the cache
+_READ_OPTIONS = ('r', 'pr', 'basic_quorum', 'notfound_ok')
+
+
+class _ObjectSnapshot(object):
+    """
+    The state of a fetched object, kept in its encoded form so that
+    each read gets its own copy of the value.
+    """
+
+    def __init__(self, robj, expires=None):
+        self.vclock = robj.vclock
+        self.siblings = [(s.encoded_data, s.charset, s.content_type,
+                          s.content_encoding, s.last_modified, s.etag,
+                          dict(s.usermeta), list(s.links), set(s.indexes),
+                          s.exists)
+                         for s in robj.siblings]
+        self.size = sum(len(s[0] or b'') for s in self.siblings)
+        self.expires = expires
+
+    def restore(self, robj):
+        """
+        Fills in an object with the saved state.
+        """
+        robj.vclock = self.vclock
+        robj.siblings = [
+            RiakContent(robj, encoded_data=encoded_data, charset=charset,
+                        content_type=content_type,
+                        content_encoding=content_encoding,
+                        last_modified=last_modified, etag=etag,
+                        usermeta=dict(usermeta), links=list(links),
+                        indexes=set(indexes), exists=exists)
+            for (encoded_data, charset, content_type, content_encoding,
+                 last_modified, etag, usermeta, links, indexes, exists)
+            in self.siblings]
+        return robj
+
+
+class ObjectCache(object):
+    """
+    A thread-safe, read-through cache of fetched objects, used by
+    :meth:`RiakBucket.get <riak.bucket.RiakBucket.get>` when set as
+    the ``object_cache`` of a client or bucket::
+
+        client = RiakClient(object_cache=ObjectCache())
+        bucket.object_cache = ObjectCache(max_bytes=1024 * 1024,
+                                          revalidate=True)
+
+    Objects are kept for ``ttl`` seconds, and the least recently used
+    are evicted once their values exceed ``max_bytes``. Storing or
+    deleting an object through the client removes it from the cache,
+    but writes by other clients are only seen once the entry expires,
+    unless ``revalidate`` is set. Then each cached read first fetches
+    the object's metadata only, and the cached value is used if its
+    vector clock is unchanged. Revalidation requires Protocol Buffers.
+
+    Fetches that set any of ``r``, ``pr``, ``basic_quorum`` or
+    ``notfound_ok`` bypass the cache, since the cached object may not
+    satisfy them.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, ttl=DEFAULT_CACHE_TTL,
+                 revalidate=False):
+        """
+        :param max_bytes: the most bytes of encoded values kept
+        :type max_bytes: int
+        :param ttl: the number of seconds an object is kept, or None
+            to keep objects until they are evicted
+        :type ttl: float
+        :param revalidate: whether to check that a cached object is
+            unchanged before using it
+        :type revalidate: boolean
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.revalidate = revalidate
+        self.size = 0
+        self._entries = OrderedDict()
+        # Keys being fetched -> [fetches, generation]; the generation
+        # is bumped when the key is invalidated mid-fetch
+        self._pending = {}
+        self._lock = Lock()
+
+    def fetch(self, robj, **params):
+        """
+        Fills in an object from the cache, or by fetching it and
+        caching the result if it is not cached.
+
+        :param robj: the object to fill in
+        :type robj: :class:`~riak.riak_object.RiakObject`
+        :param params: the options of the fetch; see
+            :meth:`RiakObject.reload
+            <riak.riak_object.RiakObject.reload>`
+        :rtype: :class:`~riak.riak_object.RiakObject`
+        """
+        if any(params.get(option) is not None for option in _READ_OPTIONS):
+            return robj.reload(**params)
+        entry = self._get(robj.bucket, robj.key)
+        if entry is not None and self.revalidate:
+            head = RiakObject(robj.client, robj.bucket, robj.key)
+            head.reload(head_only=True, **params)
+            if not _same_vclock(head.vclock, entry.vclock):
+                self.invalidate(robj.bucket, robj.key)
+                entry = None
+        if entry is not None:
+            return entry.restore(robj)
+        cache_key = self._cache_key(robj.bucket, robj.key)
+        generation = self._begin(cache_key)
+        try:
+            robj.reload(**params)
+            self._add(robj, cache_key, generation)
+        finally:
+            self._end(cache_key)
+        return robj
+
+    def add(self, robj):
+        """
+        Caches a fetched object. Objects that were not found are not
+        cached.
+
+        :param robj: the object
+        :type robj: :class:`~riak.riak_object.RiakObject`
+        """
+        self._add(robj, self._cache_key(robj.bucket, robj.key))
+
+    def _add(self, robj, cache_key, generation=None):
+        if not robj.exists:
+            return
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        entry = _ObjectSnapshot(robj, expires)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            # Don't reinstate an object invalidated while it was fetched
+            if generation is not None and \
+                    self._pending[cache_key][1] != generation:
+                return
+            self._remove(cache_key)
+            self._entries[cache_key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, bucket, key):
+        """
+        Removes an object from the cache.
+
+        :param bucket: the bucket of the object
+        :type bucket: :class:`~riak.bucket.RiakBucket`
+        :param key: the key of the object
+        :type key: string
+        """
+        cache_key = self._cache_key(bucket, key)
+        with self._lock:
+            self._remove(cache_key)
+            if cache_key in self._pending:
+                self._pending[cache_key][1] += 1
+
+    def clear(self):
+        """
+        Removes all objects from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            for pending in self._pending.values():
+                pending[1] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, bucket, key):
+        cache_key = self._cache_key(bucket, key)
+        with self._lock:
+            entry = self._entries.pop(cache_key, None)
+            if entry is None:
+                return None
+            if entry.expires is not None and time.time() >= entry.expires:
+                self.size -= entry.size
+                return None
+            # Re-insert to mark the entry as recently used
+            self._entries[cache_key] = entry
+            return entry
+
+    def _begin(self, cache_key):
+        with self._lock:
+            pending = self._pending.setdefault(cache_key, [0, 0])
+            pending[0] += 1
+            return pending[1]
+
+    def _end(self, cache_key):
+        with self._lock:
+            pending = self._pending[cache_key]
+            pending[0] -= 1
+            if not pending[0]:
+                del self._pending[cache_key]
+
+    def _remove(self, cache_key):
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def _cache_key(self, bucket, key):
+        return (bucket.bucket_type.name, bucket.name, key)
+
+
+def _same_vclock(one, other):
+    if one is None or other is None:
+        return False
+    return one.encode('binary') == other.encode('binary')
+
+
+def _uncache(robj):
+    """
+    Removes an object that was stored or deleted from its bucket's
+    object cache, if there is one.
+    """
+    cache = robj.bucket.object_cache
+    if cache is not None and robj.key is not None:
+        cache.invalidate(robj.bucket, robj.key)
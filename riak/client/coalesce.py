@@ -0,0 +1,80 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+from threading import Event, Lock
+from six import reraise
+
+from riak import RiakError
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key, so that only the
+    first caller does the work and the others wait for its result.
+    Used by the client when ``coalesce_reads`` is set.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+
+    def do(self, key, fn):
+        """
+        Returns the result of ``fn``, or of the call with the same key
+        already in flight. Exceptions raised by ``fn`` are raised to
+        every waiting caller. If ``fn`` is interrupted, e.g. by
+        :exc:`KeyboardInterrupt`, the waiting callers raise a
+        :class:`~riak.RiakError` instead.
+
+        :param key: identifies equivalent calls
+        :type key: hashable
+        :param fn: the function to call, without arguments
+        :type fn: function
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if leader:
+            try:
+                call.result = fn()
+            except Exception:
+                call.error = sys.exc_info()
+            except BaseException:
+                # The interruption is the leader's alone to raise
+                call.error = (RiakError, RiakError(
+                    'coalesced request was interrupted'), None)
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            reraise(*call.error)
+        return call.result
+
+    def __len__(self):
+        return len(self._calls)
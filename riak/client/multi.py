@@ -13,7 +13,11 @@
 # limitations under the License.
 
 from __future__ import print_function
-from collections import namedtuple
+
+import logging
+
+from collections import deque, namedtuple, OrderedDict
+from itertools import islice
 from threading import Thread, Lock, Event
 from multiprocessing import cpu_count
 from six import PY2
@@ -22,11 +26,13 @@ from riak.riak_object import RiakObject
 from riak.ts_object import TsObject
 
 if PY2:
-    from Queue import Queue, Empty
+    from Queue import Queue
 else:
-    from queue import Queue, Empty
+    from queue import Queue
 
-__all__ = ['multiget', 'multiput', 'MultiGetPool', 'MultiPutPool']
+__all__ = ['multiget', 'multiget_iter', 'multiput', 'multidelete',
+           'multi_update_datatype', 'MultiGetPool', 'MultiPutPool',
+           'shared_pool']
 
 
 try:
@@ -37,6 +43,13 @@ except NotImplementedError:
     # Make an educated guess
     POOL_SIZE = 6
 
+# Queued once per worker to make it exit
+_STOP = object()
+
+#: The default number of keys :func:`multiget_iter` has queued or
+#: being fetched at once
+MAX_IN_FLIGHT = 100
+
 #: A :class:`namedtuple` for tasks that are fed to workers in the
 #: multi get pool.
 Task = namedtuple('Task',
@@ -49,6 +62,36 @@ Task = namedtuple('Task',
 PutTask = namedtuple('PutTask',
                      ['client', 'outq', 'object', 'options'])
 
+#: A :class:`namedtuple` for a batch of bucket_type/bucket/key
+#: triples that a multi get worker fetches over one pipelined
+#: connection.
+BatchTask = namedtuple('BatchTask',
+                       ['client', 'outq', 'keys', 'options'])
+
+#: A :class:`namedtuple` for bucket_type/bucket/key triples whose
+#: owning nodes a multi get worker looks up for token-aware routing.
+OwnersTask = namedtuple('OwnersTask', ['client', 'outq', 'keys'])
+
+#: A :class:`namedtuple` for a batch of objects that a multi put
+#: worker stores over one pipelined connection.
+BatchPutTask = namedtuple('BatchPutTask',
+                          ['client', 'outq', 'objects', 'options'])
+
+#: A :class:`namedtuple` for deletes that are fed to workers in the
+#: multi put pool.
+DeleteTask = namedtuple('DeleteTask',
+                        ['client', 'outq', 'object', 'options'])
+
+#: A :class:`namedtuple` for a batch of objects that a multi put
+#: worker deletes over one pipelined connection.
+BatchDeleteTask = namedtuple('BatchDeleteTask',
+                             ['client', 'outq', 'objects', 'options'])
+
+#: A :class:`namedtuple` for Data Type updates that are fed to
+#: workers in the multi put pool.
+UpdateDatatypeTask = namedtuple('UpdateDatatypeTask',
+                                ['client', 'outq', 'datatype', 'options'])
+
 
 class MultiPool(object):
     """
@@ -56,15 +99,19 @@ class MultiPool(object):
     across many multi requests.
     """
 
-    def __init__(self, size=POOL_SIZE, name='unknown'):
+    def __init__(self, size=POOL_SIZE, name='unknown', daemon=False):
         """
         :param size: the desired size of the worker pool
         :type size: int
+        :param daemon: whether the worker threads are daemon threads,
+           which do not keep the process running
+        :type daemon: bool
         """
 
         self._inq = Queue()
         self._size = size
         self._name = name
+        self._daemon = daemon
         self._started = Event()
         self._stop = Event()
         self._lock = Lock()
@@ -101,7 +148,7 @@ class MultiPool(object):
                     name = "riak.client.multi-worker-{0}-{1}".format(
                             self._name, i)
                     worker = Thread(target=self._worker_method, name=name)
-                    worker.daemon = False
+                    worker.daemon = self._daemon
                     worker.start()
                     self._workers.append(worker)
                 self._started.set()
@@ -114,10 +161,13 @@ class MultiPool(object):
 
     def stop(self):
         """
-        Signals the worker threads to exit and waits on them.
+        Signals the worker threads to exit and waits on them. Tasks
+        already queued are processed first.
         """
         if not self.stopped():
             self._stop.set()
+            for worker in self._workers:
+                self._inq.put(_STOP)
             for worker in self._workers:
                 worker.join()
 
@@ -133,93 +183,394 @@ class MultiPool(object):
         self.stop()
 
     def _worker_method(self):
-        raise NotImplementedError
-
-    def _should_quit(self):
         """
-        Worker threads should exit when the stop flag is set and the
-        input queue is empty. Once the stop flag is set, new enqueues
-        are disallowed, meaning that the workers can safely drain the
-        queue before exiting.
-
-        :rtype: bool
+        The body of the worker threads. Blocks taking tasks off the
+        input queue and passing them to :meth:`_execute`, until it
+        takes the sentinel queued by :meth:`stop`. Since the sentinels
+        are queued last, the workers drain the queue before exiting.
         """
-        return self.stopped() and self._inq.empty()
+        while True:
+            task = self._inq.get()
+            try:
+                if task is _STOP:
+                    break
+                self._execute(task)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                # _execute reports the errors of operations to the
+                # task; anything else must not cost the pool a worker
+                logging.exception('Multi %s worker failed to run a task',
+                                  self._name)
+            finally:
+                self._inq.task_done()
+
+    def _execute(self, task):
+        raise NotImplementedError
 
 
 class MultiGetPool(MultiPool):
-    def __init__(self, size=POOL_SIZE):
-        super(MultiGetPool, self).__init__(size=size, name='get')
+    def __init__(self, size=POOL_SIZE, daemon=False):
+        super(MultiGetPool, self).__init__(size=size, name='get',
+                                           daemon=daemon)
 
-    def _worker_method(self):
+    def _execute(self, task):
         """
-        The body of the multi-get worker. Loops until
-        :meth:`_should_quit` returns ``True``, taking tasks off the
-        input queue, fetching the object, and putting them on the
-        output queue.
+        Fetches the object or batch of objects of a task, putting the
+        results on the task's output queue.
         """
-        while not self._should_quit():
-            try:
-                task = self._inq.get(block=True, timeout=0.25)
-            except TypeError:
-                if self._should_quit():
-                    break
-                else:
-                    raise
-            except Empty:
-                continue
-
+        if isinstance(task, OwnersTask):
+            task.outq.put([_key_owners(task.client, item)
+                           for item in task.keys])
+            return
+        elif isinstance(task, BatchTask):
             try:
-                btype = task.client.bucket_type(task.bucket_type)
-                obj = btype.bucket(task.bucket).get(task.key, **task.options)
-                task.outq.put(obj)
+                results = _pipelined_get(task)
             except KeyboardInterrupt:
                 raise
             except Exception as err:
-                errdata = (task.bucket_type, task.bucket, task.key, err)
-                task.outq.put(errdata)
-            finally:
-                self._inq.task_done()
+                results = [tuple(item) + (err,) for item in task.keys]
+            for result in results:
+                task.outq.put(result)
+            return
+
+        try:
+            btype = task.client.bucket_type(task.bucket_type)
+            obj = btype.bucket(task.bucket).get(task.key, **task.options)
+            task.outq.put(obj)
+        except KeyboardInterrupt:
+            raise
+        except Exception as err:
+            errdata = (task.bucket_type, task.bucket, task.key, err)
+            task.outq.put(errdata)
 
 
 class MultiPutPool(MultiPool):
-    def __init__(self, size=POOL_SIZE):
-        super(MultiPutPool, self).__init__(size=size, name='put')
+    def __init__(self, size=POOL_SIZE, daemon=False):
+        super(MultiPutPool, self).__init__(size=size, name='put',
+                                           daemon=daemon)
 
-    def _worker_method(self):
+    def _execute(self, task):
         """
-        The body of the multi-put worker. Loops until
-        :meth:`_should_quit` returns ``True``, taking tasks off the
-        input queue, storing the object, and putting the result on
-        the output queue.
+        Stores or deletes the object or batch of objects of a task, or
+        updates its Data Type, putting the results on the task's output
+        queue.
         """
-        while not self._should_quit():
+        if isinstance(task, BatchPutTask):
             try:
-                task = self._inq.get(block=True, timeout=0.25)
-            except TypeError:
-                if self._should_quit():
-                    break
-                else:
-                    raise
-            except Empty:
-                continue
-
+                results = _pipelined_put(task)
+            except KeyboardInterrupt:
+                raise
+            except Exception as err:
+                results = [(obj, err) for obj in task.objects]
+            for result in results:
+                task.outq.put(result)
+            return
+        elif isinstance(task, BatchDeleteTask):
+            try:
+                results = _pipelined_delete(task)
+            except KeyboardInterrupt:
+                raise
+            except Exception as err:
+                results = [_delete_error(obj, err) for obj in task.objects]
+            for result in results:
+                task.outq.put(result)
+            return
+        elif isinstance(task, DeleteTask):
             try:
-                obj = task.object
-                if isinstance(obj, RiakObject):
-                    rv = task.client.put(obj, **task.options)
-                elif isinstance(obj, TsObject):
-                    rv = task.client.ts_put(obj, **task.options)
-                else:
-                    raise ValueError('unknown obj type: %s'.format(type(obj)))
+                task.client.delete(task.object, **task.options)
+                task.outq.put(True)
+            except KeyboardInterrupt:
+                raise
+            except Exception as err:
+                task.outq.put(_delete_error(task.object, err))
+            return
+        elif isinstance(task, UpdateDatatypeTask):
+            try:
+                rv = task.client.update_datatype(task.datatype,
+                                                 **task.options)
                 task.outq.put(rv)
             except KeyboardInterrupt:
                 raise
             except Exception as err:
-                errdata = (task.object, err)
-                task.outq.put(errdata)
-            finally:
-                self._inq.task_done()
+                task.outq.put((task.datatype, err))
+            return
+
+        try:
+            obj = task.object
+            if isinstance(obj, RiakObject):
+                rv = task.client.put(obj, **task.options)
+            elif isinstance(obj, TsObject):
+                rv = task.client.ts_put(obj, **task.options)
+            else:
+                raise ValueError('unknown obj type: %s'.format(type(obj)))
+            task.outq.put(rv)
+        except KeyboardInterrupt:
+            raise
+        except Exception as err:
+            errdata = (task.object, err)
+            task.outq.put(errdata)
+
+
+_shared_pools = {}
+_shared_pools_lock = Lock()
+
+
+def shared_pool(pool_class):
+    """
+    Returns the process-wide pool of the given class, starting it if
+    needed. Multi operations use it when the client has no pool of its
+    own, so that they do not start and stop threads on each call. Its
+    :data:`POOL_SIZE` workers are daemon threads.
+
+    :param pool_class: :class:`MultiGetPool` or :class:`MultiPutPool`
+    :type pool_class: class
+    :rtype: :class:`MultiPool`
+    """
+    with _shared_pools_lock:
+        pool = _shared_pools.get(pool_class)
+        if pool is None or pool.stopped():
+            pool = _shared_pools[pool_class] = pool_class(daemon=True)
+    pool.start()
+    return pool
+
+
+def _pipelined_get(task):
+    """
+    Fetches a batch of keys over one pipelined connection. Keys in
+    datatype buckets cannot be pipelined and are fetched one at a
+    time. Returns one result per key, in the same form as the
+    single-key worker produces.
+
+    :param task: the batch to fetch
+    :type task: BatchTask
+    :rtype: list
+    """
+    client = task.client
+    results = [None] * len(task.keys)
+    queued = []
+    pipeline = client.pipeline(nodes=_shared_owners(client, task.keys))
+    for i, (bucket_type, bucket, key) in enumerate(task.keys):
+        try:
+            b = client.bucket_type(bucket_type).bucket(bucket)
+            if b.bucket_type.datatype:
+                results[i] = b.get(key, **task.options)
+            else:
+                pipeline.get(b, key, **task.options)
+                queued.append(i)
+        except KeyboardInterrupt:
+            raise
+        except Exception as err:
+            results[i] = (bucket_type, bucket, key, err)
+
+    try:
+        replies = pipeline.execute()
+    except KeyboardInterrupt:
+        raise
+    except Exception as err:
+        replies = [err] * len(queued)
+
+    for i, reply in zip(queued, replies):
+        if isinstance(reply, Exception):
+            bucket_type, bucket, key = task.keys[i]
+            reply = (bucket_type, bucket, key, reply)
+        results[i] = reply
+    return results
+
+
+def _key_owners(client, item):
+    """
+    Returns the owning nodes of a bucket_type/bucket/key triple, or
+    None if they are unknown or cannot be looked up. Routing by owner
+    only saves a hop, so failing to find the owners is not an error.
+    """
+    bucket_type, bucket, key = item
+    try:
+        return client._lookup_owners(
+            client.bucket_type(bucket_type).bucket(bucket), key)
+    except KeyboardInterrupt:
+        raise
+    except Exception:
+        logging.debug('Could not find the owners of %s/%s/%s; routing '
+                      'to any node.', bucket_type, bucket, key,
+                      exc_info=True)
+        return None
+
+
+def _shared_owners(client, keys):
+    """
+    Returns the nodes that own every key of a batch when token-aware
+    routing is enabled, or None if there are none.
+
+    :param client: the client to use
+    :type client: :class:`~riak.client.RiakClient`
+    :param keys: the bucket_type/bucket/key triples of the batch
+    :type keys: list
+    :rtype: list of :class:`~riak.node.RiakNode`
+    """
+    if client._preflists is None:
+        return None
+    owners = None
+    for item in keys:
+        nodes = _key_owners(client, item) or []
+        owners = [n for n in owners if n in nodes] if owners is not None \
+            else nodes
+        if not owners:
+            return None
+    return owners
+
+
+def _owner_batches(client, keys, size, pool=None):
+    """
+    Splits keys into batches of at most ``size`` keys that share an
+    owning node, so that each batch can be pipelined to that node.
+    Each key is assigned to whichever of its owners has been given
+    the fewest keys so far; keys whose owners are unknown are batched
+    together. A batch is yielded as soon as it is full, so that it is
+    fetched while the owners of later keys are still being looked up;
+    the partly filled batches of each node follow once the keys run
+    out.
+
+    :param client: the client to use
+    :type client: :class:`~riak.client.RiakClient`
+    :param keys: the bucket_type/bucket/key triples
+    :type keys: iterable
+    :param size: the most keys in a batch
+    :type size: int
+    :param pool: a pool whose workers look up the owners of the keys
+        in parallel, ``size`` keys at a time, or None to look them up
+        one by one
+    :type pool: :class:`MultiGetPool`
+    :rtype: generator of lists
+    """
+    groups = OrderedDict()
+    assigned = {}
+    for item, owners in _with_owners(client, keys, size, pool):
+        node = min(owners, key=lambda n: assigned.get(n, 0)) \
+            if owners else None
+        assigned[node] = assigned.get(node, 0) + 1
+        group = groups.setdefault(node, [])
+        group.append(item)
+        if len(group) >= size:
+            groups[node] = []
+            yield group
+    for group in groups.values():
+        if group:
+            yield group
+
+
+def _with_owners(client, keys, size, pool):
+    """
+    Pairs each key with its owning nodes, in order. With a pool, the
+    keys are read ahead in chunks of ``size``, up to one chunk per
+    worker, and the workers look up the owners of chunks that are not
+    all cached in parallel.
+    """
+    if pool is None:
+        for item in keys:
+            yield item, _key_owners(client, item)
+        return
+    keys = iter(keys)
+    pending = deque()
+    while True:
+        while len(pending) < pool._size:
+            chunk = list(islice(keys, size))
+            if not chunk:
+                break
+            owners = [_cached_owners(client, item) for item in chunk]
+            if None in owners:
+                # Not all cached, so have a worker look them up
+                outq = Queue()
+                pool.enq(OwnersTask(client, outq, chunk))
+                owners = outq
+            pending.append((chunk, owners))
+        if not pending:
+            return
+        chunk, owners = pending.popleft()
+        if not isinstance(owners, list):
+            owners = owners.get()
+        for pair in zip(chunk, owners):
+            yield pair
+
+
+def _cached_owners(client, item):
+    preflists = client._preflists
+    if preflists is None:
+        return []
+    bucket_type, bucket, key = item
+    return preflists.get(client.bucket_type(bucket_type).bucket(bucket), key)
+
+
+def _pipelined_put(task):
+    """
+    Stores a batch of objects over one pipelined connection. Timeseries
+    objects cannot be pipelined and are stored one at a time. Returns
+    one result per object, in the same form as the single-object
+    worker produces.
+
+    :param task: the batch to store
+    :type task: BatchPutTask
+    :rtype: list
+    """
+    client = task.client
+    results = [None] * len(task.objects)
+    queued = []
+    pipeline = client.pipeline()
+    for i, obj in enumerate(task.objects):
+        try:
+            if isinstance(obj, RiakObject):
+                pipeline.put(obj, **task.options)
+                queued.append(i)
+            elif isinstance(obj, TsObject):
+                results[i] = client.ts_put(obj, **task.options)
+            else:
+                raise ValueError('unknown obj type: {}'.format(type(obj)))
+        except KeyboardInterrupt:
+            raise
+        except Exception as err:
+            results[i] = (obj, err)
+
+    try:
+        replies = pipeline.execute()
+    except KeyboardInterrupt:
+        raise
+    except Exception as err:
+        replies = [err] * len(queued)
+
+    for i, reply in zip(queued, replies):
+        if isinstance(reply, Exception):
+            reply = (task.objects[i], reply)
+        results[i] = reply
+    return results
+
+
+def _pipelined_delete(task):
+    """
+    Deletes a batch of objects over one pipelined connection. Returns
+    one result per object, in the same form as the single-object
+    worker produces.
+
+    :param task: the batch to delete
+    :type task: BatchDeleteTask
+    :rtype: list
+    """
+    pipeline = task.client.pipeline()
+    for obj in task.objects:
+        pipeline.delete(obj, **task.options)
+
+    try:
+        replies = pipeline.execute()
+    except KeyboardInterrupt:
+        raise
+    except Exception as err:
+        replies = [err] * len(task.objects)
+
+    return [_delete_error(obj, reply) if isinstance(reply, Exception)
+            else reply for obj, reply in zip(task.objects, replies)]
+
+
+def _delete_error(obj, err):
+    return (obj.bucket.bucket_type.name, obj.bucket.name, obj.key, err)
 
 
 def multiget(client, keys, **options):
@@ -229,9 +580,24 @@ def multiget(client, keys, **options):
     bucket-type, bucket, key, and the exception raised.
 
     If a ``pool`` option is included, the request will use the given worker
-    pool and not a transient :class:`~riak.client.multi.MultiGetPool`. This
-    option will be passed by the client if the ``multiget_pool_size``
-    option was set on client initialization.
+    pool and not the :func:`shared_pool`. This option will be passed by
+    the client if the ``multiget_pool_size`` option was set on client
+    initialization.
+
+    If a ``pipeline`` option is included, keys are handed to the
+    workers in batches of that size, and each batch is fetched over a
+    single pipelined connection. This option will be passed by the
+    client if the ``pipeline_depth`` transport option was set.
+
+    When the client uses :ref:`token-aware routing
+    <token-aware-routing>`, pipelined keys are first grouped by the
+    node that owns them, using the cached preflists of the keys. Each
+    batch is sent to its owner, saving the hop of a coordinating node
+    forwarding the requests.
+
+    If a ``concurrency`` option is included, at most that many keys
+    are queued or being fetched at once, leaving the other workers of
+    a shared pool free for other requests.
 
     :param client: the client to use
     :type client: :class:`~riak.client.RiakClient`
@@ -243,35 +609,82 @@ def multiget(client, keys, **options):
     :rtype: list
 
     """
-    transient_pool = False
-    outq = Queue()
+    pipeline_depth = options.pop('pipeline', None)
+    concurrency = options.pop('concurrency', None)
+    pool = options.pop('pool', None) or shared_pool(MultiGetPool)
+
+    def make_task(outq, batch):
+        if pipeline_depth:
+            return BatchTask(client, outq, batch, options)
+        bucket_type, bucket, key = batch[0]
+        return Task(client, outq, bucket_type, bucket, key, None, options)
+
+    limit = concurrency or len(keys)
+    if pipeline_depth and client._preflists is not None:
+        pool.start()
+        batches = _owner_batches(client, keys, pipeline_depth, pool)
+        return list(_windowed(pool, batches, limit, None, make_task,
+                              'Multi-get'))
+    return list(_windowed(pool, keys, limit, pipeline_depth or 1,
+                          make_task, 'Multi-get'))
+
+
+def multiget_iter(client, keys, max_in_flight=MAX_IN_FLIGHT, **options):
+    """Executes a parallel-fetch across multiple threads, yielding
+    ``((bucket_type, bucket, key), result)`` pairs as the fetches
+    complete. Each result is a :class:`~riak.riak_object.RiakObject`
+    or :class:`~riak.datatypes.Datatype` instance, or a 4-tuple of
+    bucket-type, bucket, key, and the exception raised.
 
-    if 'pool' in options:
-        pool = options['pool']
-        del options['pool']
-    else:
-        pool = MultiGetPool()
-        transient_pool = True
+    ``keys`` may be any iterable, including a generator. It is
+    consumed only as results are taken, so that at most
+    ``max_in_flight`` keys are queued or being fetched at once, and
+    results are not held in memory once they are yielded.
 
-    try:
-        pool.start()
-        for bucket_type, bucket, key in keys:
-            task = Task(client, outq, bucket_type, bucket, key, None, options)
-            pool.enq(task)
-
-        results = []
-        for _ in range(len(keys)):
-            if pool.stopped():
-                raise RuntimeError(
-                        'Multi-get operation interrupted by pool '
-                        'stopping!')
-            results.append(outq.get())
-            outq.task_done()
-    finally:
-        if transient_pool:
-            pool.stop()
+    The ``pool`` and ``pipeline`` options are used as by
+    :func:`multiget`.
 
-    return results
+    :param client: the client to use
+    :type client: :class:`~riak.client.RiakClient`
+    :param keys: the keys to fetch in parallel
+    :type keys: iterable of three-tuples -- bucket_type/bucket/key
+    :param max_in_flight: the most keys queued or being fetched
+    :type max_in_flight: int
+    :param options: request options to
+        :meth:`RiakBucket.get <riak.bucket.RiakBucket.get>`
+    :type options: dict
+    :rtype: generator
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be a positive integer")
+    pipeline_depth = options.pop('pipeline', None)
+    pool = options.pop('pool', None) or shared_pool(MultiGetPool)
+
+    def make_task(outq, batch):
+        keyed = _KeyedQueue(outq, batch)
+        if pipeline_depth:
+            return BatchTask(client, keyed, batch, options)
+        bucket_type, bucket, key = batch[0]
+        return Task(client, keyed, bucket_type, bucket, key, None, options)
+
+    for result in _windowed(pool, keys, max_in_flight, pipeline_depth or 1,
+                            make_task, 'Multi-get'):
+        yield result
+
+
+class _KeyedQueue(object):
+    """
+    Stands in for the output queue of a task, pairing each result the
+    worker puts with the key it belongs to. Workers put results in the
+    order of the task's keys.
+    """
+
+    def __init__(self, outq, keys):
+        self._outq = outq
+        self._keys = iter(keys)
+
+    def put(self, result):
+        self._outq.put((tuple(next(self._keys)), result))
 
 
 def multiput(client, objs, **options):
@@ -279,9 +692,17 @@ def multiput(client, objs, **options):
     containing booleans or :class:`~riak.riak_object.RiakObject`
 
     If a ``pool`` option is included, the request will use the given worker
-    pool and not a transient :class:`~riak.client.multi.MultiPutPool`. This
-    option will be passed by the client if the ``multiput_pool_size``
-    option was set on client initialization.
+    pool and not the :func:`shared_pool`. This option will be passed by
+    the client if the ``multiput_pool_size`` option was set on client
+    initialization.
+
+    If a ``pipeline`` option is included, objects are handed to the
+    workers in batches of that size, and each batch is stored over a
+    single pipelined connection. This option will be passed by the
+    client if the ``pipeline_depth`` transport option was set.
+
+    If a ``concurrency`` option is included, at most that many objects
+    are queued or being stored at once.
 
     :param client: the client to use
     :type client: :class:`RiakClient <riak.client.RiakClient>`
@@ -293,32 +714,146 @@ def multiput(client, objs, **options):
     :type options: dict
     :rtype: list
     """
-    transient_pool = False
-    outq = Queue()
+    pipeline_depth = options.pop('pipeline', None)
+    concurrency = options.pop('concurrency', None)
+    pool = options.pop('pool', None) or shared_pool(MultiPutPool)
 
-    if 'pool' in options:
-        pool = options['pool']
-        del options['pool']
-    else:
-        pool = MultiPutPool()
-        transient_pool = True
+    def make_task(outq, batch):
+        if pipeline_depth:
+            return BatchPutTask(client, outq, batch, options)
+        return PutTask(client, outq, batch[0], options)
 
-    try:
-        pool.start()
-        for obj in objs:
-            task = PutTask(client, outq, obj, options)
-            pool.enq(task)
-
-        results = []
-        for _ in range(len(objs)):
-            if pool.stopped():
-                raise RuntimeError(
-                        'Multi-put operation interrupted by pool '
-                        'stopping!')
-            results.append(outq.get())
-            outq.task_done()
-    finally:
-        if transient_pool:
-            pool.stop()
+    return list(_windowed(pool, objs, concurrency or len(objs),
+                          pipeline_depth or 1, make_task, 'Multi-put'))
 
-    return results
+
+def multidelete(client, keys, **options):
+    """Executes a parallel-delete across multiple threads. Returns a
+    list containing True for each deleted key, or 4-tuples of
+    bucket-type, bucket, key, and the exception raised.
+
+    ``keys`` may be any iterable, including a generator, so that very
+    many keys can be deleted without holding them in memory. At most
+    ``concurrency`` keys, or :data:`MAX_IN_FLIGHT` by default, are
+    queued or being deleted at once.
+
+    The ``pool`` and ``pipeline`` options are used as by
+    :func:`multiput`.
+
+    :param client: the client to use
+    :type client: :class:`RiakClient <riak.client.RiakClient>`
+    :param keys: the keys to delete in parallel
+    :type keys: iterable of three-tuples -- bucket_type/bucket/key --
+        or of :class:`~riak.riak_object.RiakObject`
+    :param options: request options to
+        :meth:`RiakClient.delete <riak.client.RiakClient.delete>`
+    :type options: dict
+    :rtype: list
+    """
+    pipeline_depth = options.pop('pipeline', None)
+    concurrency = options.pop('concurrency', None) or MAX_IN_FLIGHT
+    pool = options.pop('pool', None) or shared_pool(MultiPutPool)
+
+    def make_task(outq, batch):
+        objs = [_delete_object(client, item) for item in batch]
+        if pipeline_depth:
+            return BatchDeleteTask(client, outq, objs, options)
+        return DeleteTask(client, outq, objs[0], options)
+
+    return list(_windowed(pool, keys, concurrency, pipeline_depth or 1,
+                          make_task, 'Multi-delete'))
+
+
+def _delete_object(client, item):
+    if isinstance(item, RiakObject):
+        return item
+    bucket_type, bucket, key = item
+    return RiakObject(client, client.bucket_type(bucket_type).bucket(bucket),
+                      key)
+
+
+def multi_update_datatype(client, datatypes, **options):
+    """Executes parallel updates of Data Types across multiple
+    threads. Returns a list containing the result of
+    :meth:`RiakClient.update_datatype
+    <riak.client.RiakClient.update_datatype>` for each Data Type, or
+    2-tuples of the Data Type and the exception raised.
+
+    Data Type updates are not idempotent, so they are neither retried
+    nor pipelined. At most ``concurrency`` updates, or
+    :data:`MAX_IN_FLIGHT` by default, are queued or in progress at
+    once. The ``pool`` option is used as by :func:`multiput`.
+
+    :param client: the client to use
+    :type client: :class:`RiakClient <riak.client.RiakClient>`
+    :param datatypes: the Data Types with pending changes
+    :type datatypes: iterable of :class:`~riak.datatypes.Datatype`
+    :param options: request options to
+        :meth:`RiakClient.update_datatype
+        <riak.client.RiakClient.update_datatype>`
+    :type options: dict
+    :rtype: list
+    """
+    options.pop('pipeline', None)
+    concurrency = options.pop('concurrency', None) or MAX_IN_FLIGHT
+    pool = options.pop('pool', None) or shared_pool(MultiPutPool)
+
+    def make_task(outq, batch):
+        return UpdateDatatypeTask(client, outq, batch[0], options)
+
+    return list(_windowed(pool, datatypes, concurrency, 1, make_task,
+                          'Multi-update'))
+
+
+def _windowed(pool, items, limit, batch_size, make_task, name):
+    """
+    Hands items to a pool's workers in batches, yielding the results
+    as they arrive. Items are taken from ``items`` only as needed to
+    keep ``limit`` of them queued or in progress.
+
+    :param pool: the pool to use
+    :type pool: :class:`MultiPool`
+    :param items: the keys or objects
+    :type items: iterable
+    :param limit: the most items queued or in progress
+    :type limit: int
+    :param batch_size: the most items in each task, or None if
+        ``items`` are lists of items already split into batches
+    :type batch_size: int
+    :param make_task: creates a task from an output queue and a list
+        of items
+    :type make_task: function
+    :param name: the name of the operation, for errors
+    :type name: string
+    :rtype: generator
+    """
+    pool.start()
+    outq = Queue()
+    items = iter(items)
+    in_flight = 0
+    exhausted = False
+    while True:
+        # Top up the queue to the limit before taking a result
+        while not exhausted and in_flight < limit:
+            if batch_size is None:
+                batch = next(items, [])
+                exhausted = not batch
+            else:
+                count = min(batch_size, limit - in_flight)
+                batch = list(islice(items, count))
+                if len(batch) < count:
+                    exhausted = True
+            if not batch:
+                break
+            pool.enq(make_task(outq, batch))
+            in_flight += len(batch)
+        if not in_flight:
+            break
+        if pool.stopped():
+            raise RuntimeError(
+                    '{0} operation interrupted by pool stopping!'.format(
+                        name))
+        result = outq.get()
+        outq.task_done()
+        in_flight -= 1
+        yield result
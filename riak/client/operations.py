@@ -14,14 +14,16 @@
 
 import six
 import riak.client.multi
+import riak.client.timeseries
 
 from riak import ListError
 from riak.client.transport import RiakClientTransport, \
-        retryable, retryableHttpOnly
+        retryable, retryableHttpOnly, retryableRouted, retryableHedged
+from riak.client.cache import _uncache
 from riak.client.index_page import IndexPage
+from riak.client.pipeline import Pipeline
 from riak.datatypes import TYPES
-from riak.table import Table
-from riak.util import bytes_to_str
+from riak.util import bytes_to_str, _validate_timeout
 
 
 class RiakClientOperations(RiakClientTransport):
@@ -69,7 +71,8 @@ class RiakClientOperations(RiakClientTransport):
                 transport.get_buckets(bucket_type=bucket_type,
                                       timeout=timeout)]
 
-    def stream_buckets(self, bucket_type=None, timeout=None):
+    def stream_buckets(self, bucket_type=None, timeout=None,
+                       retry_policy=None):
         """
         Streams the list of buckets. This is a generator method that
         should be iterated over.
@@ -100,6 +103,9 @@ class RiakClientOperations(RiakClientTransport):
         :type bucket_type: :class:`~riak.bucket.BucketType`
         :param timeout: a timeout value in milliseconds
         :type timeout: int
+        :param retry_policy: the retry policy if the stream cannot be
+           started, instead of the client's
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         :rtype: iterator that yields lists of :class:`RiakBucket
              <riak.bucket.RiakBucket>` instances
 
@@ -118,7 +124,7 @@ class RiakClientOperations(RiakClientTransport):
             return transport.stream_buckets(
                     bucket_type=bucket_type, timeout=timeout)
 
-        for bucket_list in self._stream_with_retry(make_op):
+        for bucket_list in self._stream_with_retry(make_op, retry_policy):
             bucket_list = [bucketfn(bytes_to_str(name), bucket_type)
                            for name in bucket_list]
             if len(bucket_list) > 0:
@@ -481,7 +487,7 @@ class RiakClientOperations(RiakClientTransport):
 
         return transport.get_keys(bucket, timeout=timeout)
 
-    def stream_keys(self, bucket, timeout=None):
+    def stream_keys(self, bucket, timeout=None, retry_policy=None):
         """
         Lists all keys in a bucket via a stream. This is a generator
         method which should be iterated over.
@@ -512,6 +518,9 @@ class RiakClientOperations(RiakClientTransport):
         :type bucket: RiakBucket
         :param timeout: a timeout value in milliseconds
         :type timeout: int
+        :param retry_policy: the retry policy if the stream cannot be
+           started, instead of the bucket's
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         :rtype: iterator
         """
         if not riak.disable_list_exceptions:
@@ -522,14 +531,15 @@ class RiakClientOperations(RiakClientTransport):
         def make_op(transport):
             return transport.stream_keys(bucket, timeout=timeout)
 
-        for keylist in self._stream_with_retry(make_op):
+        policy = retry_policy or bucket.retry_policy
+        for keylist in self._stream_with_retry(make_op, policy):
             if len(keylist) > 0:
                 if six.PY2:
                     yield keylist
                 else:
                     yield [bytes_to_str(item) for item in keylist]
 
-    @retryable
+    @retryableRouted
     def put(self, transport, robj, w=None, dw=None, pw=None, return_body=None,
             if_none_match=None, timeout=None):
         """
@@ -559,10 +569,13 @@ class RiakClientOperations(RiakClientTransport):
         :type timeout: int
         """
         _validate_timeout(timeout)
-        return transport.put(robj, w=w, dw=dw, pw=pw,
-                             return_body=return_body,
-                             if_none_match=if_none_match,
-                             timeout=timeout)
+        try:
+            return transport.put(robj, w=w, dw=dw, pw=pw,
+                                 return_body=return_body,
+                                 if_none_match=if_none_match,
+                                 timeout=timeout)
+        finally:
+            _uncache(robj)
 
     @retryable
     def ts_describe(self, transport, table):
@@ -580,13 +593,13 @@ class RiakClientOperations(RiakClientTransport):
         """
         t = table
         if isinstance(t, six.string_types):
-            t = Table(self, table)
+            t = self.table(table)
         return transport.ts_describe(t)
 
     @retryable
-    def ts_get(self, transport, table, key):
+    def ts_get(self, transport, table, key, format=None):
         """
-        ts_get(table, key)
+        ts_get(table, key, format=None)
 
         Retrieve timeseries value by key
 
@@ -597,27 +610,47 @@ class RiakClientOperations(RiakClientTransport):
         :type table: string or :class:`Table <riak.table.Table>`
         :param key: The timeseries value's key.
         :type key: list
+        :param format: 'rows' (the default) or 'columnar' to decode
+           the result into per-column arrays, as in :meth:`ts_query`
+        :type format: string
         :rtype: :class:`TsObject <riak.ts_object.TsObject>`
         """
         t = table
         if isinstance(t, six.string_types):
-            t = Table(self, table)
-        return transport.ts_get(t, key)
+            t = self.table(table)
+        t._check_key(key)
+        return transport.ts_get(t, key, columnar=_is_columnar(format))
 
-    @retryable
-    def ts_put(self, transport, tsobj):
+    def ts_put(self, tsobj, retry_policy=None):
         """
-        ts_put(tsobj)
+        ts_put(tsobj, retry_policy=None)
 
-        Stores time series data in the Riak cluster.
+        Stores time series data in the Riak cluster. The first put to
+        a table fetches its :meth:`schema <riak.table.Table.schema>`
+        unless it is cached, so that the rows are encoded by an
+        encoder compiled for its column types.
 
         .. note:: This request is automatically retried :attr:`retries`
            times if it fails due to network error.
 
         :param tsobj: the time series object to store
         :type tsobj: RiakTsObject
+        :param retry_policy: the retry policy of this request, instead
+           of the client's
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         :rtype: boolean
         """
+        tsobj.table._load_schema()
+        return self._ts_put(tsobj, retry_policy=retry_policy)
+
+    @retryable
+    def _ts_put(self, transport, tsobj):
+        """
+        _ts_put(tsobj)
+
+        Stores time series data with the rows encoded by the table's
+        cached schema, if any. Used internally by :meth:`ts_put`.
+        """
         return transport.ts_put(tsobj)
 
     @retryable
@@ -638,16 +671,25 @@ class RiakClientOperations(RiakClientTransport):
         """
         t = table
         if isinstance(t, six.string_types):
-            t = Table(self, table)
+            t = self.table(table)
+        t._check_key(key)
         return transport.ts_delete(t, key)
 
     @retryable
-    def ts_query(self, transport, table, query, interpolations=None):
+    def ts_query(self, transport, table, query, interpolations=None,
+                 format=None):
         """
-        ts_query(table, query, interpolations=None)
+        ts_query(table, query, interpolations=None, format=None)
 
         Queries time series data in the Riak cluster.
 
+        With ``format='columnar'`` the result is decoded column by
+        column into the :attr:`~riak.ts_object.TsObject.arrays` of the
+        returned object, instead of into rows. Numeric columns are
+        NumPy arrays when NumPy is installed, or :class:`array.array`
+        instances otherwise, ready for analysis without building a
+        list per row.
+
         .. note:: This request is automatically retried :attr:`retries`
            times if it fails due to network error.
 
@@ -655,12 +697,104 @@ class RiakClientOperations(RiakClientTransport):
         :type table: string or :class:`Table <riak.table.Table>`
         :param query: The timeseries query.
         :type query: string
+        :param format: 'rows' (the default) or 'columnar'
+        :type format: string
         :rtype: :class:`TsObject <riak.ts_object.TsObject>`
         """
         t = table
         if isinstance(t, six.string_types):
-            t = Table(self, table)
-        return transport.ts_query(t, query, interpolations)
+            t = self.table(table)
+        return transport.ts_query(t, query, interpolations,
+                                  columnar=_is_columnar(format))
+
+    def ts_stream_query(self, table, query, chunk_rows=None,
+                        interpolations=None, quantum=None, parallel=1):
+        """
+        Queries time series data over a time range one quantum at a
+        time, yielding lists of at most ``chunk_rows`` rows in time
+        order, so that large scans do not build one huge result. The
+        query must bound the table's quantum column with an integer
+        lower and upper bound, e.g.::
+
+            query = 'select * from {table} where ' \
+                    'time >= 1443806900000 and time < 1443900000000 ' \
+                    'and geohash = \'hash1\' and user = \'user2\''
+            for rows in client.ts_stream_query(table, query,
+                                               chunk_rows=500):
+                do_something(rows)
+
+        The quantum is looked up with :meth:`Table.quantum
+        <riak.table.Table.quantum>` unless one is passed. With
+        ``parallel`` greater than one, that many quanta are queried
+        at once, across the nodes of the cluster.
+
+        :param table: The timeseries table.
+        :type table: string or :class:`Table <riak.table.Table>`
+        :param query: The timeseries query.
+        :type query: string
+        :param chunk_rows: the most rows in each list yielded,
+           defaulting to
+           :data:`~riak.client.timeseries.DEFAULT_CHUNK_ROWS`
+        :type chunk_rows: int
+        :param interpolations: the interpolations of the query
+        :type interpolations: dict
+        :param quantum: the quantum of the table
+        :type quantum: :class:`~riak.table.Quantum`
+        :param parallel: the most quanta queried at once
+        :type parallel: int
+        :rtype: generator of lists
+        """
+        t = table
+        if isinstance(t, six.string_types):
+            t = self.table(table)
+        if chunk_rows is None:
+            chunk_rows = riak.client.timeseries.DEFAULT_CHUNK_ROWS
+        return riak.client.timeseries.stream_query(
+            self, t, query, chunk_rows=chunk_rows,
+            interpolations=interpolations, quantum=quantum,
+            parallel=parallel)
+
+    def ts_bulk_writer(self, table, batch_rows=None, max_in_flight=None,
+                       flush_interval=None):
+        """
+        Creates a :class:`~riak.client.timeseries.BulkWriter` for
+        ingesting many rows. Rows added to it are stored in batches of
+        ``batch_rows``, with up to ``max_in_flight`` batches encoded
+        and stored at once by the multi put pool::
+
+            with client.ts_bulk_writer(table, batch_rows=500,
+                                       flush_interval=1) as writer:
+                for point in points:
+                    writer.add(point)
+            if writer.errors:
+                retry_later(writer.errors)
+
+        :param table: The timeseries table.
+        :type table: string or :class:`Table <riak.table.Table>`
+        :param batch_rows: the most rows in each request, defaulting
+           to :data:`~riak.client.timeseries.DEFAULT_BATCH_ROWS`
+        :type batch_rows: int
+        :param max_in_flight: the most batches being stored at once,
+           defaulting to the size of the multi put pool
+        :type max_in_flight: int
+        :param flush_interval: the seconds between sends of buffered
+           rows, or None to send only full batches until the writer
+           is flushed
+        :type flush_interval: float
+        :rtype: :class:`~riak.client.timeseries.BulkWriter`
+        """
+        t = table
+        if isinstance(t, six.string_types):
+            t = self.table(table)
+        pool = self._multiput_pool
+        options = {'flush_interval': flush_interval, 'pool': pool}
+        if batch_rows is not None:
+            options['batch_rows'] = batch_rows
+        if max_in_flight is not None:
+            options['max_in_flight'] = max_in_flight
+        elif pool is not None:
+            options['max_in_flight'] = pool._size
+        return riak.client.timeseries.BulkWriter(self, t, **options)
 
     def ts_stream_keys(self, table, timeout=None):
         """
@@ -697,7 +831,7 @@ class RiakClientOperations(RiakClientTransport):
 
         t = table
         if isinstance(t, six.string_types):
-            t = Table(self, table)
+            t = self.table(table)
 
         _validate_timeout(timeout)
 
@@ -712,17 +846,32 @@ class RiakClientOperations(RiakClientTransport):
         finally:
             stream.close()
 
-    @retryable
+    @retryableHedged
     def get(self, transport, robj, r=None, pr=None, timeout=None,
             basic_quorum=None, notfound_ok=None, head_only=False):
         """
-        get(robj, r=None, pr=None, timeout=None)
+        get(robj, r=None, pr=None, timeout=None, hedge=None,\
+            retry_policy=None)
 
         Fetches the contents of a Riak object.
 
         .. note:: This request is automatically retried :attr:`retries`
            times if it fails due to network error.
 
+        Passing ``hedge`` makes this a hedged read: if no reply has
+        arrived after a delay, the request is also sent to a different
+        node and the first reply is used. ``hedge`` is the delay in
+        seconds, or ``True`` to use the
+        :data:`~riak.client.transport.HEDGE_PERCENTILE` of the first
+        node's recent latencies. Hedged reads run in background
+        threads; the slower request finishes there so that its
+        connection can be reused.
+
+        When the client was created with ``coalesce_reads=True``,
+        concurrent gets of the same key with the same options share a
+        single request, and each caller's object is filled in with its
+        own copy of the result.
+
         :param robj: the object to fetch
         :type robj: RiakObject
         :param r: the read quorum
@@ -739,6 +888,12 @@ class RiakClientOperations(RiakClientTransport):
         :param head_only: whether to fetch without value, so only metadata
            (only available on PB transport)
         :type head_only: bool
+        :param hedge: the delay before a hedged request, or True to
+           derive it from recent latencies
+        :type hedge: float, boolean, None
+        :param retry_policy: the retry policy of this request, instead
+           of the bucket's or client's
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         """
         _validate_timeout(timeout)
         if not isinstance(robj.key, six.string_types):
@@ -750,7 +905,7 @@ class RiakClientOperations(RiakClientTransport):
                              notfound_ok=notfound_ok,
                              head_only=head_only)
 
-    @retryable
+    @retryableRouted
     def delete(self, transport, robj, rw=None, r=None, w=None, dw=None,
                pr=None, pw=None, timeout=None):
         """
@@ -780,8 +935,11 @@ class RiakClientOperations(RiakClientTransport):
         :type timeout: int
         """
         _validate_timeout(timeout)
-        return transport.delete(robj, rw=rw, r=r, w=w, dw=dw, pr=pr,
-                                pw=pw, timeout=timeout)
+        try:
+            return transport.delete(robj, rw=rw, r=r, w=w, dw=dw, pr=pr,
+                                    pw=pw, timeout=timeout)
+        finally:
+            _uncache(robj)
 
     @retryable
     def mapred(self, transport, inputs, query, timeout):
@@ -1005,7 +1163,9 @@ class RiakClientOperations(RiakClientTransport):
 
         :param pairs: list of bucket_type/bucket/key tuple triples
         :type pairs: list
-        :param params: additional request flags, e.g. r, pr
+        :param params: additional request flags, e.g. r, pr, hedge
+           to hedge each fetch as in :meth:`get`, or concurrency to
+           limit the keys fetched at once
         :type params: dict
         :rtype: list of :class:`RiakObjects <riak.riak_object.RiakObject>`,
             :class:`Datatypes <riak.datatypes.Datatype>`, or tuples of
@@ -1013,23 +1173,126 @@ class RiakClientOperations(RiakClientTransport):
         """
         if self._multiget_pool:
             params['pool'] = self._multiget_pool
+        # NB: hedged fetches are sent separately, not pipelined
+        if self._pipeline_depth and self.protocol == 'pbc' and \
+                not params.get('hedge'):
+            params['pipeline'] = self._pipeline_depth
         return riak.client.multi.multiget(self, pairs, **params)
 
+    def multiget_iter(self, pairs, max_in_flight=None, **params):
+        """
+        Fetches many keys in parallel via threads, yielding each result
+        as soon as it is fetched::
+
+            for bkey, obj in client.multiget_iter(keys, max_in_flight=50):
+                do_something(bkey, obj)
+
+        Unlike :meth:`multiget`, the keys may be a lazy iterable, and
+        at most ``max_in_flight`` of them are fetched or waiting to be
+        fetched at once.
+
+        :param pairs: bucket_type/bucket/key tuple triples
+        :type pairs: iterable
+        :param max_in_flight: the most keys fetched or queued at once,
+           defaulting to :data:`~riak.client.multi.MAX_IN_FLIGHT`
+        :type max_in_flight: int
+        :param params: additional request flags, e.g. r, pr, or hedge
+           to hedge each fetch as in :meth:`get`
+        :type params: dict
+        :rtype: generator of pairs of a bucket_type/bucket/key triple
+            and a :class:`~riak.riak_object.RiakObject`,
+            :class:`~riak.datatypes.Datatype`, or tuple of bucket_type,
+            bucket, key, and the exception raised on fetch
+        """
+        if self._multiget_pool:
+            params['pool'] = self._multiget_pool
+        # NB: hedged fetches are sent separately, not pipelined
+        if self._pipeline_depth and self.protocol == 'pbc' and \
+                not params.get('hedge'):
+            params['pipeline'] = self._pipeline_depth
+        if max_in_flight is None:
+            max_in_flight = riak.client.multi.MAX_IN_FLIGHT
+        return riak.client.multi.multiget_iter(
+            self, pairs, max_in_flight=max_in_flight, **params)
+
     def multiput(self, objs, **params):
         """
         Stores objects in parallel via threads.
 
         :param objs: the objects to store
         :type objs: list of `RiakObject <riak.riak_object.RiakObject>`
-        :param params: additional request flags, e.g. w, dw, pw
+        :param params: additional request flags, e.g. w, dw, pw, or
+           concurrency to limit the objects stored at once
         :type params: dict
         :rtype: list of boolean or
             :class:`RiakObjects <riak.riak_object.RiakObject>`,
         """
         if self._multiput_pool:
             params['pool'] = self._multiput_pool
+        if self._pipeline_depth and self.protocol == 'pbc':
+            params['pipeline'] = self._pipeline_depth
         return riak.client.multi.multiput(self, objs, **params)
 
+    def multidelete(self, keys, **params):
+        """
+        Deletes keys in parallel via threads. Keys are pipelined when
+        the ``pipeline_depth`` transport option is set.
+
+        :param keys: the keys to delete, which may be a lazy iterable
+        :type keys: iterable of bucket_type/bucket/key tuple triples or
+            of :class:`RiakObjects <riak.riak_object.RiakObject>`
+        :param params: additional request flags, e.g. rw, w, pw, or
+           concurrency to limit the keys deleted at once
+        :type params: dict
+        :rtype: list of True or tuples of bucket_type, bucket, key, and
+            the exception raised on delete
+        """
+        if self._multiput_pool:
+            params['pool'] = self._multiput_pool
+        if self._pipeline_depth and self.protocol == 'pbc':
+            params['pipeline'] = self._pipeline_depth
+        return riak.client.multi.multidelete(self, keys, **params)
+
+    def multi_update_datatype(self, datatypes, **params):
+        """
+        Sends the pending changes of many Data Types in parallel via
+        threads. As with :meth:`update_datatype`, the updates are not
+        retried.
+
+        :param datatypes: the Data Types to update
+        :type datatypes: iterable of :class:`~riak.datatypes.Datatype`
+        :param params: additional request flags, e.g. w, return_body,
+           or concurrency to limit the updates sent at once
+        :type params: dict
+        :rtype: list of the results of :meth:`update_datatype`, or
+            tuples of the Data Type and the exception raised
+        """
+        if self._multiput_pool:
+            params['pool'] = self._multiput_pool
+        return riak.client.multi.multi_update_datatype(self, datatypes,
+                                                       **params)
+
+    def pipeline(self, nodes=None):
+        """
+        Creates a :class:`~riak.client.pipeline.Pipeline` that sends a
+        batch of gets and puts back-to-back over a single Protocol
+        Buffers connection, matching the replies in order. Example::
+
+            with client.pipeline() as p:
+                for key in keys:
+                    p.get(bucket, key)
+            objs = p.results
+
+        Setting the ``pipeline_depth`` transport option also makes
+        :meth:`multiget` and :meth:`multiput` pipeline their requests.
+
+        :param nodes: nodes to prefer for the connection, e.g. the
+           owners of the keys
+        :type nodes: list of :class:`~riak.node.RiakNode`
+        :rtype: :class:`~riak.client.pipeline.Pipeline`
+        """
+        return Pipeline(self, nodes=nodes)
+
     @retryable
     def get_counter(self, transport, bucket, key, r=None, pr=None,
                     basic_quorum=None, notfound_ok=None):
@@ -1105,12 +1368,14 @@ class RiakClientOperations(RiakClientTransport):
 
     def fetch_datatype(self, bucket, key, r=None, pr=None,
                        basic_quorum=None, notfound_ok=None,
-                       timeout=None, include_context=None):
+                       timeout=None, include_context=None, hedge=None,
+                       retry_policy=None):
         """
         Fetches the value of a Riak Datatype.
 
         .. note:: This request is automatically retried :attr:`retries`
-           times if it fails due to network error.
+           times if it fails due to network error. It is hedged when
+           ``hedge`` is given, as in :meth:`get`.
 
         :param bucket: the bucket of the datatype, which must belong to a
           :class:`~riak.bucket.BucketType`
@@ -1132,12 +1397,19 @@ class RiakClientOperations(RiakClientTransport):
           as well as the value, which is useful for removal operations
           on sets and maps
         :type include_context: bool, None
+        :param hedge: the delay before a hedged request, or True to
+           derive it from recent latencies
+        :type hedge: float, boolean, None
+        :param retry_policy: the retry policy of this request, instead
+           of the bucket's or client's
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         :rtype: :class:`~riak.datatypes.Datatype`
         """
         dtype, value, context = self._fetch_datatype(
             bucket, key, r=r, pr=pr, basic_quorum=basic_quorum,
             notfound_ok=notfound_ok, timeout=timeout,
-            include_context=include_context)
+            include_context=include_context, hedge=hedge,
+            retry_policy=retry_policy)
 
         return TYPES[dtype](bucket=bucket, key=key, value=value,
                             context=context)
@@ -1168,7 +1440,8 @@ class RiakClientOperations(RiakClientTransport):
         """
         _validate_timeout(timeout)
 
-        with self._transport() as transport:
+        nodes = self._key_owners(datatype.bucket, datatype.key)
+        with self._transport(nodes) as transport:
             return transport.update_datatype(datatype, w=w, dw=dw, pw=pw,
                                              return_body=return_body,
                                              timeout=timeout,
@@ -1212,7 +1485,7 @@ class RiakClientOperations(RiakClientTransport):
         del unused  # Ignored parameters.
         return self.bucket(name)
 
-    @retryable
+    @retryableHedged
     def _fetch_datatype(self, transport, bucket, key, r=None, pr=None,
                         basic_quorum=None, notfound_ok=None,
                         timeout=None, include_context=None):
@@ -1267,22 +1540,13 @@ def _validate_bucket_props(props):
                 'hll_precision must be between 4 and 16, inclusive')
 
 
-def _validate_timeout(timeout, infinity_ok=False):
+def _is_columnar(format):
     """
-    Raises an exception if the given timeout is an invalid value.
+    Checks the result format of a timeseries request, returning
+    whether it is columnar.
     """
-    if timeout is None:
-        return
-
-    if timeout == 'infinity':
-        if infinity_ok:
-            return
-        else:
-            raise ValueError(
-                'timeout must be a positive integer '
-                '("infinity" is not valid)')
-
-    if isinstance(timeout, six.integer_types) and timeout > 0:
-        return
-
-    raise ValueError('timeout must be a positive integer')
+    if format is None or format == 'rows':
+        return False
+    elif format == 'columnar':
+        return True
+    raise ValueError("format must be 'rows' or 'columnar'")
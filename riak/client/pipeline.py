@@ -0,0 +1,155 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import six
+
+from riak.client.cache import _uncache
+from riak.riak_object import RiakObject
+from riak.util import _validate_timeout
+
+__all__ = ['Pipeline']
+
+
+class Pipeline(object):
+    """
+    Collects get, put and delete requests and sends them over a single
+    Protocol Buffers connection without waiting for each reply in
+    turn. The replies are matched to the requests in order. Create
+    one with :meth:`RiakClient.pipeline
+    <riak.client.RiakClient.pipeline>`::
+
+        with client.pipeline() as p:
+            one = p.get(bucket, 'one')
+            two = p.get(bucket, 'two')
+            p.put(bucket.new('three', data=3))
+
+        for result in p.results:
+            do_something(result)
+
+    The requests are sent when the ``with`` block exits without an
+    exception, or when :meth:`execute` is called.
+    """
+
+    def __init__(self, client, nodes=None):
+        """
+        :param client: the client to use
+        :type client: :class:`~riak.client.RiakClient`
+        :param nodes: nodes to send the requests to, e.g. the owners
+           of their keys. Other nodes are used once these have all
+           failed.
+        :type nodes: list of :class:`~riak.node.RiakNode`
+        """
+        self._client = client
+        self._nodes = nodes
+        self._requests = []
+        self.results = None
+
+    def get(self, bucket, key, r=None, pr=None, timeout=None,
+            basic_quorum=None, notfound_ok=None, head_only=False):
+        """
+        Queues a fetch of a key. See :meth:`RiakClient.get
+        <riak.client.RiakClient.get>` for the options.
+
+        :param bucket: the bucket of the key
+        :type bucket: :class:`~riak.bucket.RiakBucket`
+        :param key: the key to fetch
+        :type key: string
+        :rtype: :class:`~riak.riak_object.RiakObject` that will be
+           filled in when the pipeline is executed
+        """
+        _validate_timeout(timeout)
+        if not isinstance(key, six.string_types):
+            raise TypeError(
+                'key must be a string, instead got {0}'.format(repr(key)))
+        robj = RiakObject(self._client, bucket, key)
+        self._requests.append(('get', robj,
+                               {'r': r, 'pr': pr, 'timeout': timeout,
+                                'basic_quorum': basic_quorum,
+                                'notfound_ok': notfound_ok,
+                                'head_only': head_only}))
+        return robj
+
+    def put(self, robj, w=None, dw=None, pw=None, return_body=None,
+            if_none_match=None, timeout=None):
+        """
+        Queues a store of an object. See :meth:`RiakClient.put
+        <riak.client.RiakClient.put>` for the options.
+
+        :param robj: the object to store
+        :type robj: :class:`~riak.riak_object.RiakObject`
+        :rtype: :class:`~riak.riak_object.RiakObject`
+        """
+        _validate_timeout(timeout)
+        self._requests.append(('put', robj,
+                               {'w': w, 'dw': dw, 'pw': pw,
+                                'return_body': return_body,
+                                'if_none_match': if_none_match,
+                                'timeout': timeout}))
+        return robj
+
+    def delete(self, robj, rw=None, r=None, w=None, dw=None, pr=None,
+               pw=None, timeout=None):
+        """
+        Queues a delete of an object. See :meth:`RiakClient.delete
+        <riak.client.RiakClient.delete>` for the options. Its result is
+        True once the pipeline is executed.
+
+        :param robj: the object to delete
+        :type robj: :class:`~riak.riak_object.RiakObject`
+        :rtype: :class:`~riak.riak_object.RiakObject`
+        """
+        _validate_timeout(timeout)
+        self._requests.append(('delete', robj,
+                               {'rw': rw, 'r': r, 'w': w, 'dw': dw,
+                                'pr': pr, 'pw': pw, 'timeout': timeout}))
+        return robj
+
+    def execute(self):
+        """
+        Sends all queued requests. Network failures are retried
+        according to :attr:`RiakClient.retries
+        <riak.client.RiakClient.retries>`, resending only the requests
+        that had not been answered, so that stores and deletes Riak
+        has acknowledged are not repeated. Errors reported by Riak for
+        a single request are returned in that request's position.
+
+        :rtype: list of :class:`~riak.riak_object.RiakObject`, True
+           for deletes, or :class:`~riak.riak_error.RiakError`
+        """
+        requests, self._requests = self._requests, []
+        results = []
+
+        def thunk(transport):
+            return transport.pipeline(requests[len(results):], results)
+
+        if requests:
+            pool = self._client._choose_pool('pbc')
+            try:
+                self._client._with_retries(pool, thunk, nodes=self._nodes)
+            finally:
+                for op, robj, params in requests:
+                    if op != 'get':
+                        _uncache(robj)
+        self.results = results
+        return self.results
+
+    def __len__(self):
+        return len(self._requests)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
@@ -0,0 +1,169 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import time
+
+from threading import Lock
+
+__all__ = ['RetryPolicy', 'RetryTokenBucket']
+
+#: The longest delay, in seconds, :class:`RetryPolicy` waits between
+#: attempts by default
+DEFAULT_MAX_BACKOFF = 2.0
+
+
+class RetryTokenBucket(object):
+    """
+    A budget of retries shared by every operation whose
+    :class:`RetryPolicy` uses it. Each retry takes ``retry_cost``
+    tokens and each operation that succeeds without retrying returns
+    ``success_refund`` tokens, up to ``capacity``. When the bucket runs
+    dry, failures are raised instead of retried. This stops retries
+    from multiplying the load on a cluster that is already failing.
+    """
+
+    def __init__(self, capacity=100, retry_cost=5, success_refund=1):
+        """
+        :param capacity: the most tokens the bucket holds, which it
+            starts with
+        :type capacity: float
+        :param retry_cost: the tokens taken by each retry
+        :type retry_cost: float
+        :param success_refund: the tokens returned by each operation
+            that succeeds on its first attempt
+        :type success_refund: float
+        """
+        self.capacity = capacity
+        self.retry_cost = retry_cost
+        self.success_refund = success_refund
+        self.tokens = capacity
+        self._lock = Lock()
+
+    def acquire(self):
+        """
+        Takes the tokens for one retry.
+
+        :rtype: boolean, False if there were not enough tokens
+        """
+        with self._lock:
+            if self.tokens < self.retry_cost:
+                return False
+            self.tokens -= self.retry_cost
+            return True
+
+    def refund(self):
+        """
+        Returns tokens after an operation succeeded without retrying.
+        """
+        with self._lock:
+            self.tokens = min(self.capacity,
+                              self.tokens + self.success_refund)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether, and after how long, a failed operation is
+    retried. Retries of operations that fail because of network errors
+    or node failure wait an exponentially increasing delay with "full
+    jitter": a random time between 0 and ``backoff * 2 ** (retry - 1)``
+    seconds, capped at ``max_backoff``. An operation is not retried
+    once ``deadline`` seconds have passed since it started, nor when
+    the shared ``token_bucket`` is empty.
+
+    A policy can be given to the client, to a bucket, or to a single
+    operation with the ``retry_policy`` option; the most specific one
+    is used::
+
+        policy = RetryPolicy(backoff=0.05, deadline=2,
+                             token_bucket=RetryTokenBucket())
+        client = RiakClient(retry_policy=policy)
+        bucket.retry_policy = RetryPolicy(attempts=5, backoff=0.1)
+        bucket.get('key', retry_policy=RetryPolicy(attempts=1))
+
+    The default policy retries immediately, up to
+    :attr:`RiakClient.retries <riak.client.RiakClient.retries>` times.
+    """
+
+    def __init__(self, attempts=None, backoff=0,
+                 max_backoff=DEFAULT_MAX_BACKOFF, deadline=None,
+                 token_bucket=None):
+        """
+        :param attempts: the most times an operation is attempted,
+            defaulting to the client's :attr:`retries`
+        :type attempts: int
+        :param backoff: the base delay in seconds before a retry, or 0
+            to retry immediately
+        :type backoff: float
+        :param max_backoff: the longest delay in seconds before a retry
+        :type max_backoff: float
+        :param deadline: the seconds after an operation starts beyond
+            which it is not retried, or None for no limit
+        :type deadline: float
+        :param token_bucket: a budget of retries, shared with other
+            policies and clients, or None for no limit
+        :type token_bucket: :class:`RetryTokenBucket`
+        """
+        if attempts is not None and attempts < 1:
+            raise ValueError("attempts must be a positive integer")
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.token_bucket = token_bucket
+
+    def delay(self, retry):
+        """
+        Returns the seconds to wait before a retry.
+
+        :param retry: the number of the retry, starting at 1
+        :type retry: int
+        :rtype: float
+        """
+        if not self.backoff:
+            return 0
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (retry - 1))
+        return random.uniform(0, ceiling)
+
+    def retry_delay(self, retry, started):
+        """
+        Decides whether to retry a failed operation, taking a token
+        from the bucket if so.
+
+        :param retry: the number of the retry, starting at 1
+        :type retry: int
+        :param started: when the operation started, from
+            :func:`time.time`
+        :type started: float
+        :rtype: float, the seconds to wait before retrying, or None if
+            the deadline would pass or the token bucket is empty
+        """
+        delay = self.delay(retry)
+        if self.deadline is not None and \
+                time.time() + delay - started >= self.deadline:
+            return None
+        if self.token_bucket is not None and \
+                not self.token_bucket.acquire():
+            return None
+        return delay
+
+    def succeeded(self, retries):
+        """
+        Records that an operation succeeded.
+
+        :param retries: the number of times it was retried
+        :type retries: int
+        """
+        if self.token_bucket is not None and not retries:
+            self.token_bucket.refund()
@@ -0,0 +1,207 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+from binascii import hexlify
+from collections import OrderedDict
+from erlastic import encode
+from hashlib import sha1
+from threading import Lock
+from six import text_type
+
+#: The number of seconds a key's preflist is used for routing before
+#: it is fetched again
+DEFAULT_PREFLIST_TTL = 60
+
+#: The most keys whose preflists are cached at once
+DEFAULT_PREFLIST_CACHE_SIZE = 10000
+
+# The size of the hash space of the ring
+_RING_TOP = 2 ** 160
+
+# The (ring size, offset) layouts a cluster's ring may have. Ring
+# sizes are powers of two, and a key belongs to the partition after
+# the one its hash falls in, so the offset is expected to be 1.
+_LAYOUTS = [(2 ** i, offset) for i in range(1, 15) for offset in (1, 0)]
+
+
+class PreflistCache(object):
+    """
+    A thread-safe, size-bounded cache of the nodes that are primary
+    owners of bucket/key pairs, used for token-aware routing. The
+    least recently used entries are evicted first, and entries expire
+    after ``ttl`` seconds so that ring changes are picked up.
+
+    The preflists given to :meth:`add` also teach the cache which
+    nodes own each partition of the ring. Once the size of the ring
+    has been inferred from them, the owners of any key in a known
+    partition are found by hashing the key as Riak does, without
+    looking up its preflist. Buckets with a custom ``chash_keyfun``
+    defeat the inference, and then only the owners of keys that were
+    looked up are known.
+    """
+
+    def __init__(self, ttl=DEFAULT_PREFLIST_TTL,
+                 size=DEFAULT_PREFLIST_CACHE_SIZE):
+        """
+        :param ttl: the number of seconds an entry is kept
+        :type ttl: float
+        :param size: the most entries kept
+        :type size: int
+        """
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        # The ring layouts consistent with every preflist so far
+        self._layouts = list(_LAYOUTS)
+        # Partition -> (owning nodes, expiry time)
+        self._partitions = {}
+        # (bucket type, bucket) -> the length of its preflists
+        self._n_vals = {}
+        self._lock = Lock()
+
+    def get(self, bucket, key):
+        """
+        Returns the cached owners of a key, or None if they are not
+        cached or have expired.
+
+        :param bucket: the bucket of the key
+        :type bucket: :class:`~riak.bucket.RiakBucket`
+        :param key: the key
+        :type key: string
+        :rtype: list of :class:`~riak.node.RiakNode`
+        """
+        cache_key = self._cache_key(bucket, key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(cache_key, None)
+            if entry is not None and now < entry[1]:
+                # Re-insert to mark the entry as recently used
+                self._entries[cache_key] = entry
+                return entry[0]
+            n_val = self._n_vals.get(cache_key[:2])
+            if len(self._layouts) != 1 or n_val is None:
+                return None
+            size, offset = self._layouts[0]
+        first = _partition(_ring_position(bucket, key), size, offset)
+        nodes = []
+        with self._lock:
+            for i in range(n_val):
+                entry = self._partitions.get((first + i) % size)
+                if entry is None or now >= entry[1]:
+                    return None
+                nodes.extend(n for n in entry[0] if n not in nodes)
+        return nodes
+
+    def set(self, bucket, key, nodes):
+        """
+        Caches the owners of a key.
+
+        :param bucket: the bucket of the key
+        :type bucket: :class:`~riak.bucket.RiakBucket`
+        :param key: the key
+        :type key: string
+        :param nodes: the nodes owning the key
+        :type nodes: list of :class:`~riak.node.RiakNode`
+        """
+        cache_key = self._cache_key(bucket, key)
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._entries[cache_key] = (nodes, time.time() + self.ttl)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def add(self, bucket, key, preflist, nodes):
+        """
+        Caches the owners of a key given its preflist, and learns the
+        owners of the partitions the preflist names.
+
+        :param bucket: the bucket of the key
+        :type bucket: :class:`~riak.bucket.RiakBucket`
+        :param key: the key
+        :type key: string
+        :param preflist: the key's preflist, as returned by
+            :meth:`~riak.client.RiakClient.get_preflist`
+        :type preflist: list of dict
+        :param nodes: the client's nodes, matched to the node names of
+            the preflist
+        :type nodes: list of :class:`~riak.node.RiakNode`
+        :rtype: list of :class:`~riak.node.RiakNode`, the owners
+        """
+        def owners(items):
+            return [node for node in nodes
+                    if any(item['primary'] and node.matches_name(item['node'])
+                           for item in items)]
+
+        key_owners = owners(preflist)
+        self.set(bucket, key, key_owners)
+        if not preflist:
+            return key_owners
+        position = _ring_position(bucket, key)
+        partitions = set(item['partition'] for item in preflist)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._layouts = [
+                (size, offset) for size, offset in self._layouts
+                if _preflist_partitions(position, size, offset,
+                                        len(partitions)) == partitions]
+            self._n_vals[self._cache_key(bucket, key)[:2]] = len(partitions)
+            for item in preflist:
+                if item['primary']:
+                    self._partitions[item['partition']] = \
+                        (owners([item]), expires)
+        return key_owners
+
+    def clear(self):
+        """
+        Forgets all cached owners.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._layouts = list(_LAYOUTS)
+            self._partitions.clear()
+            self._n_vals.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _cache_key(self, bucket, key):
+        return (bucket.bucket_type.name, bucket.name, key)
+
+
+def _binary(value):
+    if isinstance(value, text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def _ring_position(bucket, key):
+    """
+    Returns the position of a key on the ring, hashed as by Riak's
+    default ``chash_keyfun``.
+    """
+    name = _binary(bucket.name)
+    if not bucket.bucket_type.is_default():
+        name = (_binary(bucket.bucket_type.name), name)
+    return int(hexlify(sha1(encode((name, _binary(key)))).digest()), 16)
+
+
+def _partition(position, size, offset):
+    return (position // (_RING_TOP // size) + offset) % size
+
+
+def _preflist_partitions(position, size, offset, n_val):
+    first = _partition(position, size, offset)
+    return set((first + i) % size for i in range(n_val))
@@ -0,0 +1,383 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+import sys
+
+from collections import deque
+from threading import Condition, Event, Lock, Thread
+from six import reraise
+
+from riak.client.multi import MultiPutPool, PutTask, POOL_SIZE, shared_pool
+
+__all__ = ['stream_query', 'split_query', 'BulkWriter']
+
+#: The default number of rows in each batch yielded by
+#: :func:`stream_query`
+DEFAULT_CHUNK_ROWS = 1000
+
+#: The default number of rows a :class:`BulkWriter` stores in each
+#: request
+DEFAULT_BATCH_ROWS = 1000
+
+
+def split_query(query, quantum):
+    """
+    Splits a query bounded by a time range into queries that each
+    cover one quantum of the range, in time order. The query must
+    bound the quantum's column with one integer lower bound (``>`` or
+    ``>=``) and one integer upper bound (``<`` or ``<=``).
+
+    :param query: the query
+    :type query: string
+    :param quantum: the quantum of the table
+    :type quantum: :class:`~riak.table.Quantum`
+    :rtype: generator of strings
+    """
+    pattern = r'\b{0}\s*(>=|>|<=|<)\s*(-?\d+)\b'.format(
+        re.escape(quantum.column))
+    lower = []
+    upper = []
+    for match in re.finditer(pattern, query, re.IGNORECASE):
+        op = match.group(1)
+        (lower if op.startswith('>') else upper).append(match)
+    if len(lower) != 1 or len(upper) != 1:
+        raise ValueError('query must have one lower and one upper bound '
+                         'on {0} to be split'.format(quantum.column))
+    lower, upper = lower[0], upper[0]
+
+    # Work in half-open ranges, [start, end)
+    start = int(lower.group(2)) + (1 if lower.group(1) == '>' else 0)
+    end = int(upper.group(2)) + (1 if upper.group(1) == '<=' else 0)
+    size = quantum.millis
+    while start < end:
+        boundary = min((start // size + 1) * size, end)
+        bounds = {lower: '{0} >= {1}'.format(quantum.column, start),
+                  upper: '{0} < {1}'.format(quantum.column, boundary)}
+        parts = []
+        pos = 0
+        for match in sorted(bounds, key=lambda m: m.start()):
+            parts.append(query[pos:match.start()])
+            parts.append(bounds[match])
+            pos = match.end()
+        parts.append(query[pos:])
+        yield ''.join(parts)
+        start = boundary
+
+
+def stream_query(client, table, query, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 interpolations=None, quantum=None, parallel=1):
+    """
+    Runs a query bounded by a time range as one query per quantum of
+    the range, yielding lists of at most ``chunk_rows`` rows in time
+    order. Up to ``parallel`` of the queries run at once, each on a
+    node chosen as for any other request, so the rows of at most
+    ``parallel`` + 1 quanta are held in memory: the quantum being
+    yielded and those being queried. Queries still running when the
+    generator is closed are abandoned, and their results dropped.
+
+    :param client: the client to use
+    :type client: :class:`~riak.client.RiakClient`
+    :param table: the table to query
+    :type table: :class:`~riak.table.Table`
+    :param query: the query
+    :type query: string
+    :param chunk_rows: the most rows in each list yielded
+    :type chunk_rows: int
+    :param interpolations: the interpolations of the query
+    :type interpolations: dict
+    :param quantum: the quantum of the table, or None to look it up
+        with :meth:`Table.quantum <riak.table.Table.quantum>`
+    :type quantum: :class:`~riak.table.Quantum`
+    :param parallel: the most queries run at once
+    :type parallel: int
+    :rtype: generator of lists
+    """
+    if chunk_rows < 1 or parallel < 1:
+        raise ValueError('chunk_rows and parallel must be positive')
+    if quantum is None:
+        quantum = table.quantum()
+        if quantum is None:
+            raise ValueError('table {0} has no quantum'.format(table.name))
+
+    queries = split_query(query, quantum)
+
+    def run(subquery):
+        return client.ts_query(table, subquery, interpolations)
+
+    def fill():
+        while len(pending) < parallel:
+            subquery = next(queries, None)
+            if subquery is None:
+                return
+            if parallel == 1:
+                pending.append(_Done(run(subquery)))
+            else:
+                pending.append(_Background(run, subquery))
+
+    pending = deque()
+    try:
+        while True:
+            fill()
+            if not pending:
+                return
+            rows = pending.popleft().result().rows or []
+            if parallel > 1:
+                # Keep the queries running while the rows are consumed
+                fill()
+            for i in range(0, len(rows), chunk_rows):
+                yield rows[i:i + chunk_rows]
+    finally:
+        for task in pending:
+            task.abandon()
+        pending.clear()
+
+
+class _Done(object):
+    def __init__(self, value):
+        self._value = value
+
+    def result(self):
+        return self._value
+
+    def abandon(self):
+        self._value = None
+
+
+class _Background(Thread):
+    """
+    Runs a function in a daemon thread, keeping its result or the
+    exception it raised.
+    """
+
+    def __init__(self, fn, *args):
+        super(_Background, self).__init__(
+            name='riak.client.timeseries-query')
+        self.daemon = True
+        self._fn = fn
+        self._args = args
+        self._value = None
+        self._exc_info = None
+        self._abandoned = False
+        self.start()
+
+    def run(self):
+        try:
+            self._value = self._fn(*self._args)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        # Checked after storing, so that abandon() can't be missed
+        if self._abandoned:
+            self._value = self._exc_info = None
+
+    def abandon(self):
+        """
+        Drops the result, now or once the function returns, without
+        waiting for it.
+        """
+        self._abandoned = True
+        self._value = self._exc_info = None
+
+    def result(self):
+        self.join()
+        if self._exc_info is not None:
+            reraise(*self._exc_info)
+        return self._value
+
+
+class BulkWriter(object):
+    """
+    Stores rows in a timeseries table in batches, sending several
+    batches at once over separate connections. Create one with
+    :meth:`Table.bulk_writer <riak.table.Table.bulk_writer>`::
+
+        with table.bulk_writer(batch_rows=500) as writer:
+            for row in rows:
+                writer.add(row)
+        for tsobj, err in writer.errors:
+            handle_failure(tsobj.rows, err)
+
+    Rows are buffered until ``batch_rows`` of them have been added,
+    then the batch is encoded and stored by a worker of the multi put
+    pool. The table's :meth:`~riak.table.Table.schema` is retrieved
+    first, so that rows are encoded by an encoder compiled for its
+    columns. Once ``max_in_flight`` batches are being stored, adding rows
+    blocks until one finishes, so that a fast producer cannot buffer
+    without bound. With ``flush_interval`` set, buffered rows are also
+    sent every ``flush_interval`` seconds, even if the batch is not
+    full.
+
+    Batches that fail are not retried beyond the client's usual
+    retries; they are collected in :attr:`errors` as pairs of the
+    :class:`~riak.ts_object.TsObject` and the exception raised.
+    """
+
+    def __init__(self, client, table, batch_rows=DEFAULT_BATCH_ROWS,
+                 max_in_flight=POOL_SIZE, flush_interval=None, pool=None):
+        """
+        :param client: the client to use
+        :type client: :class:`~riak.client.RiakClient`
+        :param table: the table to store rows in
+        :type table: :class:`~riak.table.Table`
+        :param batch_rows: the most rows in each request
+        :type batch_rows: int
+        :param max_in_flight: the most batches being stored at once
+        :type max_in_flight: int
+        :param flush_interval: the seconds between sends of buffered
+            rows, or None to wait for a full batch
+        :type flush_interval: float
+        :param pool: the pool to store batches with, defaulting to the
+            shared :class:`~riak.client.multi.MultiPutPool`
+        :type pool: :class:`~riak.client.multi.MultiPutPool`
+        """
+        if batch_rows < 1 or max_in_flight < 1:
+            raise ValueError('batch_rows and max_in_flight must be '
+                             'positive')
+        self._client = client
+        self._table = table
+        self.batch_rows = batch_rows
+        self.max_in_flight = max_in_flight
+        self.flush_interval = flush_interval
+        self._pool = pool or shared_pool(MultiPutPool)
+        self._pool.start()
+        try:
+            table.schema()
+        except Exception:
+            logging.debug('Could not describe table %s; encoding rows '
+                          'value by value.', table.name, exc_info=True)
+        #: Pairs of a :class:`~riak.ts_object.TsObject` that could not
+        #: be stored and the exception raised
+        self.errors = []
+        #: The number of rows stored
+        self.written = 0
+        self._rows = []
+        self._lock = Lock()
+        self._cond = Condition(Lock())
+        self._in_flight = 0
+        self._closed = False
+        self._flusher = None
+        if flush_interval is not None:
+            self._stop = Event()
+            self._flusher = Thread(target=self._flush_periodically,
+                                   name='riak.client.timeseries-flusher')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def add(self, row):
+        """
+        Adds a row to be stored.
+
+        :param row: the row's values, in the order of the table's
+            columns
+        :type row: list
+        """
+        self.extend([row])
+
+    def extend(self, rows):
+        """
+        Adds rows to be stored.
+
+        :param rows: the rows
+        :type rows: iterable of lists
+        """
+        if self._closed:
+            raise RuntimeError('Attempted to add rows to a closed writer')
+        batches = []
+        with self._lock:
+            for row in rows:
+                self._rows.append(row)
+                if len(self._rows) >= self.batch_rows:
+                    batches.append(self._rows)
+                    self._rows = []
+        for batch in batches:
+            self._send(batch)
+
+    def flush(self):
+        """
+        Sends any buffered rows and waits for all batches to be
+        stored.
+
+        :rtype: list of the :attr:`errors` so far
+        """
+        with self._lock:
+            batch, self._rows = self._rows, []
+        if batch:
+            self._send(batch)
+        with self._cond:
+            while self._in_flight:
+                self._cond.wait()
+        return self.errors
+
+    def close(self):
+        """
+        Flushes the writer and stops its periodic flushes. Rows cannot
+        be added afterwards.
+
+        :rtype: list of the :attr:`errors`
+        """
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join()
+        self._closed = True
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _send(self, rows):
+        with self._cond:
+            while self._in_flight >= self.max_in_flight:
+                self._cond.wait()
+            self._in_flight += 1
+        tsobj = self._table.new(rows)
+        try:
+            self._pool.enq(PutTask(self._client, _BatchOutcome(self, tsobj),
+                                   tsobj, {}))
+        except Exception:
+            self._finished(tsobj, None)
+            raise
+
+    def _finished(self, tsobj, result):
+        with self._cond:
+            if isinstance(result, tuple):
+                self.errors.append(result)
+            elif result is not None:
+                self.written += len(tsobj.rows)
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                batch, self._rows = self._rows, []
+            if batch:
+                self._send(batch)
+
+
+class _BatchOutcome(object):
+    """
+    Stands in for the output queue of a batch's task, reporting the
+    result the worker puts to the writer.
+    """
+
+    def __init__(self, writer, tsobj):
+        self._writer = writer
+        self._tsobj = tsobj
+
+    def put(self, result):
+        self._writer._finished(self._tsobj, result)
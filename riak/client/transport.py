@@ -13,17 +13,30 @@
 # limitations under the License.
 
 from contextlib import contextmanager
+from copy import deepcopy
+from riak import PoolExhausted, RiakError
+from riak.bucket import RiakBucket
+from riak.client.cache import _ObjectSnapshot
+from riak.client.multi import MultiPool, shared_pool
+from riak.client.retry import RetryPolicy
+from riak.riak_object import RiakObject
 from riak.transports.pool import BadResource, ConnectionClosed
 from riak.transports.tcp import is_retryable as is_tcp_retryable
 from riak.transports.http import is_retryable as is_http_retryable
-from six import PY2
+from six import PY2, reraise, string_types
 
+import logging
+import sys
 import threading
+import time
+import weakref
 
 if PY2:
     from httplib import HTTPException
+    from Queue import Queue, Empty
 else:
     from http.client import HTTPException
+    from queue import Queue, Empty
 
 #: The default (global) number of times to retry requests that are
 #: retryable. This can be modified locally, per-thread, via the
@@ -31,6 +44,75 @@ else:
 #: :attr:`RiakClient.retry_count` method in a ``with`` statement.
 DEFAULT_RETRY_COUNT = 3
 
+#: The most connections :meth:`RiakClient.warm_up` opens at once
+WARM_UP_CONCURRENCY = 16
+
+#: The percentile of a node's recent latencies after which a hedged
+#: read sends a second request
+HEDGE_PERCENTILE = 95
+
+#: The number of latencies a node must have recorded before hedged
+#: reads to it send second requests
+HEDGE_MIN_SAMPLES = 20
+
+#: The number of shared worker threads that send the requests of
+#: hedged reads. Reads made while all are busy are not hedged.
+HEDGE_POOL_SIZE = 16
+
+#: The number of shared worker threads that look up the owners of
+#: keys for token-aware routing. Lookups needed while all are busy
+#: are skipped.
+PREFLIST_POOL_SIZE = 2
+
+#: The most seconds :meth:`RiakClient.check_health` waits for a
+#: connection to a node from a full pool before skipping the node
+HEALTH_CHECK_ACQUIRE_TIMEOUT = 0.1
+
+
+class _HedgePool(MultiPool):
+    """
+    The workers that send the requests of hedged reads. Each task is a
+    function to call. Tasks are only queued while a worker is free,
+    so that a request never waits behind others.
+    """
+
+    def __init__(self, size=HEDGE_POOL_SIZE, daemon=False, name='hedge'):
+        super(_HedgePool, self).__init__(size=size, name=name,
+                                         daemon=daemon)
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+
+    def try_enq(self, fn):
+        """
+        Queues a function if a worker is free to call it.
+
+        :rtype: boolean, whether the function was queued
+        """
+        with self._busy_lock:
+            if self._busy >= self._size:
+                return False
+            self._busy += 1
+        self.enq(fn)
+        return True
+
+    def _execute(self, fn):
+        try:
+            fn()
+        finally:
+            with self._busy_lock:
+                self._busy -= 1
+
+
+class _PreflistPool(_HedgePool):
+    """
+    The workers that look up the owners of keys for token-aware
+    routing, off the path of the requests that need them.
+    """
+
+    def __init__(self, size=PREFLIST_POOL_SIZE, daemon=False):
+        super(_PreflistPool, self).__init__(size=size, daemon=daemon,
+                                            name='preflist')
+
 
 class _client_locals(threading.local):
     """
@@ -49,8 +131,17 @@ class RiakClientTransport(object):
     protocol = 'pbc'
     _http_pool = None
     _tcp_pool = None
+    _pipeline_depth = None
+    _preflists = None
+    _node_selection = 'random'
+    _health_stop = None
+    _single_flight = None
     _locals = _client_locals()
 
+    #: The :class:`~riak.client.retry.RetryPolicy` of operations that
+    #: do not set one themselves or through their bucket
+    retry_policy = RetryPolicy()
+
     def _get_retry_count(self):
         return self._locals.riak_retries_count or DEFAULT_RETRY_COUNT
 
@@ -95,29 +186,51 @@ class RiakClientTransport(object):
             self.retries = old_retries
 
     @contextmanager
-    def _transport(self):
+    def _transport(self, nodes=None):
         """
-        _transport()
+        _transport(nodes=None)
 
         Yields a single transport to the caller from the default pool,
         without retries. NB: no need to re-try as this method is only
         used by CRDT operations that should never be re-tried.
+
+        :param nodes: nodes to prefer, e.g. the owners of a key
+        :type nodes: list
         """
         pool = self._choose_pool()
-        with pool.transaction() as transport:
+        node = self._choose_node(nodes) if nodes else None
+        with pool.transaction(key=node) as transport:
             yield transport
 
     def _acquire(self):
         """
         _acquire()
 
-        Acquires a connection from the default pool.
+        Acquires a connection from the default pool, avoiding nodes
+        whose circuit breaker is open.
         """
-        return self._choose_pool().acquire()
+        return self._choose_pool().acquire(_filter=_available)
 
-    def _stream_with_retry(self, make_op):
-        first_try = True
+    def _stream_with_retry(self, make_op, policy=None):
+        """
+        Yields the results of a streaming operation, retrying it if
+        the connection fails before the stream starts.
+
+        :param make_op: the function to pass a transport, returning the
+           streaming operation
+        :type make_op: function
+        :param policy: the retry policy, defaulting to
+           :attr:`retry_policy`. By default one retry is made.
+        :type policy: :class:`~riak.client.retry.RetryPolicy`
+        """
+        policy = policy or self.retry_policy
+        max_retries = policy.attempts - 1 if policy.attempts else 1
+        began = time.time()
+        retried = 0
+        delay = 0
         while True:
+            if delay:
+                time.sleep(delay)
             resource = self._acquire()
             transport = resource.object
             streaming_op = None
@@ -126,21 +239,23 @@ class RiakClientTransport(object):
                 streaming_op.attach(resource)
                 for item in streaming_op:
                     yield item
+                policy.succeeded(retried)
                 break
             except BadResource as e:
                 resource.errored = True
                 # NB: *only* re-try if connection closed happened
                 # at the start of the streaming op
-                if first_try and not e.mid_stream:
-                    continue
-                else:
-                    raise
+                if not e.mid_stream and retried < max_retries:
+                    delay = policy.retry_delay(retried + 1, began)
+                    if delay is not None:
+                        retried += 1
+                        continue
+                raise
             finally:
-                first_try = False
                 if streaming_op:
                     streaming_op.close()
 
-    def _with_retries(self, pool, fn):
+    def _with_retries(self, pool, fn, nodes=None, policy=None):
         """
         Performs the passed function with retries against the given pool.
 
@@ -148,44 +263,406 @@ class RiakClientTransport(object):
         :type pool: Pool
         :param fn: the function to pass a transport
         :type fn: function
+        :param nodes: nodes to prefer, e.g. the owners of a key. Other
+           nodes are used once these have all failed.
+        :type nodes: list
+        :param policy: the retry policy, defaulting to
+           :attr:`retry_policy`
+        :type policy: :class:`~riak.client.retry.RetryPolicy`
         """
         skip_nodes = []
 
         def _skip_bad_nodes(transport):
-            return transport._node not in skip_nodes
-
-        retry_count = self.retries - 1
-        first_try = True
-        current_try = 0
+            return transport._node not in skip_nodes and \
+                transport._node.available()
+
+        def _other_available(node):
+            return any(n is not node and n not in skip_nodes and
+                       n.available() for n in self.nodes)
+
+        def _preferred_node():
+            if nodes:
+                candidates = [n for n in nodes
+                              if n not in skip_nodes and n.available()]
+                if candidates:
+                    return self._choose_node(candidates)
+            if self._node_selection != 'random' or \
+                    any(n.concurrency for n in self.nodes):
+                # Choose the node per request, not only per connection,
+                # so that its concurrency limit can be taken before a
+                # connection is claimed
+                candidates = [n for n in self.nodes
+                              if n not in skip_nodes] or self.nodes
+                return self._choose_node(candidates)
+            return None
+
+        policy = policy or self.retry_policy
+        max_retries = policy.attempts - 1 if policy.attempts \
+            else self.retries
+        began = time.time()
+        retried = 0
+        delay = 0
         while True:
+            if delay:
+                time.sleep(delay)
+            node = _preferred_node()
+            limit = node.concurrency if node is not None else None
+            # Wait for room on the node before claiming a connection,
+            # so that waiting callers do not hold connections others
+            # need to finish
+            if limit is not None:
+                limit.acquire()
+            elapsed = None
+            congested = False
             try:
                 with pool.transaction(
                         _filter=_skip_bad_nodes,
+                        key=node,
                         yield_resource=True) as resource:
                     transport = resource.object
+                    if not transport._node.admit() and \
+                            transport._node not in skip_nodes and \
+                            _other_available(transport._node):
+                        # Another request is probing the node
+                        skip_nodes.append(transport._node)
+                        delay = 0
+                        continue
+                    transport._node.request_started()
+                    started = time.time()
                     try:
-                        return fn(transport)
+                        result = fn(transport)
+                        elapsed = time.time() - started
+                        policy.succeeded(retried)
+                        return result
                     except (IOError, HTTPException, ConnectionClosed) as e:
+                        congested = True
                         resource.errored = True
                         if _is_retryable(e):
-                            transport._node.error_rate.incr(1)
+                            transport._node.record_error()
+                            transport._node.invalidate_features()
                             skip_nodes.append(transport._node)
-                            if first_try:
-                                continue
-                            else:
-                                raise BadResource(e)
+                            raise BadResource(e)
                         else:
                             raise
+                    except RiakError as e:
+                        congested = _is_timeout(e)
+                        raise
+                    finally:
+                        transport._node.request_finished(elapsed)
             except BadResource as e:
-                if current_try < retry_count:
-                    resource.errored = True
-                    current_try += 1
+                if retried < max_retries:
+                    delay = policy.retry_delay(retried + 1, began)
+                    if delay is not None:
+                        retried += 1
+                        continue
+                # Re-raise the inner exception
+                raise e.args[0]
+            finally:
+                if limit is not None:
+                    limit.release(elapsed, congested)
+
+    def _with_coalescing(self, name, call, args, kwargs):
+        """
+        Performs a read, sharing the request with identical reads by
+        other threads that are in flight. Each caller gets its own
+        copy of the result.
+
+        :param name: the name of the operation
+        :type name: string
+        :param call: the function performing the read, passed ``args``
+        :type call: function
+        :param args: the positional arguments of the read, starting
+           with the object to fetch or with a bucket and key
+        :type args: tuple
+        :param kwargs: the options of the read
+        :type kwargs: dict
+        """
+        robj = args[0]
+        bucket, key = _routing_key(args)
+        rest = args[1:] if isinstance(robj, RiakObject) else args[2:]
+        flight = (name, bucket.bucket_type.name, bucket.name, key, rest,
+                  tuple(sorted(kwargs.items())))
+
+        if isinstance(robj, RiakObject):
+            def fetch():
+                fetched = _detached(robj)
+                call(fetched, *rest)
+                return _ObjectSnapshot(fetched)
+            return self._single_flight.do(flight, fetch).restore(robj)
+
+        return deepcopy(self._single_flight.do(flight,
+                                               lambda: call(*args)))
+
+    def _with_hedging(self, pool, fn, args, kwargs, nodes, hedge,
+                      policy=None):
+        """
+        Performs the passed operation with retries on one node and, if
+        it has not finished after a delay, again on a different node,
+        returning the first successful result. The slower request is
+        left to finish in the background so that its connection is
+        drained and returned to the pool. The requests are sent by the
+        shared workers of a :class:`_HedgePool`; while all of them are
+        busy, the read is not hedged.
+
+        :param pool: the connection pool to use
+        :type pool: Pool
+        :param fn: the client operation, taking a transport and then
+           ``args`` and ``kwargs``
+        :type fn: function
+        :param args: the positional arguments of the operation
+        :type args: tuple
+        :param kwargs: the keyword arguments of the operation
+        :type kwargs: dict
+        :param nodes: nodes to prefer, e.g. the owners of a key
+        :type nodes: list
+        :param hedge: the delay in seconds, or True to wait for the
+           :data:`HEDGE_PERCENTILE` of the first node's latencies
+        :type hedge: float, boolean
+        :param policy: the retry policy of each request
+        :type policy: :class:`~riak.client.retry.RetryPolicy`
+        """
+        candidates = [n for n in nodes or self.nodes if n.available()]
+        primary = self._choose_node(candidates or nodes)
+        if hedge is True:
+            delay = primary.latency_percentile(HEDGE_PERCENTILE,
+                                               HEDGE_MIN_SAMPLES)
+        else:
+            delay = hedge
+        others = [n for n in candidates if n is not primary] or \
+            [n for n in self.nodes if n is not primary and n.available()]
+        workers = shared_pool(_HedgePool)
+
+        def _unhedged():
+            return self._with_retries(
+                pool, lambda transport: fn(self, transport, *args, **kwargs),
+                [primary], policy)
+
+        if delay is None or not others:
+            return _unhedged()
+
+        robj = args[0]
+        results = Queue()
+        retries = self.retries
+
+        def _attempt(node):
+            attempt_args = args
+            if isinstance(robj, RiakObject):
+                # Fetch into a copy, so that the slower reply cannot
+                # overwrite the object after it has been returned
+                attempt_args = (_detached(robj),) + args[1:]
+
+            def thunk(transport):
+                return fn(self, transport, *attempt_args, **kwargs)
+
+            try:
+                with self.retry_count(retries):
+                    results.put((True, self._with_retries(
+                        pool, thunk, [node], policy)))
+            except Exception:
+                results.put((False, sys.exc_info()))
+
+        def _start(node):
+            return workers.try_enq(lambda: _attempt(node))
+
+        if not _start(primary):
+            return _unhedged()
+        try:
+            outcomes = [results.get(timeout=delay)]
+        except Empty:
+            outcomes = []
+        # Send the hedge if there is no reply yet, or the first
+        # request failed, then use the first successful reply
+        if not outcomes or not outcomes[0][0]:
+            sent = 2 if _start(self._choose_node(others)) else 1
+            while len(outcomes) < sent:
+                outcomes.append(results.get())
+                if outcomes[-1][0]:
+                    break
+        succeeded, value = outcomes[-1]
+        if succeeded:
+            if isinstance(robj, RiakObject):
+                return _adopt(robj, value)
+            return value
+        reraise(*outcomes[0][1])
+
+    def _key_owners(self, bucket, key):
+        """
+        Returns the nodes that are primary owners of a key when
+        token-aware routing is enabled and they are cached, or None.
+        Owners that are not cached are looked up in the background,
+        so that the request is not delayed by the lookup, and is
+        routed as without token-aware routing.
+
+        :param bucket: the bucket of the key
+        :type bucket: RiakBucket
+        :param key: the key
+        :type key: string
+        :rtype: list
+        """
+        preflists = self._preflists
+        if preflists is None or key is None:
+            return None
+        owners = preflists.get(bucket, key)
+        if owners is None:
+            shared_pool(_PreflistPool).try_enq(
+                lambda: self._lookup_owners(bucket, key))
+        return owners
+
+    def _lookup_owners(self, bucket, key):
+        """
+        Returns the nodes that are primary owners of a key when
+        token-aware routing is enabled, or None. Owners that are not
+        cached are looked up with :meth:`get_preflist`, which also
+        teaches the cache the owners of nearby keys.
+
+        :param bucket: the bucket of the key
+        :type bucket: RiakBucket
+        :param key: the key
+        :type key: string
+        :rtype: list
+        """
+        preflists = self._preflists
+        if preflists is None or key is None:
+            return None
+        owners = preflists.get(bucket, key)
+        if owners is None:
+            try:
+                preflist = self.get_preflist(bucket, key)
+            except NotImplementedError:
+                # The cluster cannot report preflists, so stop asking
+                self._preflists = None
+                return None
+            except Exception:
+                logging.debug('Could not fetch the preflist of %s/%s; '
+                              'routing to any node.', bucket.name, key,
+                              exc_info=True)
+                preflist = []
+            owners = preflists.add(bucket, key, preflist, self.nodes)
+        return owners
+
+    def warm_up(self, n_per_node=1, protocol=None):
+        """
+        Opens connections to every node ahead of traffic, so that
+        operations do not wait for the TCP connect, security
+        negotiation and feature detection of a new connection. The
+        connections are opened in parallel and left idle in the pool.
+        Nodes that cannot be reached are logged and marked as having
+        errored.
+
+        :param n_per_node: the number of connections to open to each
+           node
+        :type n_per_node: int
+        :param protocol: the protocol whose pool to warm, defaulting
+           to :attr:`protocol`
+        :type protocol: string
+        :rtype: int, the number of connections opened
+        """
+        pool = self._choose_pool(protocol)
+        nodes = Queue()
+        for node in self.nodes:
+            for i in range(n_per_node):
+                nodes.put(node)
+        opened = []
+
+        def _open():
+            while True:
+                try:
+                    node = nodes.get_nowait()
+                except Empty:
+                    return
+                transport = None
+                try:
+                    transport = pool.create_resource(node)
+                    pool.warm_resource(transport)
+                except Exception:
+                    logging.warning('Could not open a connection to %s '
+                                    'during warm-up.', node.host,
+                                    exc_info=True)
+                    node.record_error()
+                    if transport is not None:
+                        pool.destroy_resource(transport)
                     continue
+                if pool.add_resource(transport):
+                    opened.append(transport)
                 else:
-                    # Re-raise the inner exception
-                    raise e.args[0]
-            finally:
-                first_try = False
+                    pool.destroy_resource(transport)
+
+        workers = [threading.Thread(target=_open)
+                   for i in range(min(nodes.qsize(), WARM_UP_CONCURRENCY))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return len(opened)
+
+    def check_health(self, protocol=None):
+        """
+        Pings each node once over a connection to that node, including
+        nodes whose circuit breaker is open. Nodes that answer have
+        their breaker closed; nodes that do not are recorded as having
+        errored. Nodes for which no connection could be claimed within
+        :data:`HEALTH_CHECK_ACQUIRE_TIMEOUT`, because the pool is at its
+        ``max_size``, are skipped until the next check. This is run
+        periodically in the background when the client is created with
+        ``health_check_interval``.
+
+        :param protocol: the protocol to ping over, defaulting to
+           :attr:`protocol`
+        :type protocol: string
+        :rtype: dict of :class:`~riak.node.RiakNode` to boolean, leaving
+           out skipped nodes
+        """
+        pool = self._choose_pool(protocol)
+        results = {}
+        for node in self.nodes:
+            healthy = False
+            try:
+                with pool.transaction(
+                        key=node, yield_resource=True,
+                        timeout=HEALTH_CHECK_ACQUIRE_TIMEOUT) as resource:
+                    try:
+                        healthy = resource.object.ping()
+                    except Exception:
+                        resource.errored = True
+            except PoolExhausted:
+                continue
+            except Exception:
+                # The connection could not be opened
+                pass
+            if healthy:
+                node.breaker.record_success()
+            else:
+                logging.debug('Health check of %s failed.', node.host)
+                node.record_error()
+            results[node] = healthy
+        return results
+
+    def _start_health_checks(self, interval):
+        stop = self._health_stop = threading.Event()
+        # Hold the client weakly so an abandoned client can be collected
+        ref = weakref.ref(self)
+
+        def _run():
+            while not stop.wait(interval):
+                client = ref()
+                if client is None:
+                    return
+                try:
+                    client.check_health()
+                except RuntimeError:
+                    # The client was closed
+                    return
+                finally:
+                    del client
+
+        checker = threading.Thread(target=_run, name='riak-health-check')
+        checker.daemon = True
+        checker.start()
+
+    def _stop_health_checks(self):
+        if self._health_stop is not None:
+            self._health_stop.set()
+            self._health_stop = None
 
     def _choose_pool(self, protocol=None):
         """
@@ -222,19 +699,107 @@ def _is_retryable(error):
     return is_tcp_retryable(error) or is_http_retryable(error)
 
 
+def _is_timeout(error):
+    """
+    Determines whether an error reported by Riak is a request timing
+    out, which signals an overloaded node.
+
+    :param error: the error to check
+    :type error: :class:`~riak.riak_error.RiakError`
+    :rtype: boolean
+    """
+    value = error.value
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    return isinstance(value, string_types) and 'timeout' in value.lower()
+
+
+def _detached(robj):
+    """
+    Returns an empty copy of an object, to be fetched into.
+    """
+    copy = RiakObject(robj.client, robj.bucket, robj.key)
+    copy._resolver = robj._resolver
+    return copy
+
+
+def _adopt(robj, fetched):
+    """
+    Moves the value fetched into a copy made by :func:`_detached` to
+    the original object, and returns that object.
+    """
+    robj.vclock = fetched.vclock
+    robj.siblings = fetched.siblings
+    for sibling in robj.siblings:
+        sibling._robject = robj
+    return robj
+
+
+def _available(transport):
+    """
+    A pool filter that skips connections to nodes whose circuit
+    breaker is open.
+    """
+    return transport._node.available()
+
+
+def _routing_key(args):
+    """
+    Finds the bucket and key an operation acts on from its arguments,
+    which start with either an object (or Data Type) or a bucket and
+    key.
+    """
+    if hasattr(args[0], 'key'):
+        return args[0].bucket, args[0].key
+    return args[0], args[1]
+
+
+def _operation_bucket(args):
+    """
+    Finds the bucket an operation acts on from its arguments, if any,
+    so that the bucket's retry policy can be used.
+    """
+    if not args:
+        return None
+    if isinstance(args[0], RiakBucket):
+        return args[0]
+    bucket = getattr(args[0], 'bucket', None)
+    if isinstance(bucket, RiakBucket):
+        return bucket
+    return None
+
+
 # http://thecodeship.com/patterns/guide-to-python-function-decorators/
-def retryable(fn, protocol=None):
+def retryable(fn, protocol=None, routed=False, hedged=False):
     """
-    Wraps a client operation that can be retried according to the set
-    :attr:`RiakClient.retries`. Used internally.
+    Wraps a client operation that can be retried according to the
+    ``retry_policy`` option, the retry policy of the bucket it acts on
+    or the client's :attr:`RiakClient.retry_policy`. Used internally.
     """
     def wrapper(self, *args, **kwargs):
         pool = self._choose_pool(protocol)
-
-        def thunk(transport):
-            return fn(self, transport, *args, **kwargs)
-
-        return self._with_retries(pool, thunk)
+        hedge = kwargs.pop('hedge', None) if hedged else None
+        policy = kwargs.pop('retry_policy', None)
+        if policy is None:
+            bucket = _operation_bucket(args)
+            if bucket is not None:
+                policy = bucket.retry_policy
+
+        def call(*args):
+            def thunk(transport):
+                return fn(self, transport, *args, **kwargs)
+
+            nodes = None
+            if routed and args:
+                nodes = self._key_owners(*_routing_key(args))
+            if hedge:
+                return self._with_hedging(pool, fn, args, kwargs, nodes,
+                                          hedge, policy)
+            return self._with_retries(pool, thunk, nodes, policy)
+
+        if hedged and self._single_flight is not None:
+            return self._with_coalescing(fn.__name__, call, args, kwargs)
+        return call(*args)
 
     wrapper.__doc__ = fn.__doc__
     wrapper.__repr__ = fn.__repr__
@@ -248,3 +813,23 @@ def retryableHttpOnly(fn):
     Used internally.
     """
     return retryable(fn, protocol='http')
+
+
+def retryableRouted(fn):
+    """
+    Wraps a retryable client operation on a single key, which is sent
+    to a node owning the key when token-aware routing is enabled. Used
+    internally.
+    """
+    return retryable(fn, routed=True)
+
+
+def retryableHedged(fn):
+    """
+    Wraps a retryable, routed client operation that reads a single
+    key and accepts a ``hedge`` option; see
+    :meth:`RiakClient.get <riak.client.RiakClient.get>`. Concurrent
+    identical reads are coalesced when ``coalesce_reads`` is set on
+    the client. Used internally.
+    """
+    return retryable(fn, routed=True, hedged=True)
@@ -14,6 +14,9 @@
 
 import datetime
 import six
+import struct
+
+from collections import OrderedDict
 
 import riak.pb.messages
 import riak.pb.riak_pb2
@@ -23,7 +26,8 @@ import riak.pb.riak_ts_pb2
 
 from riak import RiakError
 from riak.codecs import Codec, Msg
-from riak.codecs.util import parse_pbuf_msg
+from riak.codecs.util import check_timeseries_row, parse_pbuf_msg, \
+    timeseries_column
 from riak.content import RiakContent
 from riak.pb.riak_ts_pb2 import TsColumnType
 from riak.riak_object import VClock
@@ -32,6 +36,90 @@ from riak.util import decode_index_value, str_to_bytes, bytes_to_str, \
     unix_time_millis, datetime_from_unix_time_millis
 from riak.multidict import MultiDict
 
+# The TsCell field holding the values of each column type
+TS_CELL_FIELDS = {'varchar': 'varchar_value',
+                  'blob': 'varchar_value',
+                  'sint64': 'sint64_value',
+                  'double': 'double_value',
+                  'timestamp': 'timestamp_value',
+                  'boolean': 'boolean_value'}
+
+_PB_SMALL_VARINTS = [six.int2byte(i) for i in range(0x80)]
+_PB_EMPTY_CELL = b'\x0a\x00'
+_PB_DOUBLE = struct.Struct('<d')
+_PB_INT64_MIN = -2 ** 63
+_PB_INT64_MAX = 2 ** 63 - 1
+
+
+def _pb_varint(value):
+    """
+    Encodes a non-negative integer as a protobuf varint.
+    """
+    if value < 0x80:
+        return _PB_SMALL_VARINTS[value]
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _pb_sint64(tag):
+    """
+    Returns an encoder of zigzag-encoded integers in the TsCell field
+    with the given tag, or of None for those out of range.
+    """
+    def encode(value):
+        if not _PB_INT64_MIN <= value <= _PB_INT64_MAX:
+            return None
+        return tag + _pb_varint((value << 1) ^ (value >> 63))
+    return encode
+
+
+def _pb_varchar(value):
+    return b'\x0a' + _pb_varint(len(value)) + value
+
+
+def _pb_text(value):
+    return _pb_varchar(value.encode('utf-8'))
+
+
+def _pb_double(value):
+    return b'\x29' + _PB_DOUBLE.pack(value)
+
+
+def _pb_boolean(value):
+    return b'\x20\x01' if value else b'\x20\x00'
+
+
+_pb_sint64_value = _pb_sint64(b'\x10')
+_pb_timestamp_value = _pb_sint64(b'\x18')
+
+
+def _pb_timestamp(value):
+    return _pb_timestamp_value(unix_time_millis(value))
+
+
+# Serializes a TsCell holding each type of value expected in a column
+# of each type, as encode_to_ts_cell would fill it. Other values, and
+# those an encoder returns None for, are left to encode_to_ts_cell,
+# so that a row encodes to the same bytes with or without the table's
+# schema. NB: on Python 2, unicode is left to protobuf to encode.
+_VARCHAR_ENCODERS = {six.binary_type: _pb_varchar}
+if not six.PY2:
+    _VARCHAR_ENCODERS[six.text_type] = _pb_text
+_INT_ENCODERS = dict((t, _pb_sint64_value) for t in six.integer_types)
+_TIMESTAMP_ENCODERS = dict(_INT_ENCODERS)
+_TIMESTAMP_ENCODERS[datetime.datetime] = _pb_timestamp
+TS_CELL_ENCODERS = {
+    'varchar': _VARCHAR_ENCODERS,
+    'blob': _VARCHAR_ENCODERS,
+    'sint64': _INT_ENCODERS,
+    'double': {float: _pb_double},
+    'timestamp': _TIMESTAMP_ENCODERS,
+    'boolean': {bool: _pb_boolean}}
+
 
 def _invert(d):
     out = {}
@@ -755,16 +843,55 @@ class PbufCodec(Codec):
         else:
             raise RiakError("missing response object")
 
-    def encode_timeseries_put(self, tsobj):
+    def compile_timeseries_row_encoder(self, col_types):
+        """
+        Builds a function that serializes a row of a table with the
+        given column types as a TsRow field of a TsPutReq. Values of
+        the types expected by their column are written straight to
+        bytes instead of through a TsCell; any others, such as an
+        integer in a double column, are encoded by
+        :meth:`encode_to_ts_cell`, so that the bytes are the same as
+        without the encoder.
+
+        :param col_types: the types of the table's columns
+        :type col_types: list of strings
+        :rtype: function taking a row and returning bytes
+        """
+        columns = [TS_CELL_ENCODERS.get(t, {}) for t in col_types]
+        width = len(columns)
+        encode_cell = self.encode_to_ts_cell
+
+        def encode_row(row):
+            check_timeseries_row(row, width)
+            cells = []
+            for encoders, cell in zip(columns, row):
+                if cell is None:
+                    cells.append(_PB_EMPTY_CELL)
+                    continue
+                encoder = encoders.get(type(cell))
+                data = encoder(cell) if encoder is not None else None
+                if data is None:
+                    tsc = riak.pb.riak_ts_pb2.TsCell()
+                    encode_cell(cell, tsc)
+                    data = tsc.SerializeToString()
+                cells.append(b'\x0a' + _pb_varint(len(data)) + data)
+            data = b''.join(cells)
+            return b'\x1a' + _pb_varint(len(data)) + data
+        return encode_row
+
+    def encode_timeseries_put(self, tsobj, row_encoder=None):
         """
         Fills an TsPutReq message with the appropriate data and
         metadata from a TsObject.
 
         :param tsobj: a TsObject
         :type tsobj: TsObject
-        :param req: the protobuf message to fill
-        :type req: riak.pb.riak_ts_pb2.TsPutReq
+        :param row_encoder: an encoder from
+            :meth:`compile_timeseries_row_encoder` for the table
+        :type row_encoder: function
         """
+        mc = riak.pb.messages.MSG_CODE_TS_PUT_REQ
+        rc = riak.pb.messages.MSG_CODE_TS_PUT_RESP
         req = riak.pb.riak_ts_pb2.TsPutReq()
         req.table = str_to_bytes(tsobj.table.name)
 
@@ -772,6 +899,12 @@ class PbufCodec(Codec):
             raise NotImplementedError("columns are not implemented yet")
 
         if tsobj.rows and isinstance(tsobj.rows, list):
+            if row_encoder is not None:
+                # NB: the table is field 1 and the rows field 3, so the
+                # encoded rows follow the serialized table
+                data = [req.SerializeToString()]
+                data.extend(row_encoder(row) for row in tsobj.rows)
+                return Msg(mc, b''.join(data), rc)
             for row in tsobj.rows:
                 tsr = req.rows.add()  # NB: type TsRow
                 if not isinstance(row, list):
@@ -782,8 +915,6 @@ class PbufCodec(Codec):
         else:
             raise RiakError("TsObject requires a list of rows")
 
-        mc = riak.pb.messages.MSG_CODE_TS_PUT_REQ
-        rc = riak.pb.messages.MSG_CODE_TS_PUT_RESP
         return Msg(mc, req.SerializeToString(), rc)
 
     def encode_timeseries_query(self, table, query, interpolations=None):
@@ -797,7 +928,7 @@ class PbufCodec(Codec):
         return Msg(mc, req.SerializeToString(), rc)
 
     def decode_timeseries(self, resp, tsobj,
-                          convert_timestamp=False):
+                          convert_timestamp=False, columnar=False):
         """
         Fills an TsObject with the appropriate data and
         metadata from a TsGetResp / TsQueryResp.
@@ -809,6 +940,8 @@ class PbufCodec(Codec):
         :type tsobj: TsObject
         :param convert_timestamp: Convert timestamps to datetime objects
         :type tsobj: boolean
+        :param columnar: Fill in the TsObject's arrays instead of rows
+        :type columnar: boolean
         """
         if resp.columns is not None:
             col_names = []
@@ -819,6 +952,12 @@ class PbufCodec(Codec):
                 col_types.append(col_type)
             tsobj.columns = TsColumns(col_names, col_types)
 
+        if columnar:
+            tsobj.rows = None
+            tsobj.arrays = self.decode_timeseries_columns(
+                resp.rows, tsobj.columns, convert_timestamp)
+            return
+
         tsobj.rows = []
         if resp.rows is not None:
             for row in resp.rows:
@@ -826,6 +965,32 @@ class PbufCodec(Codec):
                     self.decode_timeseries_row(
                         row, resp.columns, convert_timestamp))
 
+    def decode_timeseries_columns(self, tsrows, tscols,
+                                  convert_timestamp=False):
+        """
+        Decodes TsRows column by column, reading each column's cells
+        by its type instead of checking the type of every cell.
+
+        :param tsrows: the protobuf TsRows to decode
+        :type tsrows: list
+        :param tscols: the decoded columns of the rows
+        :type tscols: :class:`~riak.ts_object.TsColumns`
+        :param convert_timestamp: Convert timestamps to datetime objects
+        :type convert_timestamp: boolean
+        :rtype: :class:`~collections.OrderedDict` of column names to
+            arrays
+        """
+        cells = [row.cells for row in tsrows]
+        arrays = OrderedDict()
+        for i, (name, col_type) in enumerate(zip(*tscols)):
+            field = TS_CELL_FIELDS[col_type]
+            column = [row[i] for row in cells]
+            values = [getattr(cell, field) if cell.HasField(field) else None
+                      for cell in column]
+            arrays[name] = timeseries_column(values, col_type,
+                                             convert_timestamp)
+        return arrays
+
     def decode_timeseries_col_type(self, col_type):
         # NB: these match the atom names for column types
         if col_type == TsColumnType.Value('VARCHAR'):
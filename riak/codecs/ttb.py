@@ -14,12 +14,17 @@
 
 import datetime
 import six
+import struct
 
-from erlastic import encode, decode
+from collections import OrderedDict
+
+from erlastic import encode, decode, ErlangTermEncoder
 from erlastic.types import Atom
 
 from riak import RiakError
 from riak.codecs import Codec, Msg
+from riak.codecs.util import check_timeseries_row, timeseries_column, \
+    to_bytes
 from riak.pb.messages import MSG_CODE_TS_TTB_MSG
 from riak.ts_object import TsColumns
 from riak.util import bytes_to_str, unix_time_millis, \
@@ -38,6 +43,82 @@ tsputresp_a = Atom('tsputresp')
 tsdelreq_a = Atom('tsdelreq')
 timestamp_a = Atom('timestamp')
 
+_ttb_encoder = ErlangTermEncoder()
+_TTB_SMALL_INTS = [b'a' + six.int2byte(i) for i in range(256)]
+_TTB_INT = struct.Struct('>cl')
+_TTB_SMALL_BIG = struct.Struct('<cBBQ')
+_TTB_SIZED = struct.Struct('>cL')
+_TTB_NIL = b'j'
+
+
+def _ttb_term(term):
+    """
+    Encodes a term without the version byte that starts a message.
+    """
+    return b''.join(_ttb_encoder.encode_part(term))
+
+
+def _ttb_tuple_header(arity):
+    if arity < 256:
+        return b'h' + six.int2byte(arity)
+    return b'i' + struct.pack('>L', arity)
+
+
+def _ttb_int(value):
+    if 0 <= value <= 255:
+        return _TTB_SMALL_INTS[value]
+    elif -2147483648 <= value <= 2147483647:
+        return _TTB_INT.pack(b'b', value)
+    magnitude = abs(value)
+    if magnitude >= 2 ** 64:
+        return _ttb_term(value)
+    size = (magnitude.bit_length() + 7) // 8
+    # NB: the magnitude is little-endian, so its unused high bytes
+    # are dropped from the end
+    return _TTB_SMALL_BIG.pack(b'n', size, value < 0, magnitude)[:3 + size]
+
+
+def _ttb_float(value):
+    return b'c' + ('%.20e' % value).encode('ascii').ljust(31, b'\x00')
+
+
+def _ttb_binary(value):
+    return _TTB_SIZED.pack(b'm', len(value)) + value
+
+
+def _ttb_text(value):
+    return _ttb_binary(value.encode('utf-8'))
+
+
+_TTB_TRUE = _ttb_term(True)
+_TTB_FALSE = _ttb_term(False)
+
+
+def _ttb_boolean(value):
+    return _TTB_TRUE if value else _TTB_FALSE
+
+
+def _ttb_timestamp(value):
+    return _ttb_int(unix_time_millis(value))
+
+
+# The encoded term of each type of value expected in a column of each
+# type, as encode_to_ts_cell and erlastic would encode it. Other values
+# are left to them, so that a row encodes to the same bytes with or
+# without the table's schema.
+_VARCHAR_ENCODERS = {six.binary_type: _ttb_binary,
+                     six.text_type: _ttb_text}
+_INT_ENCODERS = dict((t, _ttb_int) for t in six.integer_types)
+_TIMESTAMP_ENCODERS = dict(_INT_ENCODERS)
+_TIMESTAMP_ENCODERS[datetime.datetime] = _ttb_timestamp
+TS_CELL_ENCODERS = {
+    'varchar': _VARCHAR_ENCODERS,
+    'blob': _VARCHAR_ENCODERS,
+    'sint64': _INT_ENCODERS,
+    'double': {float: _ttb_float},
+    'timestamp': _TIMESTAMP_ENCODERS,
+    'boolean': {bool: _ttb_boolean}}
+
 
 class TtbCodec(Codec):
     '''
@@ -51,7 +132,7 @@ class TtbCodec(Codec):
         if msg_code != MSG_CODE_TS_TTB_MSG:
             raise RiakError("TTB can't parse code: {}".format(msg_code))
         if len(data) > 0:
-            decoded = decode(data)
+            decoded = decode(to_bytes(data))
             self.maybe_err_ttb(decoded)
             return decoded
         else:
@@ -113,19 +194,66 @@ class TtbCodec(Codec):
         else:
             raise RiakError("missing response object")
 
-    def encode_timeseries_put(self, tsobj):
+    def compile_timeseries_row_encoder(self, col_types):
+        '''
+        Builds a function that encodes a row of a table with the given
+        column types as the bytes of a TTB tuple. Values of the types
+        expected by their column are written straight to bytes; any
+        others, such as datetimes in a varchar column, are encoded by
+        :meth:`encode_to_ts_cell`, so that the bytes are the same as
+        without the encoder.
+
+        :param col_types: the types of the table's columns
+        :type col_types: list of strings
+        :rtype: function taking a row and returning bytes
+        '''
+        columns = [TS_CELL_ENCODERS.get(t, {}) for t in col_types]
+        width = len(columns)
+        header = _ttb_tuple_header(width)
+        encode_cell = self.encode_to_ts_cell
+
+        def encode_row(row):
+            check_timeseries_row(row, width)
+            terms = [header]
+            for encoders, cell in zip(columns, row):
+                if cell is None:
+                    terms.append(_TTB_NIL)
+                    continue
+                encoder = encoders.get(type(cell))
+                if encoder is None:
+                    terms.append(_ttb_term(encode_cell(cell)))
+                else:
+                    terms.append(encoder(cell))
+            return b''.join(terms)
+        return encode_row
+
+    def encode_timeseries_put(self, tsobj, row_encoder=None):
         '''
         Returns an Erlang-TTB encoded tuple with the appropriate data and
         metadata from a TsObject.
 
         :param tsobj: a TsObject
         :type tsobj: TsObject
+        :param row_encoder: an encoder from
+            :meth:`compile_timeseries_row_encoder` for the table
+        :type row_encoder: function
         :rtype: term-to-binary encoded object
         '''
         if tsobj.columns:
             raise NotImplementedError('columns are not used')
 
         if tsobj.rows and isinstance(tsobj.rows, list):
+            mc = MSG_CODE_TS_TTB_MSG
+            rc = MSG_CODE_TS_TTB_MSG
+            if row_encoder is not None:
+                # NB: the same term as below, with the encoded rows in
+                # a list
+                data = [b'\x83', _ttb_tuple_header(4),
+                        _ttb_term(tsputreq_a), _ttb_term(tsobj.table.name),
+                        _TTB_NIL, _TTB_SIZED.pack(b'l', len(tsobj.rows))]
+                data.extend(row_encoder(row) for row in tsobj.rows)
+                data.append(_TTB_NIL)
+                return Msg(mc, b''.join(data), rc)
             req_rows = []
             for row in tsobj.rows:
                 req_r = []
@@ -133,8 +261,6 @@ class TtbCodec(Codec):
                     req_r.append(self.encode_to_ts_cell(cell))
                 req_rows.append(tuple(req_r))
             req = tsputreq_a, tsobj.table.name, [], req_rows
-            mc = MSG_CODE_TS_TTB_MSG
-            rc = MSG_CODE_TS_TTB_MSG
             return Msg(mc, encode(req), rc)
         else:
             raise RiakError("TsObject requires a list of rows")
@@ -150,7 +276,7 @@ class TtbCodec(Codec):
         return Msg(mc, encode(req), rc)
 
     def decode_timeseries(self, resp_ttb, tsobj,
-                          convert_timestamp=False):
+                          convert_timestamp=False, columnar=False):
         """
         Fills an TsObject with the appropriate data and
         metadata from a TTB-encoded TsGetResp / TsQueryResp.
@@ -161,6 +287,8 @@ class TtbCodec(Codec):
         :type tsobj: TsObject
         :param convert_timestamp: Convert timestamps to datetime objects
         :type tsobj: boolean
+        :param columnar: Fill in the TsObject's arrays instead of rows
+        :type columnar: boolean
         """
         if resp_ttb is None:
             return tsobj
@@ -186,6 +314,11 @@ class TtbCodec(Codec):
                 tsobj.columns = self.decode_timeseries_cols(
                         resp_colnames, resp_coltypes)
                 resp_rows = resp_data[2]
+                if columnar:
+                    tsobj.rows = None
+                    tsobj.arrays = self.decode_timeseries_columns(
+                        resp_rows, tsobj.columns, convert_timestamp)
+                    return
                 tsobj.rows = []
                 for resp_row in resp_rows:
                     tsobj.rows.append(
@@ -202,6 +335,30 @@ class TtbCodec(Codec):
         ctypes = [str(ctype) for ctype in ctypes]
         return TsColumns(cnames, ctypes)
 
+    def decode_timeseries_columns(self, tsrows, tscols,
+                                  convert_timestamp=False):
+        """
+        Decodes TTB-encoded TsRows column by column.
+
+        :param tsrows: the TTB decoded rows
+        :type tsrows: list
+        :param tscols: the decoded columns of the rows
+        :type tscols: :class:`~riak.ts_object.TsColumns`
+        :param convert_timestamp: Convert timestamps to datetime objects
+        :type convert_timestamp: boolean
+        :rtype: :class:`~collections.OrderedDict` of column names to
+            arrays
+        """
+        names, types = tscols
+        columns = list(zip(*tsrows)) if tsrows else [()] * len(names)
+        arrays = OrderedDict()
+        for name, col_type, column in zip(names, types, columns):
+            # NB: nulls are encoded as empty lists
+            values = [None if cell == [] else cell for cell in column]
+            arrays[name] = timeseries_column(values, col_type,
+                                             convert_timestamp)
+        return arrays
+
     def decode_timeseries_row(self, tsrow, tsct, convert_timestamp=False):
         """
         Decodes a TTB-encoded TsRow into a list
@@ -12,7 +12,45 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array
+
 import riak.pb.messages
+import riak.pb.riak_pb2
+
+from riak.util import datetime_from_unix_time_millis
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _parses_memoryview():
+    """
+    Whether the installed protobuf runtime can parse a message
+    straight from a memoryview. Older pure-Python runtimes either
+    reject one or return views for bytes fields.
+    """
+    msg = riak.pb.riak_pb2.RpbErrorResp(errmsg=b'errmsg', errcode=1)
+    parsed = riak.pb.riak_pb2.RpbErrorResp()
+    try:
+        parsed.ParseFromString(memoryview(msg.SerializeToString()))
+    except Exception:
+        return False
+    return isinstance(parsed.errmsg, bytes) and parsed.errmsg == b'errmsg'
+
+
+PARSES_MEMORYVIEW = _parses_memoryview()
+
+
+def to_bytes(data):
+    """
+    Copies received message data out of a memoryview, for decoders
+    that require bytes.
+    """
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
 
 
 def parse_pbuf_msg(msg_code, data):
@@ -20,5 +58,82 @@ def parse_pbuf_msg(msg_code, data):
     if pbclass is None:
         return None
     pbo = pbclass()
+    if not PARSES_MEMORYVIEW:
+        data = to_bytes(data)
     pbo.ParseFromString(data)
     return pbo
+
+
+def _array_typecode(typecode):
+    try:
+        array.array(typecode)
+        return typecode
+    except ValueError:
+        return None
+
+
+# NB: Python 2's array module has no 64-bit integer type
+_INT64_TYPECODE = _array_typecode('q')
+
+_ARRAY_TYPECODES = {'sint64': _INT64_TYPECODE,
+                    'timestamp': _INT64_TYPECODE,
+                    'double': 'd'}
+
+_NUMPY_DTYPES = {'sint64': 'int64',
+                 'timestamp': 'int64',
+                 'double': 'float64',
+                 'boolean': 'bool'}
+
+
+def timeseries_column(values, col_type, convert_timestamp=False):
+    """
+    Packs the decoded values of a timeseries column into an array.
+    With NumPy installed this is a :class:`numpy.ndarray` of the
+    column's type, with timestamps as ``datetime64[ms]`` when
+    ``convert_timestamp`` is set. Otherwise numeric columns are
+    :class:`array.array` instances and other columns are lists.
+    Columns containing nulls are kept as NumPy object arrays or
+    lists, with None for each null.
+
+    :param values: the values of the column
+    :type values: list
+    :param col_type: the column's type, e.g. 'sint64'
+    :type col_type: string
+    :param convert_timestamp: whether to convert timestamps to
+        datetimes
+    :type convert_timestamp: boolean
+    """
+    has_nulls = None in values
+    if numpy is not None:
+        if has_nulls or col_type not in _NUMPY_DTYPES:
+            if convert_timestamp and col_type == 'timestamp':
+                values = [_maybe_datetime(v) for v in values]
+            return numpy.array(values, dtype=object)
+        if convert_timestamp and col_type == 'timestamp':
+            return numpy.array(values, dtype='datetime64[ms]')
+        return numpy.array(values, dtype=_NUMPY_DTYPES[col_type])
+
+    if convert_timestamp and col_type == 'timestamp':
+        return [_maybe_datetime(v) for v in values]
+    typecode = _ARRAY_TYPECODES.get(col_type)
+    if typecode is None or has_nulls:
+        return values
+    return array.array(typecode, values)
+
+
+def check_timeseries_row(row, width):
+    """
+    Raises an error if a row to be stored does not have one value
+    for each of the table's ``width`` columns.
+    """
+    if not isinstance(row, (list, tuple)):
+        raise ValueError("TsObject row must be a list of values")
+    if len(row) != width:
+        raise ValueError("row has {0} values but the table has {1} "
+                         "columns".format(len(row), width))
+
+
+def _maybe_datetime(value):
+    if value is None:
+        return None
+    return datetime_from_unix_time_millis(value)
@@ -15,7 +15,23 @@
 import math
 import time
 
-from threading import RLock
+from collections import deque
+from threading import Condition, Lock, RLock
+
+#: The number of seconds that features detected on a node, such as
+#: its server version, are shared by new connections to it
+DEFAULT_FEATURE_TTL = 600
+
+#: The number of recent request latencies kept per node for
+#: :meth:`RiakNode.latency_percentile`
+LATENCY_WINDOW = 100
+
+#: The number of consecutive failures after which a node is avoided
+DEFAULT_FAILURE_THRESHOLD = 5
+
+#: The number of seconds a failing node is avoided before it is tried
+#: again
+DEFAULT_RESET_TIMEOUT = 10
 
 
 class Decaying(object):
@@ -67,15 +83,283 @@ class Decaying(object):
             return self.p
 
 
+class MovingAverage(object):
+    """
+    An exponentially weighted moving average of samples, such as
+    request latencies. While no samples are added the average decays
+    toward 0 like :class:`Decaying`, so that a node which was slow is
+    eventually tried again.
+    """
+
+    def __init__(self, alpha=0.2, r=None):
+        """
+        Creates a new moving average.
+
+        :param alpha: the weight of each new sample (defaults to 0.2)
+        :type alpha: float
+        :param r: timescale factor of the decay while idle (defaults
+            to decaying 50% over 10 seconds, i.e. log(0.5) / 10)
+        :type r: float
+        """
+        self.alpha = alpha
+        self.r = r or (math.log(0.5) / 10)
+        self.p = None
+        self.lock = RLock()
+        self.t0 = time.time()
+
+    def add(self, sample):
+        """
+        Adds a sample to the average.
+
+        :param sample: the value to add
+        :type sample: float
+        """
+        with self.lock:
+            if self.p is None:
+                self.p = sample
+            else:
+                self.p = self.value() * (1 - self.alpha) + \
+                    sample * self.alpha
+            self.t0 = time.time()
+
+    def value(self):
+        """
+        Returns the current average (adjusted for the time decay), or
+        0.0 if there have been no samples.
+
+        :rtype: float
+        """
+        with self.lock:
+            if self.p is None:
+                return 0.0
+            dt = time.time() - self.t0
+            return self.p * math.exp(self.r * dt)
+
+
+class CircuitBreaker(object):
+    """
+    Tracks whether a node should receive requests. The breaker is
+    *closed* while the node works. After ``failure_threshold``
+    consecutive failures it *opens*, and the node is avoided. Once
+    ``reset_timeout`` seconds have passed it is *half-open*: a single
+    request is let through, which closes the breaker if it succeeds
+    and opens it again if it fails.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """
+        Creates a new, closed circuit breaker.
+
+        :param failure_threshold: the number of consecutive failures
+            that open the breaker
+        :type failure_threshold: int
+        :param reset_timeout: the number of seconds the breaker stays
+            open before letting a request through
+        :type reset_timeout: float
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = RLock()
+
+    @property
+    def state(self):
+        """
+        The current state: :attr:`CLOSED`, :attr:`OPEN` or
+        :attr:`HALF_OPEN`.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return self.CLOSED
+            elif time.time() - self.opened_at < self.reset_timeout:
+                return self.OPEN
+            else:
+                return self.HALF_OPEN
+
+    def available(self):
+        """
+        Whether a request may be sent now.
+
+        :rtype: boolean
+        """
+        with self.lock:
+            state = self.state
+            return state == self.CLOSED or \
+                (state == self.HALF_OPEN and not self.probing)
+
+    def attempt(self):
+        """
+        Records that a request is about to be sent. While half-open,
+        only the first caller is admitted, as the probe, which makes
+        the breaker unavailable until its request finishes.
+
+        :rtype: boolean, False if the breaker is open or another
+            request is already probing the node
+        """
+        with self.lock:
+            state = self.state
+            if state == self.HALF_OPEN:
+                if self.probing:
+                    return False
+                self.probing = True
+                return True
+            return state == self.CLOSED
+
+    def record_success(self):
+        """
+        Records a successful request, closing the breaker.
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        """
+        Records a failed request, opening the breaker if it was
+        half-open or has failed ``failure_threshold`` times in a row.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.opened_at is not None or \
+                    self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self.probing = False
+
+    def finished(self):
+        """
+        Records that a request finished without showing whether the
+        node works, e.g. because Riak returned an error.
+        """
+        with self.lock:
+            self.probing = False
+
+
+class ConcurrencyLimit(object):
+    """
+    Limits the number of requests in flight to a node, so that bulk
+    operations spread their load instead of piling onto one node.
+    Requests wait in :meth:`acquire` while the node is at its limit.
+
+    With ``adaptive`` set, the limit follows observed latency using
+    additive-increase/multiplicative-decrease (AIMD): each request that
+    succeeds within ``tolerance`` times the lowest recent latency
+    raises the limit by about one per round of ``limit`` requests,
+    while each timeout, connection failure or slower request multiplies
+    it by ``backoff``. Other failures, such as errors Riak reports for
+    a bad request, leave the limit unchanged. The limit stays between
+    ``min_limit`` and ``max_limit``.
+    """
+
+    def __init__(self, max_limit, adaptive=False, min_limit=1, backoff=0.9,
+                 tolerance=2.0):
+        """
+        :param max_limit: the most requests in flight
+        :type max_limit: int
+        :param adaptive: whether to adjust the limit to latency
+        :type adaptive: boolean
+        :param min_limit: the fewest requests in flight allowed when
+            adaptive
+        :type min_limit: int
+        :param backoff: the factor applied to the limit on congestion
+        :type backoff: float
+        :param tolerance: how many times slower than the lowest recent
+            latency a request may be before it signals congestion
+        :type tolerance: float
+        """
+        if max_limit < 1 or min_limit < 1:
+            raise ValueError("concurrency limits must be positive")
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.adaptive = adaptive
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._cond = Condition(Lock())
+
+    def full(self):
+        """
+        Whether as many requests as the limit allows are in flight.
+
+        :rtype: boolean
+        """
+        return self.in_flight >= int(self.limit)
+
+    def acquire(self, timeout=None):
+        """
+        Waits until a request may be sent, and counts it as in flight.
+
+        :param timeout: the most seconds to wait, or None to wait
+            indefinitely
+        :type timeout: float
+        :rtype: boolean, False if the timeout passed
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self.full():
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, elapsed=None, congested=False):
+        """
+        Records that a request counted by :meth:`acquire` finished.
+
+        :param elapsed: the seconds the request took, or None if it
+            failed
+        :type elapsed: float
+        :param congested: whether the request failed in a way that
+            signals an overloaded node, i.e. it timed out or lost its
+            connection
+        :type congested: boolean
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if self.adaptive:
+                self._adjust(elapsed, congested)
+            self._cond.notify_all()
+
+    def _adjust(self, elapsed, congested):
+        if not congested:
+            if elapsed is None:
+                # Failed for a reason that says nothing of the load
+                return
+            baseline = min(self._latencies) if self._latencies else elapsed
+            self._latencies.append(elapsed)
+            congested = elapsed > baseline * self.tolerance
+        if congested:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+
 class RiakNode(object):
     """
     The internal representation of a Riak node to which the client can
     connect. Encapsulates both the configuration for the node and
-    error tracking used for node-selection.
+    the error, latency and load tracking used for node-selection.
     """
 
     def __init__(self, host='127.0.0.1', http_port=8098, pb_port=8087,
-                 **unused_args):
+                 feature_ttl=DEFAULT_FEATURE_TTL, name=None,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_TIMEOUT, max_in_flight=None,
+                 adaptive_concurrency=False, **unused_args):
         """
         Creates a node.
 
@@ -85,8 +369,175 @@ class RiakNode(object):
         :type http_port: integer
         :param pb_port: the Protcol Buffers port of the node
         :type pb_port: integer
+        :param feature_ttl: the number of seconds detected server
+            features are reused by new connections
+        :type feature_ttl: float
+        :param name: the Erlang node name, e.g. ``riak@10.0.0.1``,
+            used to match preflist entries to this node. When omitted,
+            entries are matched by host.
+        :type name: string
+        :param failure_threshold: the number of consecutive failures
+            after which the node is avoided; see :class:`CircuitBreaker`
+        :type failure_threshold: int
+        :param reset_timeout: the number of seconds a failing node is
+            avoided before it is tried again
+        :type reset_timeout: float
+        :param max_in_flight: if set, the most requests sent to the node
+            at once; see :class:`ConcurrencyLimit`
+        :type max_in_flight: int
+        :param adaptive_concurrency: whether to lower the limit on
+            requests in flight while the node is slow or failing
+        :type adaptive_concurrency: boolean
         """
         self.host = host
         self.http_port = http_port
         self.pb_port = pb_port
         self.error_rate = Decaying()
+        self.latency = MovingAverage()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.in_flight = 0
+        self._load_lock = Lock()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.concurrency = None
+        if max_in_flight:
+            self.concurrency = ConcurrencyLimit(
+                max_in_flight, adaptive=adaptive_concurrency)
+        self.feature_ttl = feature_ttl
+        self.name = name
+        self._features = {}
+
+    def admit(self):
+        """
+        Asks the :attr:`breaker` whether a request may be sent to this
+        node now, claiming its single probe while it is half-open; see
+        :meth:`CircuitBreaker.attempt`.
+
+        :rtype: boolean
+        """
+        return self.breaker.attempt()
+
+    def request_started(self):
+        """
+        Records that a request was sent to this node.
+        """
+        with self._load_lock:
+            self.in_flight += 1
+
+    def request_finished(self, elapsed=None):
+        """
+        Records that a request to this node has finished. Failures
+        should also be reported with :meth:`record_error`.
+
+        :param elapsed: the seconds the request took, if it succeeded
+        :type elapsed: float
+        """
+        with self._load_lock:
+            self.in_flight -= 1
+        if elapsed is not None:
+            self.latency.add(elapsed)
+            self._latencies.append(elapsed)
+            self.breaker.record_success()
+        else:
+            self.breaker.finished()
+
+    def record_error(self):
+        """
+        Records that the node could not be reached or failed a
+        request, which makes it less likely to be chosen and may open
+        its :attr:`breaker`.
+        """
+        self.error_rate.incr(1)
+        self.breaker.record_failure()
+
+    def available(self):
+        """
+        Whether requests may be sent to this node, i.e. its
+        :attr:`breaker` is not open.
+
+        :rtype: boolean
+        """
+        return self.breaker.available()
+
+    def saturated(self):
+        """
+        Whether the node has as many requests in flight as its
+        :attr:`concurrency` limit allows.
+
+        :rtype: boolean
+        """
+        return self.concurrency is not None and self.concurrency.full()
+
+    def latency_percentile(self, percentile, min_samples=1):
+        """
+        Returns a percentile of the latencies of recent successful
+        requests to this node, or None if there have been fewer than
+        ``min_samples`` of them.
+
+        :param percentile: the percentile, from 0 to 100
+        :type percentile: float
+        :param min_samples: the fewest samples to estimate from
+        :type min_samples: int
+        :rtype: float
+        """
+        samples = sorted(list(self._latencies))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = int(round(percentile / 100.0 * (len(samples) - 1)))
+        return samples[index]
+
+    def load(self):
+        """
+        Estimates how busy this node is from its recent latency and
+        the requests in flight to it. Lower is better.
+
+        :rtype: float
+        """
+        return self.latency.value() * (self.in_flight + 1)
+
+    def get_feature(self, key):
+        """
+        Returns a value previously detected on this node by a
+        connection, or None if there is none or it has expired.
+
+        :param key: the name of the feature
+        :type key: hashable
+        """
+        entry = self._features.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if time.time() >= expires:
+            return None
+        return value
+
+    def set_feature(self, key, value):
+        """
+        Records a value detected on this node for reuse by other
+        connections, until :attr:`feature_ttl` passes.
+
+        :param key: the name of the feature
+        :type key: hashable
+        :param value: the detected value
+        """
+        self._features[key] = (value, time.time() + self.feature_ttl)
+
+    def matches_name(self, name):
+        """
+        Whether an Erlang node name, as found in preflists, refers to
+        this node.
+
+        :param name: the Erlang node name
+        :type name: string
+        :rtype: boolean
+        """
+        if self.name is not None:
+            return name == self.name
+        return name.rpartition('@')[2] == self.host
+
+    def invalidate_features(self):
+        """
+        Forgets all detected features, so that the next new connection
+        detects them again. Called when connections to the node fail,
+        since the node may be restarting with a different version.
+        """
+        self._features = {}
@@ -38,6 +38,15 @@ class ConflictError(RiakError):
         super(ConflictError, self).__init__(message)
 
 
+class PoolExhausted(RiakError):
+    """
+    Raised when a connection pool has reached its ``max_size`` and no
+    connection was released within its ``acquire_timeout``.
+    """
+    def __init__(self, message='The connection pool is exhausted'):
+        super(PoolExhausted, self).__init__(message)
+
+
 class ListError(RiakError):
     """
     Raised when a list operation is attempted and
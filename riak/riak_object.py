@@ -283,7 +283,8 @@ class RiakObject(object):
         return self
 
     def reload(self, r=None, pr=None, timeout=None, basic_quorum=None,
-               notfound_ok=None, head_only=False):
+               notfound_ok=None, head_only=False, hedge=None,
+               retry_policy=None):
         """
         Reload the object from Riak. When this operation completes, the
         object could contain new metadata and a new value, if the object
@@ -310,10 +311,18 @@ class RiakObject(object):
         :param head_only: whether to fetch without value, so only metadata
            (only available on PB transport)
         :type head_only: bool
+        :param hedge: the delay before a hedged request, or True to
+           derive it from recent latencies; see
+           :meth:`RiakClient.get <riak.client.RiakClient.get>`
+        :type hedge: float, bool
+        :param retry_policy: the retry policy of this request, instead
+           of the bucket's or client's
+        :type retry_policy: :class:`~riak.client.retry.RetryPolicy`
         :rtype: :class:`RiakObject`
         """
 
-        self.client.get(self, r=r, pr=pr, timeout=timeout, head_only=head_only)
+        self.client.get(self, r=r, pr=pr, timeout=timeout, head_only=head_only,
+                        hedge=hedge, retry_policy=retry_policy)
         return self
 
     def delete(self, r=None, w=None, dw=None, pr=None, pw=None,
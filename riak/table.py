@@ -12,8 +12,118 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
+from collections import namedtuple
 from six import string_types, PY2
 
+from riak.riak_error import RiakError
+from riak.util import bytes_to_str
+
+# The milliseconds in each unit of a quantum
+_QUANTUM_UNITS = {'d': 24 * 60 * 60 * 1000,
+                  'h': 60 * 60 * 1000,
+                  'm': 60 * 1000,
+                  's': 1000}
+
+
+class _CachedSchema(object):
+    """
+    A table's schema as cached by its client, with the row encoders
+    compiled from it. The schema is None if the table could not be
+    described when it was first stored to.
+    """
+
+    def __init__(self, schema, expires):
+        self.schema = schema
+        self.expires = expires
+        self.row_encoders = {}
+
+
+class Quantum(namedtuple('Quantum', ['column', 'interval', 'unit'])):
+    """
+    The quantum of a timeseries table, which groups rows by time
+    into spans of ``interval`` units of its timestamp ``column``.
+    The unit is one of 'd', 'h', 'm' or 's'.
+    """
+    __slots__ = ()
+
+    @property
+    def millis(self):
+        """
+        The span of the quantum in milliseconds.
+        """
+        return self.interval * _QUANTUM_UNITS[self.unit]
+
+
+class TableSchema(object):
+    """
+    The layout of a timeseries table, parsed from its description:
+    its :class:`~riak.ts_object.TsColumns`, the names of the columns
+    in its partition and local keys, and its :class:`Quantum`, if
+    any.
+    """
+
+    def __init__(self, columns, partition_key, local_key, quantum=None):
+        """
+        :param columns: the names and types of the columns
+        :type columns: :class:`~riak.ts_object.TsColumns`
+        :param partition_key: the columns of the partition key, in
+            order
+        :type partition_key: list of strings
+        :param local_key: the columns of the local key, in order
+        :type local_key: list of strings
+        :param quantum: the quantum of the partition key
+        :type quantum: :class:`Quantum`
+        """
+        self.columns = columns
+        self.partition_key = partition_key
+        self.local_key = local_key
+        self.quantum = quantum
+
+    @property
+    def names(self):
+        """
+        The names of the columns.
+        """
+        return self.columns.names
+
+    @property
+    def types(self):
+        """
+        The types of the columns.
+        """
+        return self.columns.types
+
+    @classmethod
+    def from_description(cls, desc):
+        """
+        Parses the result of :meth:`Table.describe`. Each row
+        describes a column: its name, type, whether it is nullable,
+        its positions in the partition and local keys and, from Riak
+        TS 1.3, the interval and unit of its quantum.
+
+        :param desc: the description
+        :type desc: :class:`~riak.ts_object.TsObject`
+        :rtype: :class:`TableSchema`
+        """
+        from riak.ts_object import TsColumns
+
+        rows = desc.rows or []
+        names = [bytes_to_str(row[0]) for row in rows]
+        columns = TsColumns(names, [bytes_to_str(row[1]) for row in rows])
+
+        def key(position):
+            return [name for index, name in sorted(
+                (row[position], name) for row, name in zip(rows, names)
+                if row[position] is not None)]
+
+        quantum = None
+        for row, name in zip(rows, names):
+            if len(row) >= 7 and row[5] is not None:
+                quantum = Quantum(name, row[5], bytes_to_str(row[6]))
+        return cls(columns, key(3), key(4), quantum)
+
 
 class Table(object):
     """
@@ -41,6 +151,7 @@ class Table(object):
 
         self._client = client
         self.name = name
+        self._schema_ttl = None
 
     def __str__(self):
         return self.name
@@ -71,15 +182,19 @@ class Table(object):
         """
         return self._client.ts_describe(self)
 
-    def get(self, key):
+    def get(self, key, format=None):
         """
         Gets a value from a timeseries table.
 
         :param key: The timeseries value's key.
         :type key: list
+        :param format: 'rows' (the default) or 'columnar'; see
+            :meth:`RiakClient.ts_query
+            <riak.client.RiakClient.ts_query>`
+        :type format: string
         :rtype: :class:`TsObject <riak.ts_object.TsObject>`
         """
-        return self._client.ts_get(self, key)
+        return self._client.ts_get(self, key, format=format)
 
     def delete(self, key):
         """
@@ -91,15 +206,198 @@ class Table(object):
         """
         return self._client.ts_delete(self, key)
 
-    def query(self, query, interpolations=None):
+    def query(self, query, interpolations=None, format=None):
         """
         Queries a timeseries table.
 
         :param query: The timeseries query.
         :type query: string
+        :param format: 'rows' (the default) or 'columnar'; see
+            :meth:`RiakClient.ts_query
+            <riak.client.RiakClient.ts_query>`
+        :type format: string
         :rtype: :class:`TsObject <riak.ts_object.TsObject>`
         """
-        return self._client.ts_query(self, query, interpolations)
+        return self._client.ts_query(self, query, interpolations,
+                                     format=format)
+
+    @property
+    def schema_ttl(self):
+        """
+        The number of seconds the table's schema is cached, or None to
+        keep it until it is refreshed. Defaults to the client's
+        ``ts_schema_ttl``.
+        """
+        if self._schema_ttl is not None:
+            return self._schema_ttl
+        return getattr(self._client, 'ts_schema_ttl', None)
+
+    @schema_ttl.setter
+    def schema_ttl(self, value):
+        self._schema_ttl = value
+
+    def schema(self, refresh=False):
+        """
+        Retrieves the layout of the table from its description. The
+        schema is cached by the client for :attr:`schema_ttl` seconds,
+        so that repeated calls, including those through other
+        ``Table`` objects of the same name, do not each run a
+        ``DESCRIBE`` query; pass
+        ``refresh`` to fetch it again, e.g. after the table was
+        recreated.
+
+        While the schema is cached, rows stored in the table are
+        encoded by a row encoder compiled for its column types, which
+        is faster for large batches and checks that each row has one
+        value per column, and keys given to :meth:`get` and
+        :meth:`delete` are checked against the local key. The schema
+        is fetched by the first :meth:`RiakClient.ts_put
+        <riak.client.RiakClient.ts_put>` to the table if it is not
+        cached.
+
+        :param refresh: whether to fetch the schema even if it is
+            cached
+        :type refresh: boolean
+        :rtype: :class:`TableSchema`
+        """
+        cached = None if refresh else self._cache_entry()
+        if cached is None or cached.schema is None:
+            cached = self._cache_schema(self.describe())
+        return cached.schema
+
+    def _cache_schema(self, description):
+        """
+        Caches the schema parsed from a description of the table, or
+        that the table could not be described if it is None.
+
+        :rtype: :class:`_CachedSchema`
+        """
+        schema = None
+        if description is not None:
+            schema = TableSchema.from_description(description)
+        ttl = self.schema_ttl
+        expires = time.time() + ttl if ttl is not None else None
+        cached = _CachedSchema(schema, expires)
+        self._client._ts_schemas[self.name] = cached
+        return cached
+
+    def _load_schema(self):
+        """
+        Fetches and caches the schema before rows are stored, unless
+        it is cached. If the table cannot be described, that is cached
+        instead, and rows are encoded without the schema.
+        """
+        if getattr(self._client, '_ts_schemas', None) is None or \
+                self._cache_entry() is not None:
+            return
+        try:
+            description = self.describe()
+        except RiakError:
+            description = None
+        self._cache_schema(description)
+
+    def _cache_entry(self):
+        """
+        Returns the client's cache entry for this table's schema, or
+        None if it has not been retrieved or has expired.
+        """
+        schemas = getattr(self._client, '_ts_schemas', None)
+        cached = schemas.get(self.name) if schemas is not None else None
+        if cached is None or \
+                (cached.expires is not None and time.time() >= cached.expires):
+            return None
+        return cached
+
+    def _cached_schema(self):
+        """
+        Returns the cached schema, or None if it has not been retrieved
+        or has expired.
+        """
+        cached = self._cache_entry()
+        return cached.schema if cached is not None else None
+
+    def _row_encoder(self, codec):
+        """
+        Returns the codec's row encoder for this table, compiled from
+        the cached schema, or None if the schema is not cached.
+        """
+        cached = self._cache_entry()
+        if cached is None or cached.schema is None:
+            return None
+        encoders = cached.row_encoders
+        encoder = encoders.get(type(codec))
+        if encoder is None:
+            try:
+                encoder = codec.compile_timeseries_row_encoder(
+                    cached.schema.types)
+            except KeyError:
+                # A column type this client does not know
+                return None
+            encoders[type(codec)] = encoder
+        return encoder
+
+    def _check_key(self, key):
+        """
+        Raises an error if a key does not have one value for each
+        column of the local key, when the schema is cached.
+        """
+        schema = self._cached_schema()
+        if schema is None or not isinstance(key, list) or \
+                not schema.local_key:
+            return
+        if len(key) != len(schema.local_key):
+            raise ValueError('key has {0} values but the local key of {1} '
+                             'has {2} columns'.format(
+                                 len(key), self.name,
+                                 len(schema.local_key)))
+
+    def quantum(self):
+        """
+        Retrieves the quantum of the table from its cached
+        :meth:`schema`. Returns None if the table has no quantum, or
+        if the cluster does not describe quanta.
+
+        :rtype: :class:`Quantum`
+        """
+        return self.schema().quantum
+
+    def stream_query(self, query, chunk_rows=None, interpolations=None,
+                     quantum=None, parallel=1):
+        """
+        Queries a timeseries table one quantum at a time, yielding
+        the rows in batches; see :meth:`RiakClient.ts_stream_query
+        <riak.client.RiakClient.ts_stream_query>`.
+
+        :param query: The timeseries query, bounded by a time range.
+        :type query: string
+        :param chunk_rows: The most rows in each batch.
+        :type chunk_rows: int
+        :rtype: generator of lists
+        """
+        return self._client.ts_stream_query(
+            self, query, chunk_rows=chunk_rows,
+            interpolations=interpolations, quantum=quantum,
+            parallel=parallel)
+
+    def bulk_writer(self, batch_rows=None, max_in_flight=None,
+                    flush_interval=None):
+        """
+        Creates a writer that stores rows in this table in parallel
+        batches; see :meth:`RiakClient.ts_bulk_writer
+        <riak.client.RiakClient.ts_bulk_writer>`.
+
+        :param batch_rows: The most rows in each request.
+        :type batch_rows: int
+        :param max_in_flight: The most batches being stored at once.
+        :type max_in_flight: int
+        :param flush_interval: The seconds between sends of buffered
+            rows.
+        :type flush_interval: float
+        :rtype: :class:`~riak.client.timeseries.BulkWriter`
+        """
+        return self._client.ts_bulk_writer(
+            self, batch_rows=batch_rows, max_in_flight=max_in_flight,
+            flush_interval=flush_interval)
 
     def stream_keys(self, timeout=None):
         """
@@ -0,0 +1,255 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import struct
+import sys
+import unittest
+
+import riak.pb.messages
+import riak.pb.riak_pb2
+import riak.pb.riak_kv_pb2
+
+from erlastic import encode
+from erlastic.types import Atom
+
+from riak.tests.test_pipeline import frame, get_resp
+
+# NB: the asyncio client uses async generators, so it cannot even be
+# imported before Python 3.6
+HAVE_AIO = sys.version_info >= (3, 6)
+if HAVE_AIO:
+    import asyncio
+    from riak.client.aio import AsyncRiakClient
+    from riak.client.index_page import CONTINUATION
+    from riak.transports.pool import ConnectionClosed
+
+    class FakeRiakProtocol(asyncio.Protocol):
+        """
+        Answers framed PB requests using its server's handler. A
+        handler returning None drops the connection.
+        """
+        def __init__(self, server):
+            self.server = server
+            self.buf = b''
+
+        def connection_made(self, transport):
+            self.transport = transport
+            self.server.connections += 1
+
+        def data_received(self, data):
+            self.buf += data
+            while len(self.buf) >= 4:
+                msglen, = struct.unpack('!I', self.buf[:4])
+                if len(self.buf) < 4 + msglen:
+                    return
+                msg_code = self.buf[4]
+                body = self.buf[5:4 + msglen]
+                self.buf = self.buf[4 + msglen:]
+                self.server.requests.append(msg_code)
+                replies = self.server.handle(msg_code, body)
+                if replies is None:
+                    self.transport.close()
+                    return
+                self.transport.write(b''.join(replies))
+
+
+def server_info_resp():
+    resp = riak.pb.riak_pb2.RpbGetServerInfoResp()
+    resp.node = b'riak@127.0.0.1'
+    resp.server_version = b'2.1.4'
+    return frame(riak.pb.messages.MSG_CODE_GET_SERVER_INFO_RESP, resp)
+
+
+def ttb_resp(term):
+    data = encode(term)
+    return struct.pack('!iB', 1 + len(data),
+                       riak.pb.messages.MSG_CODE_TS_TTB_MSG) + data
+
+
+def index_resp(keys, done=False):
+    resp = riak.pb.riak_kv_pb2.RpbIndexResp()
+    resp.keys.extend(keys)
+    if done:
+        resp.done = True
+    return frame(riak.pb.messages.MSG_CODE_INDEX_RESP, resp)
+
+
+@unittest.skipUnless(HAVE_AIO, 'asyncio client requires Python 3.6+')
+class AsyncClientTests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.connections = 0
+        self.requests = []
+        self.handlers = {}
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(lambda: FakeRiakProtocol(self),
+                                    '127.0.0.1', 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.client = AsyncRiakClient(host='127.0.0.1', pb_port=self.port)
+
+    def tearDown(self):
+        self.client.close()
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def handle(self, msg_code, body):
+        if msg_code == riak.pb.messages.MSG_CODE_GET_SERVER_INFO_REQ:
+            return [server_info_resp()]
+        handler = self.handlers[msg_code]
+        return handler() if callable(handler) else handler
+
+    def await_(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def collect(self, stream):
+        results = []
+        while True:
+            try:
+                results.append(self.await_(stream.__anext__()))
+            except StopAsyncIteration:
+                return results
+
+    def client_with_dead_node(self):
+        """
+        Returns a client whose first node refuses connections and is
+        chosen whenever it has not been skipped.
+        """
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        dead_port = sock.getsockname()[1]
+        sock.close()
+        client = AsyncRiakClient(nodes=[
+            {'host': '127.0.0.1', 'pb_port': dead_port},
+            {'host': '127.0.0.1', 'pb_port': self.port}])
+        client._choose_node = lambda nodes=None: (nodes or client.nodes)[0]
+        self.client.close()
+        self.client = client
+        return client
+
+    def test_get_and_connection_reuse(self):
+        self.handlers[riak.pb.messages.MSG_CODE_GET_REQ] = \
+            [get_resp(b'hello')]
+        self.handlers[riak.pb.messages.MSG_CODE_PING_REQ] = \
+            [frame(riak.pb.messages.MSG_CODE_PING_RESP)]
+        bucket = self.client.bucket('aio')
+        obj = self.await_(self.client.get(bucket.new('a')))
+        self.assertEqual('hello', obj.data)
+        self.assertIsNotNone(obj.vclock)
+        self.assertTrue(self.await_(self.client.ping()))
+        self.assertEqual(1, self.connections)
+
+    def test_get_requires_string_key(self):
+        bucket = self.client.bucket('aio')
+        with self.assertRaises(TypeError):
+            self.await_(self.client.get(bucket.new(1)))
+
+    def test_dropped_connection_is_retried(self):
+        replies = [None, [frame(riak.pb.messages.MSG_CODE_PING_RESP)]]
+        self.handlers[riak.pb.messages.MSG_CODE_PING_REQ] = \
+            lambda: replies.pop(0)
+        self.assertTrue(self.await_(self.client.ping()))
+        self.assertEqual(2, self.connections)
+
+    def test_retries_count_excludes_first_attempt(self):
+        replies = [None, None, [frame(riak.pb.messages.MSG_CODE_PING_RESP)]]
+        self.handlers[riak.pb.messages.MSG_CODE_PING_REQ] = \
+            lambda: replies.pop(0)
+        self.client.retries = 1
+        with self.assertRaises(ConnectionClosed):
+            self.await_(self.client.ping())
+        self.assertEqual(2, self.connections)
+
+    def test_refused_connection_is_retried(self):
+        self.handlers[riak.pb.messages.MSG_CODE_PING_REQ] = \
+            [frame(riak.pb.messages.MSG_CODE_PING_RESP)]
+        client = self.client_with_dead_node()
+        dead, live = client.nodes
+        self.assertTrue(self.await_(client.ping()))
+        self.assertGreater(dead.error_rate.value(), 0)
+        self.assertEqual(0, live.error_rate.value())
+
+    def test_refused_connections_exhaust_retries(self):
+        client = self.client_with_dead_node()
+        client.nodes = client.nodes[:1]
+        client.retries = 2
+        acquire = client._pool.acquire
+        attempts = []
+
+        def counting_acquire(**kwargs):
+            attempts.append(kwargs['node'])
+            return acquire(**kwargs)
+
+        client._pool.acquire = counting_acquire
+        with self.assertRaises(IOError):
+            self.await_(client.ping())
+        self.assertEqual(3, len(attempts))
+
+    def test_stream_refused_connection_is_retried(self):
+        self.handlers[riak.pb.messages.MSG_CODE_INDEX_REQ] = \
+            [index_resp([b'a'], done=True)]
+        client = self.client_with_dead_node()
+        stream = client.stream_index(client.bucket('aio'), 'field_bin',
+                                     'a', 'z')
+        self.assertEqual([['a']], self.collect(stream))
+        self.assertGreater(client.nodes[0].error_rate.value(), 0)
+
+    def test_stream_dropped_before_start_is_retried(self):
+        replies = [None, [index_resp([b'a'], done=True)]]
+        self.handlers[riak.pb.messages.MSG_CODE_INDEX_REQ] = \
+            lambda: replies.pop(0)
+        bucket = self.client.bucket('aio')
+        stream = self.client.stream_index(bucket, 'field_bin', 'a', 'z')
+        self.assertEqual([['a']], self.collect(stream))
+        self.assertEqual(2, self.connections)
+
+    def test_stream_index(self):
+        self.handlers[riak.pb.messages.MSG_CODE_INDEX_REQ] = \
+            [index_resp([b'a', b'b']), index_resp([b'c'], done=True)]
+        bucket = self.client.bucket('aio')
+        stream = self.client.stream_index(bucket, 'field_bin', 'a', 'z')
+        results = self.collect(stream)
+        self.assertEqual([['a', 'b'], ['c']], results)
+        self.assertNotIsInstance(results[-1], CONTINUATION)
+        self.assertEqual(1, len(self.client._pool._idle))
+
+    def test_rejected_idle_connections_closed(self):
+        self.handlers[riak.pb.messages.MSG_CODE_PING_REQ] = \
+            [frame(riak.pb.messages.MSG_CODE_PING_RESP)]
+        pool = self.client._pool
+
+        first = self.await_(pool.acquire())
+        second = self.await_(pool.acquire())
+        pool.release(first)
+        pool.release(second)
+        self.assertIs(second, self.await_(pool.acquire()))
+        conn = self.await_(pool.acquire(_filter=lambda c: False))
+        self.assertNotIn(conn, (first, second))
+        self.assertEqual(0, len(pool._idle))
+        self.assertEqual(3, self.connections)
+        pool.release(second)
+        pool.release(conn)
+
+    def test_ts_put_without_description(self):
+        replies = [ttb_resp((Atom('rpberrorresp'), b'no such table', 1)),
+                   ttb_resp(Atom('tsputresp')), ttb_resp(Atom('tsputresp'))]
+        self.handlers[riak.pb.messages.MSG_CODE_TS_TTB_MSG] = \
+            lambda: [replies.pop(0)]
+        table = self.client.table('GeoCheckin')
+        self.assertTrue(self.await_(self.client.ts_put(table.new([[1]]))))
+        self.assertTrue(self.await_(self.client.ts_put(table.new([[2]]))))
+        self.assertIsNone(table._cached_schema())
+        self.assertEqual([], replies)
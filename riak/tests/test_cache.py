@@ -0,0 +1,164 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+import riak.pb.messages
+import riak.pb.riak_kv_pb2
+
+from riak import RiakClient
+from riak.client.cache import ObjectCache
+from riak.tests.test_health import PingServer
+from riak.tests.test_pipeline import frame
+
+
+class ObjectServer(PingServer):
+    """
+    Stores a single value and vector clock, counting full and
+    head-only gets, and calling on_get before answering one.
+    """
+    def __init__(self):
+        self.value = b'one'
+        self.vclock = b'vclock-1'
+        self.gets = 0
+        self.heads = 0
+        self.on_get = None
+        super(ObjectServer, self).__init__()
+
+    def respond(self, msg_code, data):
+        if msg_code == riak.pb.messages.MSG_CODE_GET_REQ:
+            req = riak.pb.riak_kv_pb2.RpbGetReq()
+            req.ParseFromString(data)
+            if self.on_get is not None:
+                self.on_get()
+            resp = riak.pb.riak_kv_pb2.RpbGetResp()
+            resp.vclock = self.vclock
+            content = resp.content.add()
+            content.content_type = b'text/plain'
+            if req.head:
+                self.heads += 1
+                content.value = b''
+            else:
+                self.gets += 1
+                content.value = self.value
+            return frame(riak.pb.messages.MSG_CODE_GET_RESP, resp)
+        elif msg_code == riak.pb.messages.MSG_CODE_PUT_REQ:
+            return frame(riak.pb.messages.MSG_CODE_PUT_RESP)
+        elif msg_code == riak.pb.messages.MSG_CODE_DEL_REQ:
+            return frame(riak.pb.messages.MSG_CODE_DEL_RESP)
+        return self.reply(msg_code)
+
+
+class ObjectCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ObjectServer()
+        self.cache = ObjectCache()
+        self.client = RiakClient(pb_port=self.server.port,
+                                 object_cache=self.cache)
+        self.bucket = self.client.bucket('cache')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_read_through(self):
+        one = self.bucket.get('a')
+        two = self.bucket.get('a')
+        self.assertEqual(1, self.server.gets)
+        self.assertEqual('one', two.data)
+        self.assertIsNot(one.siblings[0], two.siblings[0])
+        self.assertIs(two, two.siblings[0]._robject)
+        self.assertEqual(b'vclock-1', two.vclock.encode('binary'))
+
+    def test_copies_are_independent(self):
+        one = self.bucket.get('a')
+        one.data = 'changed'
+        one.usermeta['a'] = 'b'
+        two = self.bucket.get('a')
+        self.assertEqual('one', two.data)
+        self.assertEqual({}, two.usermeta)
+
+    def test_head_only_not_cached(self):
+        self.bucket.get('a', head_only=True)
+        self.assertEqual(0, len(self.cache))
+
+    def test_invalidated_by_put_and_delete(self):
+        obj = self.bucket.get('a')
+        obj.store(return_body=False)
+        self.assertEqual(0, len(self.cache))
+        self.bucket.get('a')
+        self.bucket.delete('a')
+        self.assertEqual(0, len(self.cache))
+        self.bucket.get('a')
+        self.assertEqual(3, self.server.gets)
+
+    def test_invalidated_while_fetching(self):
+        # A write that lands during the fetch must not be undone by it
+        self.server.on_get = lambda: self.cache.invalidate(self.bucket, 'a')
+        self.bucket.get('a')
+        self.assertEqual(0, len(self.cache))
+        self.server.on_get = None
+        self.bucket.get('a')
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual({}, self.cache._pending)
+
+    def test_read_options_bypass(self):
+        self.bucket.get('a')
+        self.bucket.get('a', r=3)
+        self.bucket.get('a', pr=1)
+        self.bucket.get('a', basic_quorum=True)
+        self.bucket.get('a', notfound_ok=False)
+        self.assertEqual(5, self.server.gets)
+        self.bucket.get('b', r='all')
+        self.assertEqual(1, len(self.cache))
+
+    def test_entries_expire(self):
+        self.cache.ttl = 0.05
+        self.bucket.get('a')
+        time.sleep(0.06)
+        self.bucket.get('a')
+        self.assertEqual(2, self.server.gets)
+
+    def test_bytes_bounded(self):
+        self.cache.max_bytes = 7
+        self.bucket.get('a')
+        self.bucket.get('b')
+        self.bucket.get('a')
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(6, self.cache.size)
+        self.bucket.get('c')
+        self.assertEqual(2, len(self.cache))
+        self.bucket.get('a')
+        self.bucket.get('b')
+        self.assertEqual(4, self.server.gets)
+
+    def test_revalidation(self):
+        self.cache.revalidate = True
+        self.bucket.get('a')
+        self.assertEqual('one', self.bucket.get('a').data)
+        self.assertEqual((1, 1), (self.server.gets, self.server.heads))
+        self.server.value = b'two'
+        self.server.vclock = b'vclock-2'
+        self.assertEqual('two', self.bucket.get('a').data)
+        self.assertEqual((2, 2), (self.server.gets, self.server.heads))
+
+    def test_bucket_cache(self):
+        other = self.client.bucket('other')
+        other.object_cache = ObjectCache()
+        other.get('a')
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(1, len(other.object_cache))
+        self.bucket.object_cache = None
+        self.assertIs(self.cache, self.bucket.object_cache)
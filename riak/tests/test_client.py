@@ -50,6 +50,25 @@ class ClientTests(IntegrationTestBase, unittest.TestCase):
         else:
             pass
 
+    def test_warm_up(self):
+        c = self.create_client(prewarm=2)
+        pool = c._choose_pool()
+        self.assertEqual(2, len(pool.resources))
+        for r in pool.resources:
+            self.assertFalse(r.claimed)
+            self.assertIn('server_version', r.object.__dict__)
+        self.assertEqual(1, c.warm_up(1))
+        self.assertTrue(c.ping())
+        c.close()
+
+    def test_warm_up_unreachable_node(self):
+        c = self.create_client(http_port=DUMMY_HTTP_PORT,
+                               pb_port=DUMMY_PB_PORT)
+        self.assertEqual(0, c.warm_up(2))
+        self.assertEqual(0, len(c._choose_pool().resources))
+        self.assertGreater(c.nodes[0].error_rate.value(), 0)
+        c.close()
+
     def test_request_retries(self):
         # We guess at some ports that will be unused by Riak or
         # anything else.
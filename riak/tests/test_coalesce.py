@@ -0,0 +1,130 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from riak import RiakClient, RiakError
+from riak.client.coalesce import SingleFlight
+from riak.tests.test_hedging import GetServer
+
+
+def concurrently(fn, count=10):
+    results = [None] * count
+
+    def run(i):
+        results[i] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return len(calls)
+
+        results = concurrently(lambda: flight.do('key', slow))
+        self.assertEqual([1] * 10, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(0, len(flight))
+        self.assertEqual(2, flight.do('key', slow))
+
+    def test_errors_raised_to_all_callers(self):
+        flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.1)
+            raise ValueError('failed')
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except ValueError as e:
+                return e
+        errors = concurrently(call, count=3)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_interrupted_leader(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def interrupted():
+            started.set()
+            time.sleep(0.1)
+            raise KeyboardInterrupt()
+
+        def lead():
+            try:
+                flight.do('key', interrupted)
+            except KeyboardInterrupt as e:
+                return e
+
+        def follow():
+            started.wait()
+            try:
+                return flight.do('key', lambda: 'result')
+            except RiakError as e:
+                return e
+        results = []
+        leader = threading.Thread(target=lambda: results.append(lead()))
+        leader.start()
+        errors = concurrently(follow, count=3)
+        leader.join()
+        self.assertIsInstance(results[0], KeyboardInterrupt)
+        self.assertTrue(all(isinstance(e, RiakError) for e in errors))
+        self.assertEqual(0, len(flight))
+
+
+class CoalescedGetTests(unittest.TestCase):
+    def setUp(self):
+        self.server = GetServer(b'value', delay=0.1)
+        self.client = RiakClient(pb_port=self.server.port,
+                                 coalesce_reads=True)
+        self.bucket = self.client.bucket('coalesce')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_identical_gets_coalesced(self):
+        objs = concurrently(lambda: self.bucket.get('a'))
+        self.assertEqual(1, self.server.gets)
+        for obj in objs:
+            self.assertEqual(b'value', obj.encoded_data)
+            self.assertIs(obj, obj.siblings[0]._robject)
+        self.assertEqual(10, len(set(id(obj.siblings[0]) for obj in objs)))
+
+    def test_different_options_not_coalesced(self):
+        concurrently(lambda: self.bucket.get('a', r=1), count=2)
+        concurrently(lambda: self.bucket.get('a', r=2), count=1)
+        concurrently(lambda: self.bucket.get('b', r=1), count=1)
+        self.assertEqual(3, self.server.gets)
+
+    def test_off_by_default(self):
+        client = RiakClient(pb_port=self.server.port)
+        concurrently(lambda: client.bucket('coalesce').get('a'), count=3)
+        self.assertEqual(3, self.server.gets)
+        client.close()
@@ -0,0 +1,151 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from riak import RiakClient, RiakError
+from riak.node import ConcurrencyLimit, RiakNode
+from riak.tests.test_multi import KeyServer
+
+
+class ConcurrencyLimitTests(unittest.TestCase):
+    def test_fixed_limit(self):
+        limit = ConcurrencyLimit(2)
+        self.assertTrue(limit.acquire())
+        self.assertTrue(limit.acquire())
+        self.assertTrue(limit.full())
+        self.assertFalse(limit.acquire(timeout=0.01))
+        limit.release(0.1)
+        self.assertTrue(limit.acquire(timeout=0.01))
+        self.assertEqual(2.0, limit.limit)
+
+    def test_waiters_woken(self):
+        limit = ConcurrencyLimit(1)
+        limit.acquire()
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(limit.acquire(timeout=1)))
+        waiter.start()
+        time.sleep(0.02)
+        self.assertEqual([], acquired)
+        limit.release(0.01)
+        waiter.join()
+        self.assertEqual([True], acquired)
+
+    def test_additive_increase(self):
+        limit = ConcurrencyLimit(10, adaptive=True)
+        limit.limit = 4.0
+        for i in range(4):
+            limit.acquire()
+        for i in range(4):
+            limit.release(0.01)
+        self.assertAlmostEqual(5.0, limit.limit, delta=0.2)
+        for i in range(1000):
+            limit.acquire()
+            limit.release(0.01)
+        self.assertEqual(10, limit.limit)
+
+    def test_multiplicative_decrease(self):
+        limit = ConcurrencyLimit(10, adaptive=True, backoff=0.5, min_limit=2)
+        limit.acquire()
+        limit.release(0.01)
+        limit.acquire()
+        limit.release(0.1)
+        self.assertEqual(5.0, limit.limit)
+        limit.acquire()
+        limit.release(congested=True)
+        limit.acquire()
+        limit.release(congested=True)
+        self.assertEqual(2, limit.limit)
+
+    def test_other_failures_ignored(self):
+        limit = ConcurrencyLimit(10, adaptive=True)
+        limit.acquire()
+        limit.release()
+        self.assertEqual(10, limit.limit)
+        self.assertEqual(0, limit.in_flight)
+
+    def test_node_saturated(self):
+        node = RiakNode(max_in_flight=1)
+        self.assertFalse(node.saturated())
+        node.concurrency.acquire()
+        self.assertTrue(node.saturated())
+        self.assertFalse(RiakNode().saturated())
+
+
+class NodeConcurrencyTests(unittest.TestCase):
+    def setUp(self):
+        self.servers = [KeyServer(delay=0.02), KeyServer(delay=0.02)]
+        self.client = RiakClient(
+            nodes=[{'pb_port': s.port} for s in self.servers],
+            node_max_in_flight=2, multiget_pool_size=8)
+
+    def tearDown(self):
+        self.client.close()
+        for server in self.servers:
+            server.close()
+
+    def test_multiget_spread_across_nodes(self):
+        keys = [('default', 'multi', str(i)) for i in range(24)]
+        results = self.client.multiget(keys)
+        self.assertEqual(24, len(results))
+        for server in self.servers:
+            self.assertLessEqual(server.most_active, 2)
+            self.assertGreater(server.gets, 0)
+        for node in self.client.nodes:
+            self.assertEqual(0, node.concurrency.in_flight)
+
+    def test_no_connection_held_while_waiting(self):
+        client = RiakClient(pb_port=self.servers[0].port,
+                            node_max_in_flight=1,
+                            transport_options={'max_size': 2})
+        bucket = client.bucket('multi')
+        self.servers[0].delay = 0.1
+        threads = [threading.Thread(target=bucket.get, args=(str(i),))
+                   for i in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        self.assertEqual(1, len(client._tcp_pool.resources))
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, self.servers[0].most_active)
+        client.close()
+
+    def test_app_errors_not_congestion(self):
+        client = RiakClient(pb_port=self.servers[0].port,
+                            node_max_in_flight=4, adaptive_concurrency=True)
+        limit = client.nodes[0].concurrency
+
+        def fail(transport):
+            raise RiakError('bad request')
+        with self.assertRaises(RiakError):
+            client._with_retries(client._tcp_pool, fail)
+        self.assertEqual(4, limit.limit)
+
+        def time_out(transport):
+            raise RiakError('timeout')
+        with self.assertRaises(RiakError):
+            client._with_retries(client._tcp_pool, time_out)
+        self.assertLess(limit.limit, 4)
+        self.assertEqual(0, limit.in_flight)
+        client.close()
+
+    def test_node_limits_kept(self):
+        client = RiakClient(nodes=[RiakNode(max_in_flight=5)],
+                            node_max_in_flight=2)
+        self.assertEqual(5, client.nodes[0].concurrency.max_limit)
+        client.close()
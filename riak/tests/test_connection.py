@@ -0,0 +1,150 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import riak.pb.messages
+
+from distutils.version import LooseVersion
+from riak import RiakClient
+from riak.codecs import Msg
+from riak.node import RiakNode
+from riak.transports.pool import ConnectionClosed
+from riak.transports.tcp import TcpTransport
+from riak.tests.test_pipeline import FakeSocket, frame, get_resp
+
+
+class TricklingSocket(FakeSocket):
+    """
+    Returns at most ``chunk`` bytes per receive and counts receives.
+    """
+    def __init__(self, replies, chunk=None):
+        super(TricklingSocket, self).__init__(replies)
+        self.chunk = chunk
+        self.recvs = 0
+
+    def recv_into(self, view, nbytes):
+        self.recvs += 1
+        if self.chunk:
+            nbytes = min(nbytes, self.chunk)
+        return super(TricklingSocket, self).recv_into(view, nbytes)
+
+
+class VectoredSocket(FakeSocket):
+    """
+    Accepts at most ``limit`` bytes per sendmsg call.
+    """
+    def __init__(self, replies, limit):
+        super(VectoredSocket, self).__init__(replies)
+        self.limit = limit
+        self.calls = []
+
+    def sendmsg(self, buffers):
+        self.calls.append(list(buffers))
+        data = b''.join(memoryview(b).tobytes()
+                        for b in buffers)[:self.limit]
+        self.sends.append(data)
+        return len(data)
+
+
+class RecvBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.client = RiakClient()
+        self.bucket = self.client.bucket('buffer')
+
+    def tearDown(self):
+        self.client.close()
+
+    def transport(self, sock, bufsize=None):
+        t = TcpTransport(node=RiakNode(), client=self.client)
+        t.server_version = LooseVersion('2.1.4')
+        t._socket = sock
+        if bufsize:
+            t._rbuf = bytearray(bufsize)
+        return t
+
+    def get(self, t, key):
+        return t.get(self.bucket.new(key)).encoded_data
+
+    def test_many_frames_per_receive(self):
+        replies = [get_resp(v) for v in (b'one', b'two', b'three')]
+        t = self.transport(TricklingSocket(replies))
+        self.assertEqual(b'one', self.get(t, 'a'))
+        self.assertEqual(b'two', self.get(t, 'b'))
+        self.assertEqual(b'three', self.get(t, 'c'))
+        self.assertEqual(1, t._socket.recvs)
+
+    def test_frame_larger_than_buffer(self):
+        value = b'x' * 1000
+        replies = [get_resp(b'small'), get_resp(value), get_resp(b'after')]
+        t = self.transport(TricklingSocket(replies), bufsize=256)
+        self.assertEqual(b'small', self.get(t, 'a'))
+        self.assertEqual(value, self.get(t, 'b'))
+        self.assertEqual(b'after', self.get(t, 'c'))
+
+    def test_partial_frames_compacted(self):
+        values = [str(i).encode() * 20 for i in range(10)]
+        replies = [get_resp(v) for v in values]
+        t = self.transport(TricklingSocket(replies, chunk=7), bufsize=64)
+        for i, value in enumerate(values):
+            self.assertEqual(value, self.get(t, str(i)))
+        self.assertEqual(64, len(t._rbuf))
+
+    def test_closed_mid_frame(self):
+        reply = frame(riak.pb.messages.MSG_CODE_PING_RESP)
+        t = self.transport(TricklingSocket([reply[:3]]))
+        with self.assertRaises(ConnectionClosed):
+            t.ping()
+
+
+class SendTests(unittest.TestCase):
+    def setUp(self):
+        self.client = RiakClient()
+        self.bucket = self.client.bucket('send')
+
+    def tearDown(self):
+        self.client.close()
+
+    def transport(self, sock):
+        t = TcpTransport(node=RiakNode(), client=self.client)
+        t.server_version = LooseVersion('2.1.4')
+        t._socket = sock
+        return t
+
+    def test_body_sent_without_copy(self):
+        data = b'x' * 100
+        t = self.transport(VectoredSocket([], limit=1000))
+        t._non_connect_send_msg(riak.pb.messages.MSG_CODE_PUT_REQ, data)
+        self.assertEqual(1, len(t._socket.calls))
+        self.assertIs(data, t._socket.calls[0][1])
+        self.assertEqual(t._encode_msg(riak.pb.messages.MSG_CODE_PUT_REQ,
+                                       data),
+                         t._socket.sends[0])
+
+    def test_partial_sends_resumed(self):
+        data = b'0123456789' * 10
+        t = self.transport(VectoredSocket([], limit=7))
+        t._non_connect_send_msgs(
+            [Msg(riak.pb.messages.MSG_CODE_PUT_REQ, data, None),
+             Msg(riak.pb.messages.MSG_CODE_PING_REQ, None, None)])
+        expected = t._encode_msg(riak.pb.messages.MSG_CODE_PUT_REQ, data) + \
+            t._encode_msg(riak.pb.messages.MSG_CODE_PING_REQ)
+        self.assertEqual(expected, b''.join(t._socket.sends))
+
+    def test_falls_back_to_sendall(self):
+        t = self.transport(FakeSocket([]))
+        t._non_connect_send_msg(riak.pb.messages.MSG_CODE_PUT_REQ, b'abc')
+        self.assertEqual(
+            [t._encode_msg(riak.pb.messages.MSG_CODE_PUT_REQ, b'abc')],
+            t._socket.sends)
@@ -15,6 +15,7 @@
 # -*- coding: utf-8 -*-
 import unittest
 
+from riak.node import RiakNode
 from riak.transports.feature_detect import FeatureDetection
 
 
@@ -30,6 +31,19 @@ class DummyTransport(FeatureDetection):
         return self._version
 
 
+class SharedTransport(DummyTransport):
+    _features_key = 'dummy'
+
+    def __init__(self, version, node):
+        super(SharedTransport, self).__init__(version)
+        self._node = node
+        self.detected = 0
+
+    def _server_version(self):
+        self.detected += 1
+        return self._version
+
+
 class FeatureDetectionTest(unittest.TestCase):
     def test_implements_server_version(self):
         t = IncompleteTransport()
@@ -208,6 +222,31 @@ class FeatureDetectionTest(unittest.TestCase):
         self.assertTrue(t.preflists())
         self.assertTrue(t.write_once())
 
+    def test_version_shared_through_node(self):
+        node = RiakNode()
+        first = SharedTransport("2.1.4", node)
+        second = SharedTransport("2.1.4", node)
+        self.assertTrue(first.write_once())
+        self.assertTrue(second.write_once())
+        self.assertEqual(1, first.detected)
+        self.assertEqual(0, second.detected)
+
+    def test_shared_version_expires(self):
+        node = RiakNode(feature_ttl=0)
+        first = SharedTransport("2.1.4", node)
+        second = SharedTransport("2.1.4", node)
+        first.server_version
+        second.server_version
+        self.assertEqual(1, second.detected)
+
+    def test_shared_version_invalidated(self):
+        node = RiakNode()
+        SharedTransport("2.0.0", node).server_version
+        node.invalidate_features()
+        t = SharedTransport("2.1.4", node)
+        self.assertTrue(t.write_once())
+        self.assertEqual(1, t.detected)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,217 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import struct
+import threading
+import time
+import unittest
+
+import riak.pb.messages
+
+from riak import RiakClient
+from riak.node import CircuitBreaker, RiakNode
+from riak.tests.test_aio import server_info_resp
+from riak.tests.test_pipeline import frame
+
+
+class PingServer(object):
+    """
+    Answers Protocol Buffers requests on a local port: server info
+    requests with a server info response and anything else with a
+    ping response.
+    """
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        accepter = threading.Thread(target=self.accept)
+        accepter.daemon = True
+        accepter.start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, addr = self.listener.accept()
+            except socket.error:
+                return
+            handler = threading.Thread(target=self.handle, args=(conn,))
+            handler.daemon = True
+            handler.start()
+
+    def handle(self, conn):
+        try:
+            while True:
+                header = conn.recv(5)
+                if len(header) < 5:
+                    return
+                length, msg_code = struct.unpack('!IB', header)
+                data = b''
+                while len(data) < length - 1:
+                    chunk = conn.recv(length - 1 - len(data))
+                    if not chunk:
+                        return
+                    data += chunk
+                conn.sendall(self.respond(msg_code, data))
+        finally:
+            conn.close()
+
+    def respond(self, msg_code, data):
+        return self.reply(msg_code)
+
+    def reply(self, msg_code):
+        if msg_code == riak.pb.messages.MSG_CODE_GET_SERVER_INFO_REQ:
+            return server_info_resp()
+        return frame(riak.pb.messages.MSG_CODE_PING_RESP)
+
+    def close(self):
+        self.listener.close()
+
+
+def closed_port():
+    """
+    Returns a local port that refuses connections.
+    """
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertFalse(breaker.available())
+
+    def test_half_open_lets_one_request_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.attempt())
+        self.assertFalse(breaker.available())
+        self.assertFalse(breaker.attempt())
+        breaker.record_success()
+        self.assertTrue(breaker.attempt())
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_half_open_failure_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.attempt()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+    def test_inconclusive_request_ends_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.attempt()
+        breaker.finished()
+        self.assertTrue(breaker.available())
+
+
+class NodeAvailabilityTests(unittest.TestCase):
+    def setUp(self):
+        self.server = PingServer()
+        self.nodes = [RiakNode(pb_port=self.server.port, failure_threshold=2),
+                      RiakNode(pb_port=closed_port(), failure_threshold=2)]
+        self.up, self.down = self.nodes
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_open_nodes_not_chosen(self):
+        client = RiakClient(nodes=self.nodes)
+        self.down.record_error()
+        self.down.record_error()
+        self.assertFalse(self.down.available())
+        for i in range(10):
+            self.assertIs(self.up, client._choose_node())
+        client.close()
+
+    def test_idle_connections_to_open_nodes_skipped(self):
+        client = RiakClient(nodes=self.nodes)
+        client._tcp_pool.add_resource(
+            client._tcp_pool.create_resource(self.down))
+        self.down.record_error()
+        self.down.record_error()
+        self.assertTrue(client.ping())
+        self.assertEqual(1, len(client._tcp_pool._idle[self.down]))
+        self.assertEqual(1, len(client._tcp_pool._idle[self.up]))
+        client.close()
+
+    def test_check_health(self):
+        client = RiakClient(nodes=self.nodes)
+        self.up.record_error()
+        self.up.record_error()
+        results = client.check_health()
+        self.assertEqual({self.up: True, self.down: False}, results)
+        self.assertTrue(self.up.available())
+        client.check_health()
+        self.assertFalse(self.down.available())
+        client.close()
+
+    def test_one_probe_admitted(self):
+        client = RiakClient(nodes=self.nodes, node_selection='least_loaded')
+        self.down.breaker.reset_timeout = 0
+        self.down.record_error()
+        self.down.record_error()
+        self.assertTrue(self.down.admit())
+        # As though each request saw the node before the probe began
+        self.down.available = lambda: True
+        sent = []
+        for i in range(20):
+            client._with_retries(client._tcp_pool,
+                                 lambda t: sent.append(t._node))
+        self.assertEqual([self.up] * 20, sent)
+        client.close()
+
+    def test_check_health_skips_full_pool(self):
+        client = RiakClient(nodes=self.nodes[:1],
+                            transport_options={'max_size': 1})
+        self.up.record_error()
+        self.up.record_error()
+        with client._transport():
+            started = time.time()
+            self.assertEqual({}, client.check_health())
+            self.assertLess(time.time() - started, 1)
+        self.assertFalse(self.up.available())
+        self.assertEqual({self.up: True}, client.check_health())
+        client.close()
+
+    def test_background_health_checks(self):
+        self.up.record_error()
+        self.up.record_error()
+        client = RiakClient(nodes=self.nodes[:1], health_check_interval=0.01)
+        for i in range(100):
+            if self.up.available():
+                break
+            time.sleep(0.01)
+        self.assertTrue(self.up.available())
+        stop = client._health_stop
+        client.close()
+        self.assertTrue(stop.is_set())
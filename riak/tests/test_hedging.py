@@ -0,0 +1,145 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+import riak.pb.messages
+
+from riak import RiakClient
+from riak.client.multi import shared_pool
+from riak.client.transport import _HedgePool
+from riak.node import RiakNode
+from riak.tests.test_health import PingServer
+from riak.tests.test_pipeline import get_resp
+
+
+class GetServer(PingServer):
+    """
+    Answers gets with ``value`` after ``delay`` seconds.
+    """
+    def __init__(self, value, delay=0):
+        self.value = value
+        self.delay = delay
+        self.gets = 0
+        super(GetServer, self).__init__()
+
+    def reply(self, msg_code):
+        if msg_code == riak.pb.messages.MSG_CODE_GET_REQ:
+            self.gets += 1
+            time.sleep(self.delay)
+            return get_resp(self.value)
+        return super(GetServer, self).reply(msg_code)
+
+
+class HedgedReadTests(unittest.TestCase):
+    def setUp(self):
+        self.slow = GetServer(b'slow', delay=0.3)
+        self.fast = GetServer(b'fast')
+        self.client = RiakClient(nodes=[{'pb_port': self.slow.port},
+                                        {'pb_port': self.fast.port}])
+        self.slow_node, self.fast_node = self.client.nodes
+        self.bucket = self.client.bucket('hedging')
+
+    def tearDown(self):
+        self.client.close()
+        self.slow.close()
+        self.fast.close()
+
+    def slow_first(self):
+        # Make the slow node look idle and the fast one loaded, so
+        # that the slow node is always tried first
+        self.client._node_selection = 'least_loaded'
+        self.fast_node.latency.add(1.0)
+        self.fast_node.in_flight = 1000
+
+    def test_hedge_answers_first(self):
+        self.slow_first()
+        started = time.time()
+        obj = self.bucket.get('a', hedge=0.01)
+        self.assertLess(time.time() - started, 0.2)
+        self.assertEqual(b'fast', obj.encoded_data)
+        self.assertIs(obj, obj.siblings[0]._robject)
+        self.assertEqual(1, self.slow.gets)
+        self.assertEqual(1, self.fast.gets)
+
+    def test_no_hedge_when_first_is_fast(self):
+        self.slow.delay = 0
+        self.slow_first()
+        obj = self.bucket.get('a', hedge=0.2)
+        self.assertEqual(b'slow', obj.encoded_data)
+        self.assertEqual(0, self.fast.gets)
+
+    def test_slower_reply_drained(self):
+        self.slow.delay = 0.1
+        self.slow_first()
+        obj = self.bucket.get('a', hedge=0.01)
+        time.sleep(0.3)
+        self.assertEqual(b'fast', obj.encoded_data)
+        pool = self.client._tcp_pool
+        self.assertEqual(2, pool._free)
+        self.assertEqual(1, len(pool._idle[self.slow_node]))
+
+    def test_requests_sent_by_shared_workers(self):
+        self.slow_first()
+        self.bucket.get('a', hedge=0.01)
+        threads = set(threading.enumerate())
+        for key in 'bcd':
+            self.bucket.get(key, hedge=0.01)
+        # Only the test servers start threads, to handle connections
+        self.assertEqual(set(), set(t for t in threading.enumerate()
+                                    if t.name.startswith('riak')) - threads)
+        self.assertEqual(4, self.fast.gets)
+
+    def test_not_hedged_while_workers_busy(self):
+        self.slow_first()
+        workers = shared_pool(_HedgePool)
+        with workers._busy_lock:
+            busy, workers._busy = workers._busy, workers._size
+        try:
+            obj = self.bucket.get('a', hedge=0.01)
+        finally:
+            with workers._busy_lock:
+                workers._busy -= workers._size - busy
+        self.assertEqual(b'slow', obj.encoded_data)
+        self.assertEqual(0, self.fast.gets)
+
+    def test_delay_from_latency_percentile(self):
+        self.slow_first()
+        self.client.get(self.bucket.new('a'), hedge=True)
+        self.assertEqual(0, self.fast.gets)
+        for i in range(20):
+            self.slow_node.request_started()
+            self.slow_node.request_finished(0.01)
+        self.client.get(self.bucket.new('a'), hedge=True)
+        self.assertEqual(1, self.fast.gets)
+
+    def test_multiget(self):
+        self.slow_first()
+        keys = [('default', 'hedging', k) for k in 'abc']
+        results = self.client.multiget(keys, hedge=0.01)
+        self.assertEqual([b'fast'] * 3, [o.encoded_data for o in results])
+        self.assertEqual(3, self.fast.gets)
+
+
+class LatencyPercentileTests(unittest.TestCase):
+    def test_percentile(self):
+        node = RiakNode()
+        self.assertIsNone(node.latency_percentile(95))
+        for i in range(1, 101):
+            node.request_started()
+            node.request_finished(i / 100.0)
+        self.assertAlmostEqual(0.95, node.latency_percentile(95), places=2)
+        self.assertIsNone(node.latency_percentile(95, min_samples=101))
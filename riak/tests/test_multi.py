@@ -0,0 +1,347 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+import unittest
+
+import riak.pb.messages
+import riak.pb.riak_dt_pb2
+import riak.pb.riak_kv_pb2
+
+from riak import RiakClient
+from riak.client.multi import MultiGetPool, MultiPutPool, Task, \
+    _owner_batches, shared_pool
+from riak.datatypes import Counter
+from riak.tests.test_health import PingServer
+from riak.tests.test_pipeline import error_resp, frame, get_resp
+
+
+class KeyServer(PingServer):
+    """
+    Answers each get with the requested key as the value, after
+    ``delay`` seconds, tracking the most gets answered at once.
+    """
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.gets = 0
+        self.fetched = []
+        self.active = 0
+        self.most_active = 0
+        self.deleted = []
+        self.updated = []
+        self.lock = threading.Lock()
+        super(KeyServer, self).__init__()
+
+    def respond(self, msg_code, data):
+        if msg_code == riak.pb.messages.MSG_CODE_GET_REQ:
+            req = riak.pb.riak_kv_pb2.RpbGetReq()
+            req.ParseFromString(data)
+            with self.lock:
+                self.gets += 1
+                self.fetched.append(req.key)
+                self.active += 1
+                self.most_active = max(self.most_active, self.active)
+            time.sleep(self.delay)
+            with self.lock:
+                self.active -= 1
+            return get_resp(req.key)
+        elif msg_code == riak.pb.messages.MSG_CODE_DEL_REQ:
+            req = riak.pb.riak_kv_pb2.RpbDelReq()
+            req.ParseFromString(data)
+            if req.key == b'bad':
+                return error_resp(b'delete failed')
+            with self.lock:
+                self.deleted.append(req.key)
+            return frame(riak.pb.messages.MSG_CODE_DEL_RESP)
+        elif msg_code == riak.pb.messages.MSG_CODE_DT_UPDATE_REQ:
+            req = riak.pb.riak_dt_pb2.DtUpdateReq()
+            req.ParseFromString(data)
+            with self.lock:
+                self.updated.append(req.key)
+            return frame(riak.pb.messages.MSG_CODE_DT_UPDATE_RESP)
+        return self.reply(msg_code)
+
+
+class DummyQueue(object):
+    def __init__(self, results):
+        self.results = results
+
+    def put(self, result):
+        self.results.append(result)
+
+
+class MultigetIterTests(unittest.TestCase):
+    def setUp(self):
+        self.server = KeyServer()
+        self.client = RiakClient(pb_port=self.server.port)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def keys(self, count):
+        self.pulled = 0
+        for i in range(count):
+            self.pulled += 1
+            yield ('default', 'multi', str(i))
+
+    def test_results_paired_with_keys(self):
+        results = dict(self.client.multiget_iter(self.keys(20)))
+        self.assertEqual(20, len(results))
+        for (bucket_type, bucket, key), obj in results.items():
+            self.assertEqual(key.encode(), obj.encoded_data)
+            self.assertEqual(key, obj.key)
+
+    def test_keys_consumed_lazily(self):
+        results = self.client.multiget_iter(self.keys(50), max_in_flight=5)
+        next(results)
+        self.assertLessEqual(self.pulled, 5)
+        self.assertEqual(49, len(list(results)))
+        self.assertEqual(50, self.server.gets)
+
+    def test_early_close(self):
+        results = self.client.multiget_iter(self.keys(50), max_in_flight=5)
+        next(results)
+        results.close()
+        self.assertLessEqual(self.server.gets, 5)
+
+    def test_pipelined(self):
+        client = RiakClient(pb_port=self.server.port,
+                            transport_options={'pipeline_depth': 4})
+        results = client.multiget_iter(self.keys(30), max_in_flight=10)
+        for (bucket_type, bucket, key), obj in results:
+            self.assertEqual(key.encode(), obj.encoded_data)
+        self.assertEqual(30, self.server.gets)
+        client.close()
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            list(self.client.multiget_iter(self.keys(1), max_in_flight=0))
+
+
+class MultiPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.server = KeyServer()
+        self.client = RiakClient(pb_port=self.server.port)
+        self.keys = [('default', 'multi', str(i)) for i in range(8)]
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_shared_pool_reused(self):
+        pool = shared_pool(MultiGetPool)
+        workers = list(pool._workers)
+        self.client.multiget(self.keys)
+        self.client.multiget(self.keys)
+        self.assertIs(pool, shared_pool(MultiGetPool))
+        self.assertEqual(workers, pool._workers)
+        self.assertTrue(all(w.is_alive() and w.daemon for w in workers))
+
+    def test_stopped_shared_pool_replaced(self):
+        pool = shared_pool(MultiGetPool)
+        pool.stop()
+        self.assertIsNot(pool, shared_pool(MultiGetPool))
+        self.assertEqual(8, len(self.client.multiget(self.keys)))
+
+    def test_stop_is_prompt(self):
+        pool = MultiGetPool(size=4)
+        pool.start()
+        started = time.time()
+        pool.stop()
+        self.assertLess(time.time() - started, 0.1)
+        self.assertFalse(any(w.is_alive() for w in pool._workers))
+
+    def test_stop_drains_queue(self):
+        pool = MultiGetPool(size=2)
+        self.server.delay = 0.01
+        results = []
+        for bucket_type, bucket, key in self.keys:
+            pool.enq(Task(self.client, DummyQueue(results), bucket_type,
+                          bucket, key, None, {}))
+        pool.start()
+        pool.stop()
+        self.assertEqual(8, len(results))
+
+    def test_concurrency_limit(self):
+        self.server.delay = 0.02
+        results = self.client.multiget(self.keys, concurrency=2)
+        self.assertEqual(8, len(results))
+        self.assertLessEqual(self.server.most_active, 2)
+
+    def test_failed_batches_reported(self):
+        client = RiakClient(pb_port=self.server.port,
+                            transport_options={'pipeline_depth': 4})
+
+        def pipeline(nodes=None):
+            raise RuntimeError('no pipeline')
+        client.pipeline = pipeline
+        pool = MultiGetPool(size=1)
+        results = client.multiget(self.keys, pool=pool)
+        self.assertEqual(self.keys, [r[:3] for r in results])
+        self.assertTrue(all(isinstance(r[3], RuntimeError)
+                            for r in results))
+        self.assertTrue(pool._workers[0].is_alive())
+        pool.stop()
+        pool = MultiPutPool(size=1)
+        bucket = client.bucket('multi')
+        results = client.multiput([bucket.new('a', data=1)], pool=pool)
+        self.assertIsInstance(results[0][1], RuntimeError)
+        results = client.multidelete(self.keys[:2], pool=pool)
+        self.assertEqual(self.keys[:2], [r[:3] for r in results])
+        pool.stop()
+        client.close()
+
+    def test_worker_survives_failed_task(self):
+        pool = MultiGetPool(size=1)
+        results = []
+        pool.enq(None)
+        pool.enq(Task(self.client, DummyQueue(results), 'default', 'multi',
+                      '1', None, {}))
+        logging.disable(logging.ERROR)
+        try:
+            pool.start()
+            pool.stop()
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual(1, len(results))
+
+
+class BulkWriteTests(unittest.TestCase):
+    def setUp(self):
+        self.server = KeyServer()
+        self.client = RiakClient(pb_port=self.server.port)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def keys(self, count):
+        for i in range(count):
+            yield ('default', 'multi', str(i))
+
+    def test_multidelete(self):
+        keys = list(self.keys(10)) + [('default', 'multi', 'bad')]
+        results = self.client.multidelete(iter(keys), concurrency=3)
+        self.assertEqual(10, results.count(True))
+        errors = [r for r in results if r is not True]
+        self.assertEqual(('default', 'multi', 'bad'), errors[0][:3])
+        self.assertEqual(10, len(self.server.deleted))
+
+    def test_multidelete_objects(self):
+        bucket = self.client.bucket('multi')
+        results = self.client.multidelete([bucket.new('a'), bucket.new('b')])
+        self.assertEqual([True, True], results)
+        self.assertEqual(set([b'a', b'b']), set(self.server.deleted))
+
+    def test_multidelete_pipelined(self):
+        client = RiakClient(pb_port=self.server.port,
+                            transport_options={'pipeline_depth': 4})
+        keys = list(self.keys(10))
+        keys.insert(5, ('default', 'multi', 'bad'))
+        results = client.multidelete(keys)
+        self.assertEqual(10, results.count(True))
+        self.assertEqual(1, len([r for r in results if r is not True]))
+        self.assertEqual(10, len(self.server.deleted))
+        client.close()
+
+    def test_multi_update_datatype(self):
+        bucket = self.client.bucket_type('counters').bucket('multi')
+        counters = []
+        for i in range(5):
+            counter = Counter(bucket, str(i))
+            counter.increment(i + 1)
+            counters.append(counter)
+        results = self.client.multi_update_datatype(counters, concurrency=2)
+        self.assertEqual([True] * 5, results)
+        self.assertEqual(5, len(self.server.updated))
+
+
+class OwnerGroupingTests(unittest.TestCase):
+    def setUp(self):
+        self.servers = [KeyServer(), KeyServer()]
+        nodes = [{'pb_port': s.port, 'name': 'riak@n{0}'.format(i)}
+                 for i, s in enumerate(self.servers)]
+        self.client = RiakClient(nodes=nodes, token_aware=True,
+                                 transport_options={'pipeline_depth': 4})
+        self.client.get_preflist = self.get_preflist
+        self.lookups = 0
+
+    def tearDown(self):
+        self.client.close()
+        for server in self.servers:
+            server.close()
+
+    def get_preflist(self, bucket, key):
+        # Even keys are owned by the first node, odd keys by the second
+        self.lookups += 1
+        return [{'partition': 0, 'primary': True,
+                 'node': 'riak@n{0}'.format(int(key) % 2)}]
+
+    def keys(self, count):
+        return [('default', 'multi', str(i)) for i in range(count)]
+
+    def test_batches_share_owner(self):
+        batches = list(_owner_batches(self.client, self.keys(10), 4))
+        self.assertEqual([4, 4, 1, 1], [len(b) for b in batches])
+        for batch in batches:
+            self.assertEqual(1, len(set(int(k) % 2 for _, _, k in batch)))
+        # The nodes' batches alternate
+        self.assertEqual(['0', '1', '8', '9'], [b[0][2] for b in batches])
+
+    def test_owners_looked_up_on_pool(self):
+        pool = MultiGetPool(size=2)
+        pool.start()
+        self.addCleanup(pool.stop)
+        threads = set()
+
+        def get_preflist(bucket, key):
+            threads.add(threading.current_thread())
+            return self.get_preflist(bucket, key)
+        self.client.get_preflist = get_preflist
+        batches = _owner_batches(self.client, iter(self.keys(10)), 4, pool)
+        self.assertEqual(['0', '1', '8', '9'], [b[0][2] for b in batches])
+        self.assertTrue(threads)
+        self.assertTrue(threads <= set(pool._workers))
+        self.assertEqual(10, self.lookups)
+        # Cached owners are not handed to the workers
+        threads.clear()
+        self.assertEqual(4, len(list(_owner_batches(
+            self.client, self.keys(10), 4, pool))))
+        self.assertEqual(set(), threads)
+
+    def test_multiget_sent_to_owners(self):
+        results = self.client.multiget(self.keys(20))
+        self.assertEqual(20, len(results))
+        for i, server in enumerate(self.servers):
+            self.assertEqual(10, len(server.fetched))
+            self.assertTrue(all(int(k) % 2 == i for k in server.fetched))
+        self.client.multiget(self.keys(20))
+        self.assertEqual(20, self.lookups)
+
+    def test_owner_lookup_errors_ignored(self):
+        def key_owners(bucket, key):
+            raise RuntimeError('lookup failed')
+        self.client._key_owners = key_owners
+        results = self.client.multiget(self.keys(10))
+        self.assertEqual(10, len(results))
+        self.assertEqual(10, sum(s.gets for s in self.servers))
+
+    def test_unknown_owners_sent_anywhere(self):
+        self.client.get_preflist = lambda bucket, key: []
+        results = self.client.multiget(self.keys(10))
+        self.assertEqual(10, len(results))
+        self.assertEqual(10, sum(s.gets for s in self.servers))
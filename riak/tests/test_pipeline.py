@@ -0,0 +1,158 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+import unittest
+
+import riak.pb.messages
+import riak.pb.riak_pb2
+import riak.pb.riak_kv_pb2
+
+from distutils.version import LooseVersion
+from riak import RiakClient, RiakError
+from riak.node import RiakNode
+from riak.transports.pool import BadResource, ConnectionClosed
+from riak.transports.tcp import TcpTransport
+
+
+def frame(msg_code, msg=None):
+    data = b'' if msg is None else msg.SerializeToString()
+    return struct.pack('!iB', 1 + len(data), msg_code) + data
+
+
+def get_resp(value):
+    resp = riak.pb.riak_kv_pb2.RpbGetResp()
+    resp.vclock = b'vclock'
+    content = resp.content.add()
+    content.value = value
+    content.content_type = b'text/plain'
+    return frame(riak.pb.messages.MSG_CODE_GET_RESP, resp)
+
+
+def error_resp(errmsg):
+    resp = riak.pb.riak_pb2.RpbErrorResp()
+    resp.errmsg = errmsg
+    resp.errcode = 0
+    return frame(riak.pb.messages.MSG_CODE_ERROR_RESP, resp)
+
+
+class FakeSocket(object):
+    """
+    Records what is sent and replays canned bytes on receive.
+    """
+    def __init__(self, replies):
+        self.sends = []
+        self._buf = b''.join(replies)
+        self._pos = 0
+
+    def sendall(self, data):
+        self.sends.append(bytes(data))
+
+    def recv_into(self, view, nbytes):
+        chunk = self._buf[self._pos:self._pos + nbytes]
+        view[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+class PipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.client = RiakClient()
+        self.bucket = self.client.bucket('pipeline')
+
+    def tearDown(self):
+        self.client.close()
+
+    def transport(self, replies, **options):
+        t = TcpTransport(node=RiakNode(), client=self.client, **options)
+        t.server_version = LooseVersion('2.1.4')
+        t._socket = FakeSocket(replies)
+        return t
+
+    def test_replies_matched_in_order(self):
+        t = self.transport([get_resp(b'one'), get_resp(b'two')])
+        requests = [('get', self.bucket.new(k), {}) for k in ('a', 'b')]
+        results = t.pipeline(requests)
+        self.assertEqual(1, len(t._socket.sends))
+        self.assertEqual([b'one', b'two'],
+                         [r.encoded_data for r in results])
+        self.assertEqual(['a', 'b'], [r.key for r in results])
+
+    def test_riak_errors_returned_in_place(self):
+        t = self.transport([get_resp(b'one'), error_resp(b'overload')])
+        requests = [('get', self.bucket.new(k), {}) for k in ('a', 'b')]
+        results = t.pipeline(requests)
+        self.assertEqual(b'one', results[0].encoded_data)
+        self.assertIsInstance(results[1], RiakError)
+
+    def test_windows_limited_by_depth(self):
+        replies = [get_resp(b'x') for _ in range(5)]
+        t = self.transport(replies, pipeline_depth=2)
+        requests = [('get', self.bucket.new(str(k)), {}) for k in range(5)]
+        results = t.pipeline(requests)
+        self.assertEqual(5, len(results))
+        self.assertEqual(3, len(t._socket.sends))
+
+    def test_windows_limited_by_bytes(self):
+        replies = [get_resp(b'x') for _ in range(3)]
+        t = self.transport(replies, pipeline_max_bytes=1)
+        requests = [('get', self.bucket.new(str(k)), {}) for k in range(3)]
+        t.pipeline(requests)
+        self.assertEqual(3, len(t._socket.sends))
+
+    def test_out_of_step_reply_is_bad_resource(self):
+        t = self.transport([frame(riak.pb.messages.MSG_CODE_PING_RESP)])
+        with self.assertRaises(BadResource):
+            t.pipeline([('get', self.bucket.new('a'), {})])
+
+    def test_results_kept_when_connection_fails(self):
+        t = self.transport([get_resp(b'one')])
+        requests = [('get', self.bucket.new(k), {}) for k in ('a', 'b')]
+        results = []
+        with self.assertRaises(Exception):
+            t.pipeline(requests, results)
+        self.assertEqual([b'one'], [r.encoded_data for r in results])
+
+    def test_only_unanswered_requests_retried(self):
+        sent = []
+
+        class FlakyTransport(object):
+            def pipeline(self, requests, results):
+                sent.append([robj.key for _, robj, _ in requests])
+                for op, robj, options in requests:
+                    if len(sent) == 1 and robj.key == 'c':
+                        raise ConnectionClosed('lost connection')
+                    results.append(True)
+                return results
+
+        def with_retries(pool, fn, nodes=None):
+            try:
+                return fn(FlakyTransport())
+            except ConnectionClosed:
+                return fn(FlakyTransport())
+        self.client._with_retries = with_retries
+
+        p = self.client.pipeline()
+        for key in 'abcd':
+            p.put(self.bucket.new(key, data=key))
+        self.assertEqual([True] * 4, p.execute())
+        self.assertEqual([['a', 'b', 'c', 'd'], ['c', 'd']], sent)
+
+    def test_pipeline_validates_requests(self):
+        p = self.client.pipeline()
+        with self.assertRaises(TypeError):
+            p.get(self.bucket, 1)
+        with self.assertRaises(ValueError):
+            p.get(self.bucket, 'a', timeout=-1)
+        self.assertEqual(0, len(p))
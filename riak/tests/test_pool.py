@@ -20,10 +20,11 @@ from threading import Thread, currentThread
 from random import SystemRandom
 from time import sleep
 
-from riak import RiakError
+from riak import RiakClient, RiakError, PoolExhausted
 from riak.tests import RUN_POOL
 from riak.tests.comparison import Comparison
 from riak.transports.pool import Pool, BadResource
+from riak.transports.tcp import TcpPool
 
 if PY2:
     from Queue import Queue
@@ -32,9 +33,9 @@ else:
 
 
 class SimplePool(Pool):
-    def __init__(self):
+    def __init__(self, **options):
         self.count = 0
-        Pool.__init__(self)
+        Pool.__init__(self, **options)
 
     def create_resource(self):
         self.count += 1
@@ -49,6 +50,14 @@ class EmptyListPool(Pool):
         return []
 
 
+class ParityPool(SimplePool):
+    """
+    Keeps odd and even resources apart, like a pool keyed by node.
+    """
+    def resource_key(self, resource):
+        return resource[0] % 2
+
+
 @unittest.skipUnless(RUN_POOL, 'RUN_POOL is 0')
 class PoolTest(unittest.TestCase, Comparison):
 
@@ -153,6 +162,231 @@ class PoolTest(unittest.TestCase, Comparison):
         with pool.transaction(_filter=filtereven) as f:
             self.assertEqual([2], f)
 
+    def test_filter_by_key(self):
+        """
+        A filter that selects by resource key should skip whole groups
+        of idle resources.
+        """
+        def filterodd(numlist):
+            return numlist[0] % 2 == 1
+
+        pool = ParityPool()
+        with pool.transaction():
+            with pool.transaction():
+                with pool.transaction():
+                    pass
+
+        self.assertEqual(3, pool._free)
+        with pool.transaction(_filter=filterodd) as f:
+            self.assertEqual([1], f)
+            with pool.transaction(_filter=filterodd) as g:
+                self.assertEqual([3], g)
+                with pool.transaction(_filter=filterodd) as h:
+                    self.assertEqual([4], h)
+        self.assertEqual(4, pool._free)
+
+    def test_filter_rejects_whole_key(self):
+        """
+        A filter rejecting the top of a keyed stack should not be
+        tried on the rest of that stack.
+        """
+        pool = ParityPool()
+        resources = [pool.acquire() for i in range(6)]
+        for r in resources:
+            pool.release(r)
+        calls = []
+
+        def filterodd(numlist):
+            calls.append(numlist[0])
+            return numlist[0] % 2 == 1
+
+        with pool.transaction(_filter=filterodd) as f:
+            self.assertEqual(1, f[0] % 2)
+        self.assertLessEqual(len(calls), 2)
+
+    def test_acquire_by_key(self):
+        """
+        Claiming by key should only take idle resources with that key,
+        and should pass the key to create_resource otherwise.
+        """
+        class KeyedPool(ParityPool):
+            def create_resource(self, key=None):
+                self.count += 1
+                if key is not None and self.count % 2 != key:
+                    self.count += 1
+                return [self.count]
+
+        pool = KeyedPool()
+        with pool.transaction():
+            pass
+        self.assertEqual(1, pool._free)
+        with pool.transaction(key=0) as a:
+            self.assertEqual([2], a)
+        with pool.transaction(key=1) as b:
+            self.assertEqual([1], b)
+        self.assertEqual(2, pool._free)
+
+    def test_release_is_idempotent(self):
+        """
+        Releasing a resource twice should not make it available to two
+        claimants.
+        """
+        pool = SimplePool()
+        a = pool.acquire()
+        pool.release(a)
+        pool.release(a)
+        self.assertEqual(1, pool._free)
+        b = pool.acquire()
+        c = pool.acquire()
+        self.assertIsNot(b, c)
+
+    def test_clear_idle_pool(self):
+        """
+        Clearing a pool whose resources are all free should destroy
+        every one of them.
+        """
+        pool = SimplePool()
+        resources = [pool.acquire() for i in range(5)]
+        for r in resources:
+            pool.release(r)
+        pool.clear()
+        self.assertEqual(0, len(pool.resources))
+        self.assertEqual(0, pool._free)
+        for r in resources:
+            self.assertEqual([], r.object)
+
+    def test_max_size_waits_for_release(self):
+        """
+        A full pool should hand out a released resource rather than
+        create another.
+        """
+        pool = SimplePool(max_size=1, acquire_timeout=5)
+        a = pool.acquire()
+
+        def _release():
+            sleep(0.05)
+            pool.release(a)
+
+        th = Thread(target=_release)
+        th.start()
+        b = pool.acquire()
+        th.join()
+        self.assertIs(a, b)
+        self.assertEqual(1, len(pool.resources))
+
+    def test_max_size_raises_pool_exhausted(self):
+        """
+        A full pool should raise PoolExhausted once acquire_timeout
+        has passed.
+        """
+        pool = SimplePool(max_size=1, acquire_timeout=0.01)
+        with pool.transaction():
+            with self.assertRaises(PoolExhausted):
+                with pool.transaction():
+                    pass
+        self.assertEqual(1, len(pool.resources))
+
+    def test_full_pool_replaces_filtered_resource(self):
+        """
+        A full pool should replace an idle resource that the filter
+        rejects.
+        """
+        pool = ParityPool(max_size=1, acquire_timeout=0)
+        with pool.transaction() as a:
+            self.assertEqual([1], a)
+        with pool.transaction(_filter=lambda r: r[0] % 2 == 0) as b:
+            self.assertEqual([2], b)
+        self.assertEqual([], a)
+        self.assertEqual(1, len(pool.resources))
+
+    def test_destroyed_without_lock(self):
+        """
+        Resources evicted or expired while claiming or releasing
+        should be destroyed after the pool lock is released.
+        """
+        locked = []
+
+        class CheckedPool(ParityPool):
+            def destroy_resource(self, resource):
+                locked.append(self.lock._is_owned())
+                ParityPool.destroy_resource(self, resource)
+
+        pool = CheckedPool(max_size=1, acquire_timeout=0,
+                           max_lifetime=3600)
+        with pool.transaction():
+            pass
+        # Evicted to make room for a resource the filter accepts
+        with pool.transaction(_filter=lambda r: r[0] % 2 == 0):
+            pass
+        # Expired when released, then when claimed
+        a = pool.acquire()
+        a.created_at -= 7200
+        pool.release(a)
+        with pool.transaction():
+            pass
+        next(iter(pool._idle.values()))[0].created_at -= 7200
+        with pool.transaction():
+            pass
+        self.assertEqual([False] * 3, locked)
+        pool.close()
+
+    def test_reap_idle_resources(self):
+        """
+        Reaping should destroy resources idle longer than
+        max_idle_time, keeping min_idle of them.
+        """
+        pool = SimplePool(max_idle_time=3600, min_idle=1)
+        resources = [pool.acquire() for i in range(3)]
+        for r in resources:
+            pool.release(r)
+        resources[0].released_at -= 7200
+        resources[1].released_at -= 7200
+        resources[2].released_at -= 7200
+        pool.reap()
+        self.assertEqual(1, len(pool.resources))
+        self.assertEqual(1, pool._free)
+        pool.close()
+
+    def test_max_lifetime(self):
+        """
+        Resources older than max_lifetime should be destroyed when
+        released instead of being reused.
+        """
+        pool = SimplePool(max_lifetime=3600)
+        a = pool.acquire()
+        a.created_at -= 7200
+        pool.release(a)
+        self.assertEqual(0, len(pool.resources))
+        self.assertEqual([], a.object)
+        with pool.transaction() as b:
+            self.assertEqual([2], b)
+        pool.close()
+
+    def test_tcp_pool_options(self):
+        """
+        The TCP pool should take the pool options out of the transport
+        options.
+        """
+        client = RiakClient()
+        pool = TcpPool(client, max_size=5, acquire_timeout=1, timeout=2)
+        self.assertEqual(5, pool.max_size)
+        self.assertEqual(1, pool.acquire_timeout)
+        self.assertEqual({'timeout': 2}, pool._options)
+        client.close()
+
+    def test_add_resource(self):
+        """
+        Added resources should be handed out before new ones are
+        created, up to max_size.
+        """
+        pool = SimplePool(max_size=2)
+        self.assertTrue(pool.add_resource(['added']))
+        self.assertTrue(pool.add_resource(['added']))
+        self.assertFalse(pool.add_resource(['added']))
+        with pool.transaction() as a:
+            self.assertEqual(['added'], a)
+        self.assertEqual(0, pool.count)
+
     def test_requires_filter_to_be_callable(self):
         """
         The _filter parameter should be required to be a callable, or
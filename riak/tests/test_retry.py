@@ -0,0 +1,134 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from riak import RiakClient
+from riak.client.retry import RetryPolicy, RetryTokenBucket
+from riak.client.transport import retryable
+from riak.transports.pool import ConnectionClosed
+
+
+class FlakyClient(RiakClient):
+    @retryable
+    def flaky(self, transport, robj, attempts, failures=0):
+        attempts.append(time.time())
+        if len(attempts) <= failures:
+            raise ConnectionClosed('down')
+        return len(attempts)
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def test_full_jitter_backoff(self):
+        policy = RetryPolicy(backoff=0.1, max_backoff=0.3)
+        for i in range(50):
+            self.assertTrue(0 <= policy.delay(1) <= 0.1)
+            self.assertTrue(0 <= policy.delay(10) <= 0.3)
+        self.assertEqual(0, RetryPolicy().delay(3))
+
+    def test_invalid_attempts(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(attempts=0)
+
+    def test_deadline(self):
+        policy = RetryPolicy(deadline=1)
+        self.assertEqual(0, policy.retry_delay(1, time.time()))
+        self.assertIsNone(policy.retry_delay(1, time.time() - 2))
+
+    def test_token_bucket(self):
+        bucket = RetryTokenBucket(capacity=10, retry_cost=5,
+                                  success_refund=5)
+        policy = RetryPolicy(token_bucket=bucket)
+        self.assertEqual(0, policy.retry_delay(1, time.time()))
+        self.assertEqual(0, policy.retry_delay(1, time.time()))
+        self.assertIsNone(policy.retry_delay(1, time.time()))
+        policy.succeeded(1)
+        self.assertEqual(0, bucket.tokens)
+        policy.succeeded(0)
+        policy.succeeded(0)
+        policy.succeeded(0)
+        self.assertEqual(10, bucket.tokens)
+
+
+class RetryTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FlakyClient(nodes=[{'host': '10.0.0.1'},
+                                         {'host': '10.0.0.2'},
+                                         {'host': '10.0.0.3'}])
+        self.bucket = self.client.bucket('retry')
+        self.robj = self.bucket.new('a')
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_default_policy_uses_retries(self):
+        attempts = []
+        with self.client.retry_count(2):
+            with self.assertRaises(ConnectionClosed):
+                self.client.flaky(self.robj, attempts, failures=10)
+        self.assertEqual(3, len(attempts))
+
+    def test_attempts(self):
+        self.client.retry_policy = RetryPolicy(attempts=2)
+        attempts = []
+        with self.assertRaises(ConnectionClosed):
+            self.client.flaky(self.robj, attempts, failures=10)
+        self.assertEqual(2, len(attempts))
+        self.assertEqual(2, self.client.flaky(self.robj, [], failures=1))
+
+    def test_backoff(self):
+        policy = RetryPolicy(attempts=3, backoff=0.05, max_backoff=0.05)
+        attempts = []
+        started = time.time()
+        self.client.flaky(self.robj, attempts, failures=2,
+                          retry_policy=policy)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual(3, len(attempts))
+
+    def test_deadline_stops_retries(self):
+        policy = RetryPolicy(attempts=10, backoff=1, max_backoff=1,
+                             deadline=0.01)
+        attempts = []
+        started = time.time()
+        with self.assertRaises(ConnectionClosed):
+            self.client.flaky(self.robj, attempts, failures=10,
+                              retry_policy=policy)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertLess(len(attempts), 10)
+
+    def test_token_bucket_shared(self):
+        bucket = RetryTokenBucket(capacity=5, retry_cost=5)
+        self.client.retry_policy = RetryPolicy(attempts=3,
+                                               token_bucket=bucket)
+        attempts = []
+        with self.assertRaises(ConnectionClosed):
+            self.client.flaky(self.robj, attempts, failures=10)
+        self.assertEqual(2, len(attempts))
+        attempts = []
+        with self.assertRaises(ConnectionClosed):
+            self.client.flaky(self.robj, attempts, failures=10)
+        self.assertEqual(1, len(attempts))
+
+    def test_bucket_policy(self):
+        self.assertIs(self.client.retry_policy, self.bucket.retry_policy)
+        self.bucket.retry_policy = RetryPolicy(attempts=1)
+        attempts = []
+        with self.assertRaises(ConnectionClosed):
+            self.client.flaky(self.robj, attempts, failures=10)
+        self.assertEqual(1, len(attempts))
+        attempts = []
+        self.client.flaky(self.robj, attempts, failures=2,
+                          retry_policy=RetryPolicy(attempts=3))
+        self.assertEqual(3, len(attempts))
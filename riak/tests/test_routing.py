@@ -0,0 +1,262 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from riak import RiakClient
+from riak.client.multi import shared_pool
+from riak.client.routing import PreflistCache, _partition, _ring_position
+from riak.client.transport import _PreflistPool, retryableRouted
+from riak.node import MovingAverage, RiakNode
+from riak.transports.pool import ConnectionClosed
+
+
+class RoutedClient(RiakClient):
+    @retryableRouted
+    def node_for(self, transport, robj, fail=()):
+        if transport._node in fail:
+            raise ConnectionClosed('down')
+        return transport._node
+
+
+def preflist_item(host, primary=True, partition=0):
+    return {'partition': partition, 'node': 'riak@' + host,
+            'primary': primary}
+
+
+def wait_for_lookups():
+    workers = shared_pool(_PreflistPool)
+    while workers._busy:
+        time.sleep(0.001)
+
+
+def ring_preflist(bucket, key, size=64, n_val=3):
+    """
+    The preflist of a key in a ring of ``size`` partitions owned by
+    four hosts in turn.
+    """
+    first = _partition(_ring_position(bucket, key), size, 1)
+    partitions = [(first + i) % size for i in range(n_val)]
+    return [preflist_item('10.0.0.{0}'.format(p % 4 + 1), partition=p)
+            for p in partitions]
+
+
+class PreflistCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.client = RiakClient()
+        self.bucket = self.client.bucket('routing')
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_entries_expire(self):
+        cache = PreflistCache(ttl=0.05)
+        cache.set(self.bucket, 'a', ['owner'])
+        self.assertEqual(['owner'], cache.get(self.bucket, 'a'))
+        time.sleep(0.06)
+        self.assertIsNone(cache.get(self.bucket, 'a'))
+
+    def test_least_recently_used_evicted(self):
+        cache = PreflistCache(size=2)
+        cache.set(self.bucket, 'a', ['a'])
+        cache.set(self.bucket, 'b', ['b'])
+        cache.get(self.bucket, 'a')
+        cache.set(self.bucket, 'c', ['c'])
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(self.bucket, 'b'))
+        self.assertEqual(['a'], cache.get(self.bucket, 'a'))
+
+    def test_keyed_by_bucket_type(self):
+        cache = PreflistCache()
+        typed = self.client.bucket_type('maps').bucket('routing')
+        cache.set(self.bucket, 'a', ['default'])
+        self.assertIsNone(cache.get(typed, 'a'))
+
+    def test_ring_learned_from_preflists(self):
+        nodes = [RiakNode(host='10.0.0.{0}'.format(i))
+                 for i in (1, 2, 3, 4)]
+        cache = PreflistCache()
+        keys = ['key{0}'.format(i) for i in range(200)]
+        for key in keys[:100]:
+            preflist = ring_preflist(self.bucket, key)
+            owners = cache.add(self.bucket, key, preflist, nodes)
+            self.assertEqual(3, len(owners))
+        self.assertEqual([(64, 1)], cache._layouts)
+        known = 0
+        for key in keys[100:]:
+            owners = cache.get(self.bucket, key)
+            if owners is not None:
+                known += 1
+                names = [item['node']
+                         for item in ring_preflist(self.bucket, key)]
+                self.assertEqual(names, ['riak@' + node.host
+                                         for node in owners])
+        self.assertGreater(known, 50)
+        # The length of preflists is learned per bucket
+        self.assertIsNone(cache.get(self.client.bucket('other'), 'key0'))
+
+    def test_ring_unused_for_other_hashing(self):
+        nodes = [RiakNode(host='10.0.0.1')]
+        cache = PreflistCache()
+        for i in range(20):
+            # As if the bucket hashed keys with its own chash_keyfun
+            cache.add(self.bucket, 'key{0}'.format(i),
+                      [preflist_item('10.0.0.1', partition=i % 7)], nodes)
+        self.assertEqual([], cache._layouts)
+        self.assertIsNone(cache.get(self.bucket, 'other'))
+
+    def test_node_names(self):
+        self.assertTrue(RiakNode(host='10.0.0.1').matches_name(
+            'riak@10.0.0.1'))
+        self.assertFalse(RiakNode(host='10.0.0.1').matches_name(
+            'riak@10.0.0.2'))
+        named = RiakNode(host='db1.example.com', name='riak@10.0.0.1')
+        self.assertTrue(named.matches_name('riak@10.0.0.1'))
+
+
+class TokenAwareRoutingTests(unittest.TestCase):
+    def setUp(self):
+        hosts = ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+        self.client = RoutedClient(nodes=[{'host': h} for h in hosts],
+                                   token_aware=True)
+        self.bucket = self.client.bucket('routing')
+        self.preflists = {}
+        self.lookups = 0
+        self.client.get_preflist = self.get_preflist
+
+    def tearDown(self):
+        self.client.close()
+
+    def get_preflist(self, bucket, key):
+        self.lookups += 1
+        preflist = self.preflists[key]
+        if isinstance(preflist, Exception):
+            raise preflist
+        return preflist
+
+    def test_sent_to_primary_owner(self):
+        self.preflists['a'] = [preflist_item('10.0.0.2'),
+                               preflist_item('10.0.0.3', primary=False)]
+        # The first request is not delayed by the lookup
+        self.client.node_for(self.bucket.new('a'))
+        wait_for_lookups()
+        for i in range(5):
+            node = self.client.node_for(self.bucket.new('a'))
+            self.assertIs(self.client.nodes[1], node)
+        self.assertEqual(1, self.lookups)
+
+    def test_failed_owner_skipped(self):
+        self.preflists['a'] = [preflist_item('10.0.0.1'),
+                               preflist_item('10.0.0.2')]
+        owners = self.client.nodes[:2]
+        self.client.node_for(self.bucket.new('a'))
+        wait_for_lookups()
+        node = self.client.node_for(self.bucket.new('a'), fail=owners[:1])
+        self.assertIs(owners[1], node)
+        node = self.client.node_for(self.bucket.new('a'), fail=owners)
+        self.assertIs(self.client.nodes[2], node)
+
+    def test_lookup_errors_route_anywhere(self):
+        self.preflists['a'] = IOError('unreachable')
+        self.assertIn(self.client.node_for(self.bucket.new('a')),
+                      self.client.nodes)
+        wait_for_lookups()
+        self.client.node_for(self.bucket.new('a'))
+        self.assertEqual(1, self.lookups)
+
+    def test_disabled_without_preflist_support(self):
+        self.preflists['a'] = NotImplementedError()
+        self.client.node_for(self.bucket.new('a'))
+        wait_for_lookups()
+        self.client.node_for(self.bucket.new('b'))
+        self.assertEqual(1, self.lookups)
+        self.assertIsNone(self.client._preflists)
+
+    def test_off_by_default(self):
+        client = RoutedClient()
+        client.get_preflist = self.get_preflist
+        client.node_for(client.bucket('routing').new('a'))
+        wait_for_lookups()
+        self.assertEqual(0, self.lookups)
+        client.close()
+
+
+class NodeSelectionTests(unittest.TestCase):
+    def setUp(self):
+        self.client = RoutedClient(nodes=[{'host': '10.0.0.1'},
+                                          {'host': '10.0.0.2'}],
+                                   node_selection='least_loaded')
+        self.slow, self.fast = self.client.nodes
+        self.slow.latency.add(1.0)
+        self.fast.latency.add(0.01)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_moving_average(self):
+        average = MovingAverage(alpha=0.5)
+        self.assertEqual(0.0, average.value())
+        average.add(4.0)
+        self.assertAlmostEqual(4.0, average.value(), places=3)
+        average.add(2.0)
+        self.assertAlmostEqual(3.0, average.value(), places=3)
+        idle = MovingAverage(r=-1000.0)
+        idle.add(4.0)
+        time.sleep(0.01)
+        self.assertLess(idle.value(), 0.01)
+
+    def test_load_counts_requests_in_flight(self):
+        node = RiakNode()
+        node.latency.add(0.5)
+        node.request_started()
+        node.request_started()
+        self.assertAlmostEqual(1.5, node.load(), places=3)
+        node.request_finished(0.5)
+        node.request_finished()
+        self.assertEqual(0, node.in_flight)
+
+    def test_least_loaded_node_chosen(self):
+        for i in range(10):
+            self.assertIs(self.fast, self.client._choose_node())
+        self.fast.in_flight = 1000
+        self.assertIs(self.slow, self.client._choose_node())
+
+    def test_errors_outweigh_load(self):
+        self.fast.error_rate.incr(1)
+        self.assertIs(self.slow, self.client._choose_node())
+
+    def test_requests_tracked(self):
+        node = self.client.node_for(self.client.bucket('b').new('a'))
+        self.assertIs(self.fast, node)
+        self.assertEqual(0, node.in_flight)
+        self.assertLess(node.latency.value(), 0.01)
+
+    def test_new_connections(self):
+        transport = self.client._tcp_pool.create_resource()
+        self.assertIs(self.fast, transport._node)
+
+    def test_invalid_selection(self):
+        with self.assertRaises(ValueError):
+            RiakClient(node_selection='fastest')
+
+    def test_invalid_arguments_leave_client_closed(self):
+        for kwargs in [{'node_selection': 'fastest'},
+                       {'node_max_in_flight': -1},
+                       {'transport_options': {'max_size': 0}}]:
+            client = RiakClient.__new__(RiakClient)
+            with self.assertRaises(ValueError):
+                client.__init__(**kwargs)
+            # As __del__ does
+            client.close()
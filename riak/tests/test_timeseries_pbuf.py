@@ -22,6 +22,7 @@ from riak.pb.riak_ts_pb2 import TsColumnType
 
 from riak import RiakError
 from riak.codecs.pbuf import PbufCodec
+from riak.codecs.util import numpy
 from riak.table import Table
 from riak.tests import RUN_TIMESERIES
 from riak.tests.base import IntegrationTestBase
@@ -126,6 +127,51 @@ class TimeseriesPbufUnitTests(unittest.TestCase):
         self.assertEqual(r1.cells[4].boolean_value, self.rows[1][4])
         self.assertEqual(r1.cells[5].varchar_value, self.rows[1][5])
 
+    def test_compiled_row_encoder(self):
+        c = PbufCodec()
+        encoder = c.compile_timeseries_row_encoder(
+            ['varchar', 'sint64', 'double', 'timestamp', 'boolean', 'blob'])
+        tsobj = TsObject(None, self.table, self.rows, None)
+        self.assertEqual(c.encode_timeseries_put(tsobj).data,
+                         c.encode_timeseries_put(tsobj, encoder).data)
+        tsobj = TsObject(None, self.table, [self.rows[0][:5]], None)
+        with self.assertRaises(ValueError):
+            c.encode_timeseries_put(tsobj, encoder)
+
+    def test_compiled_row_encoder_matches_cell_types(self):
+        c = PbufCodec()
+        encoder = c.compile_timeseries_row_encoder(
+            ['varchar', 'sint64', 'double', 'timestamp', 'boolean', 'blob'])
+        rows = [[b'hash1', 3, 4, self.ts0ms, True, None],
+                [None, None, None, None, None, None],
+                [bd0, True, 1.5, ts1, 0, 'text']]
+        tsobj = TsObject(None, self.table, rows, None)
+        msg = c.encode_timeseries_put(tsobj, encoder)
+        self.assertEqual(c.encode_timeseries_put(tsobj).data, msg.data)
+        req = riak.pb.riak_ts_pb2.TsPutReq()
+        req.ParseFromString(msg.data)
+        self.assertEqual(4, req.rows[0].cells[2].sint64_value)
+        self.assertEqual(self.ts0ms, req.rows[0].cells[3].sint64_value)
+        self.assertFalse(req.rows[0].cells[3].HasField('timestamp_value'))
+        self.assertEqual(6, len(req.rows[1].cells))
+        self.assertTrue(req.rows[2].cells[1].boolean_value)
+
+    def test_compiled_row_encoder_edge_values(self):
+        c = PbufCodec()
+        encoder = c.compile_timeseries_row_encoder(
+            ['varchar', 'sint64', 'double', 'timestamp', 'boolean', 'blob'])
+        ints = [0, 63, 64, -64, -65, 2 ** 40, -2 ** 40,
+                2 ** 63 - 1, -2 ** 63]
+        rows = [[b'', i, float(i), i, bool(i), b'x' * 300] for i in ints]
+        rows.append([bd1, 1, -0.0, ts1, False, blob0])
+        tsobj = TsObject(None, self.table, rows, None)
+        self.assertEqual(c.encode_timeseries_put(tsobj).data,
+                         c.encode_timeseries_put(tsobj, encoder).data)
+        tsobj = TsObject(None, self.table, [[b'', 2 ** 63, 0.0, 0, False,
+                                             b'']], None)
+        with self.assertRaises(ValueError):
+            c.encode_timeseries_put(tsobj, encoder)
+
     def test_encode_data_for_listkeys(self):
         c = PbufCodec(client_timeouts=True)
         msg = c.encode_timeseries_listkeysreq(self.table, 1234)
@@ -134,7 +180,7 @@ class TimeseriesPbufUnitTests(unittest.TestCase):
         self.assertEqual(self.table.name, bytes_to_str(req.table))
         self.assertEqual(1234, req.timeout)
 
-    def test_decode_data_from_query(self):
+    def query_resp(self):
         tqr = riak.pb.riak_ts_pb2.TsQueryResp()
 
         c0 = tqr.columns.add()
@@ -182,7 +228,10 @@ class TimeseriesPbufUnitTests(unittest.TestCase):
         r1c4.boolean_value = self.rows[1][4]
         r1c5 = r1.cells.add()
         r1c5.varchar_value = self.rows[1][5]
+        return tqr
 
+    def test_decode_data_from_query(self):
+        tqr = self.query_resp()
         tsobj = TsObject(None, self.table)
         c = PbufCodec()
         c.decode_timeseries(tqr, tsobj, True)
@@ -221,6 +270,35 @@ class TimeseriesPbufUnitTests(unittest.TestCase):
         self.assertEqual(r1[4], self.rows[1][4])
         self.assertEqual(r1[5], self.rows[1][5])
 
+    def test_decode_columnar_data_from_query(self):
+        tsobj = TsObject(None, self.table)
+        c = PbufCodec()
+        c.decode_timeseries(self.query_resp(), tsobj, True, columnar=True)
+
+        self.assertIsNone(tsobj.rows)
+        self.assertEqual(list(tsobj.columns.names), list(tsobj.arrays))
+        arrays = list(tsobj.arrays.values())
+        self.assertEqual([str_to_bytes(bd0), str_to_bytes(bd1)],
+                         list(arrays[0]))
+        self.assertEqual([0, 3], list(arrays[1]))
+        self.assertEqual([1.2, 4.5], list(arrays[2]))
+        self.assertEqual([True, False], list(arrays[4]))
+        self.assertEqual([None, blob0], list(arrays[5]))
+        if numpy is None:
+            self.assertEqual([ts0, ts1], arrays[3])
+            self.assertEqual('d', arrays[2].typecode)
+        else:
+            self.assertEqual('datetime64[ms]', arrays[3].dtype)
+            self.assertEqual('float64', arrays[2].dtype)
+
+    def test_decode_columnar_empty_result(self):
+        tqr = self.query_resp()
+        del tqr.rows[:]
+        tsobj = TsObject(None, self.table)
+        PbufCodec().decode_timeseries(tqr, tsobj, columnar=True)
+        self.assertEqual(6, len(tsobj.arrays))
+        self.assertTrue(all(len(a) == 0 for a in tsobj.arrays.values()))
+
 
 @unittest.skipUnless(is_timeseries_supported() and RUN_TIMESERIES,
                      'Timeseries not supported by this Python version'
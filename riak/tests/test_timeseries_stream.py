@@ -0,0 +1,354 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import re
+import threading
+import time
+import unittest
+
+from riak import RiakClient, RiakError
+from riak.client.timeseries import split_query
+from riak.codecs.pbuf import PbufCodec
+from riak.codecs.ttb import TtbCodec
+from riak.table import Quantum, Table
+from riak.ts_object import TsObject
+
+MINUTE = 60 * 1000
+
+quantum = Quantum('time', 15, 'm')
+
+
+class QueryClient(RiakClient):
+    """
+    Answers each query with one row per minute of its time range,
+    after ``delay`` seconds.
+    """
+    delay = 0
+    fail = None
+
+    def __init__(self, *args, **kwargs):
+        super(QueryClient, self).__init__(*args, **kwargs)
+        self.describes = 0
+        self.queries = []
+        self.active = 0
+        self.most_active = 0
+        self.lock = threading.Lock()
+
+    def ts_query(self, table, query, interpolations=None, format=None):
+        start, end = [int(b) for b in re.findall(r'time [<>]=? (\d+)',
+                                                 query)]
+        with self.lock:
+            self.queries.append((start, end))
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if start == self.fail:
+            raise RiakError('query failed')
+        return TsObject(self, table,
+                        [[t] for t in range(start, end, MINUTE)])
+
+    def ts_describe(self, table):
+        self.describes += 1
+        rows = [[b'geohash', b'varchar', False, 1, 1, None, None],
+                [b'time', b'timestamp', False, 3, 3, 15, b'm'],
+                [b'weather', b'varchar', False, None, None, None, None]]
+        return TsObject(self, table, rows)
+
+
+class SplitQueryTests(unittest.TestCase):
+    def test_split_at_quantum_boundaries(self):
+        query = ("select * from t where time >= {0} and time < {1} "
+                 "and user = 'a'").format(5 * MINUTE, 40 * MINUTE)
+        self.assertEqual(
+            ["select * from t where time >= {0} and time < {1} "
+             "and user = 'a'".format(start, end)
+             for start, end in [(5 * MINUTE, 15 * MINUTE),
+                                (15 * MINUTE, 30 * MINUTE),
+                                (30 * MINUTE, 40 * MINUTE)]],
+            list(split_query(query, quantum)))
+
+    def test_exclusive_and_inclusive_bounds(self):
+        query = 'select * from t where TIME<=900000 and TIME > 0'
+        self.assertEqual(
+            ['select * from t where time < 900000 and time >= 1',
+             'select * from t where time < 900001 and time >= 900000'],
+            list(split_query(query, quantum)))
+
+    def test_unbounded_queries_rejected(self):
+        for query in ['select * from t where time > 0',
+                      'select * from t where time > 0 and time < 5 '
+                      'or time > 10 and time < 20',
+                      "select * from t where time > '2016-01-01' "
+                      "and time < 5"]:
+            with self.assertRaises(ValueError):
+                list(split_query(query, quantum))
+
+    def test_quantum_millis(self):
+        self.assertEqual(15 * MINUTE, quantum.millis)
+        self.assertEqual(2 * 24 * 60 * MINUTE, Quantum('t', 2, 'd').millis)
+
+
+class StreamQueryTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QueryClient()
+        self.table = self.client.table('GeoCheckin')
+        self.query = ('select time from {{table}} where time >= {0} '
+                      'and time < {1}').format(0, 60 * MINUTE)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_rows_chunked_in_order(self):
+        chunks = list(self.table.stream_query(self.query, chunk_rows=10))
+        self.assertEqual([10, 5] * 4, [len(c) for c in chunks])
+        rows = [row[0] for chunk in chunks for row in chunk]
+        self.assertEqual(list(range(0, 60 * MINUTE, MINUTE)), rows)
+        self.assertEqual(4, len(self.client.queries))
+
+    def test_queries_run_lazily(self):
+        chunks = self.table.stream_query(self.query, chunk_rows=15)
+        next(chunks)
+        self.assertEqual(1, len(self.client.queries))
+        chunks.close()
+
+    def test_parallel(self):
+        self.client.delay = 0.02
+        query = self.query.replace(str(60 * MINUTE), str(150 * MINUTE))
+        chunks = self.client.ts_stream_query(self.table, query,
+                                             parallel=3,
+                                             quantum=quantum)
+        rows = [row[0] for chunk in chunks for row in chunk]
+        self.assertEqual(list(range(0, 150 * MINUTE, MINUTE)), rows)
+        self.assertEqual(3, self.client.most_active)
+
+    def test_close_abandons_queries(self):
+        self.client.delay = 0.05
+        chunks = self.table.stream_query(self.query, parallel=3,
+                                         quantum=quantum)
+        next(chunks)
+        running = [t for t in threading.enumerate()
+                   if t.name == 'riak.client.timeseries-query']
+        self.assertTrue(running)
+        start = time.time()
+        chunks.close()
+        self.assertLess(time.time() - start, 0.04)
+        for thread in running:
+            thread.join()
+            self.assertIsNone(thread._value)
+
+    def test_errors_raised(self):
+        self.client.fail = 30 * MINUTE
+        chunks = self.table.stream_query(self.query, parallel=2)
+        self.assertEqual(15, len(next(chunks)))
+        self.assertEqual(15, len(next(chunks)))
+        with self.assertRaises(RiakError):
+            next(chunks)
+
+    def test_quantum_from_description(self):
+        self.assertEqual(quantum, self.table.quantum())
+        self.client.ts_describe = lambda table: TsObject(
+            self.client, table, [[b'time', b'timestamp', False, 1, 1]])
+        self.table.schema(refresh=True)
+        self.assertIsNone(self.table.quantum())
+        with self.assertRaises(ValueError):
+            list(self.table.stream_query(self.query))
+
+
+class SchemaTests(unittest.TestCase):
+    def setUp(self):
+        self.client = QueryClient()
+        self.table = self.client.table('GeoCheckin')
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_schema_cached(self):
+        schema = self.table.schema()
+        self.assertEqual(['geohash', 'time', 'weather'], schema.names)
+        self.assertEqual(['varchar', 'timestamp', 'varchar'], schema.types)
+        self.assertEqual(['geohash', 'time'], schema.partition_key)
+        self.assertEqual(['geohash', 'time'], schema.local_key)
+        self.assertEqual(quantum, schema.quantum)
+        self.assertIs(schema, self.table.schema())
+        self.assertIs(schema, self.client.table('GeoCheckin').schema())
+        self.table.quantum()
+        self.assertEqual(1, self.client.describes)
+
+    def test_schema_shared_by_name(self):
+        Table(self.client, 'GeoCheckin').schema()
+        del self.table
+        gc.collect()
+        # A table named by a string is a new Table but finds the schema
+        with self.assertRaises(ValueError):
+            self.client.ts_get('GeoCheckin', ['hash1'])
+        self.assertIsNotNone(self.client.table('GeoCheckin')._row_encoder(
+            PbufCodec()))
+        self.assertEqual(1, self.client.describes)
+
+    def test_schema_refresh_and_ttl(self):
+        schema = self.table.schema()
+        self.assertIsNot(schema, self.table.schema(refresh=True))
+        self.assertEqual(2, self.client.describes)
+        self.table.schema_ttl = 0.02
+        self.table.schema(refresh=True)
+        self.table.schema()
+        self.assertEqual(3, self.client.describes)
+        time.sleep(0.03)
+        self.assertIsNone(self.table._row_encoder(PbufCodec()))
+        self.table.schema()
+        self.assertEqual(4, self.client.describes)
+
+    def test_client_schema_ttl(self):
+        client = QueryClient(ts_schema_ttl=60)
+        self.assertEqual(60, client.table('GeoCheckin').schema_ttl)
+        self.assertIsNone(self.table.schema_ttl)
+        client.close()
+
+    def test_keys_checked(self):
+        self.table.schema()
+        with self.assertRaises(ValueError):
+            self.client.ts_get('GeoCheckin', ['hash1'])
+        with self.assertRaises(ValueError):
+            self.table.delete(['hash1', 1, 2])
+
+    def test_row_encoders_compiled_once(self):
+        codec = PbufCodec()
+        self.assertIsNone(self.table._row_encoder(codec))
+        self.table.schema()
+        encoder = self.table._row_encoder(codec)
+        self.assertIsNotNone(encoder)
+        self.assertIs(encoder, self.table._row_encoder(PbufCodec()))
+        self.assertIsNot(encoder, self.table._row_encoder(TtbCodec()))
+        self.table.schema(refresh=True)
+        self.assertIsNot(encoder, self.table._row_encoder(codec))
+
+    def stub_put(self):
+        """
+        Replaces the request of ``ts_put`` with one recording the row
+        encoder it would use.
+        """
+        encoders = []
+
+        def _ts_put(tsobj, retry_policy=None):
+            encoders.append(tsobj.table._row_encoder(PbufCodec()))
+            return True
+        self.client._ts_put = _ts_put
+        return encoders
+
+    def test_put_fetches_schema(self):
+        encoders = self.stub_put()
+        self.assertTrue(self.table.new([[b'hash1', 1, b'sunny']]).store())
+        self.table.new([[b'hash1', 2, b'rainy']]).store()
+        self.assertEqual(1, self.client.describes)
+        self.assertIsNotNone(encoders[0])
+        self.assertIs(encoders[0], encoders[1])
+
+    def test_put_without_description(self):
+        encoders = self.stub_put()
+
+        def ts_describe(table):
+            self.client.describes += 1
+            raise RiakError('no such table')
+        self.client.ts_describe = ts_describe
+        self.table.new([[b'hash1', 1, b'sunny']]).store()
+        self.table.new([[b'hash1', 2, b'rainy']]).store()
+        self.assertEqual([None, None], encoders)
+        self.assertEqual(1, self.client.describes)
+        with self.assertRaises(RiakError):
+            self.table.schema()
+        self.assertEqual(2, self.client.describes)
+
+
+class PutClient(RiakClient):
+    """
+    Records the rows of each ``ts_put``, failing batches that contain
+    the row ``['bad']``.
+    """
+    delay = 0
+
+    def __init__(self, *args, **kwargs):
+        super(PutClient, self).__init__(*args, **kwargs)
+        self.batches = []
+        self.active = 0
+        self.most_active = 0
+        self.lock = threading.Lock()
+
+    def ts_put(self, tsobj):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.batches.append(tsobj.rows)
+        if ['bad'] in tsobj.rows:
+            raise RiakError('put failed')
+        return True
+
+    def ts_describe(self, table):
+        raise RiakError('no such table')
+
+
+class BulkWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.client = PutClient()
+        self.table = self.client.table('GeoCheckin')
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_rows_batched(self):
+        with self.table.bulk_writer(batch_rows=10) as writer:
+            for i in range(25):
+                writer.add([i])
+        self.assertEqual([5, 10, 10],
+                         sorted(len(b) for b in self.client.batches))
+        rows = sorted(row[0] for b in self.client.batches for row in b)
+        self.assertEqual(list(range(25)), rows)
+        self.assertEqual(25, writer.written)
+        self.assertEqual([], writer.errors)
+
+    def test_in_flight_limited(self):
+        self.client.close()
+        self.client = PutClient(multiput_pool_size=4)
+        self.client.delay = 0.02
+        writer = self.client.ts_bulk_writer('GeoCheckin', batch_rows=2,
+                                            max_in_flight=2)
+        writer.extend([i] for i in range(20))
+        self.assertEqual([], writer.flush())
+        self.assertEqual(10, len(self.client.batches))
+        self.assertEqual(2, self.client.most_active)
+        writer.close()
+
+    def test_failed_batches_reported(self):
+        writer = self.table.bulk_writer(batch_rows=3)
+        writer.extend([[1], [2], ['bad'], [4], [5]])
+        errors = writer.close()
+        self.assertEqual(1, len(errors))
+        tsobj, err = errors[0]
+        self.assertEqual([[1], [2], ['bad']], tsobj.rows)
+        self.assertIsInstance(err, RiakError)
+        self.assertEqual(2, writer.written)
+
+    def test_flush_interval(self):
+        writer = self.table.bulk_writer(flush_interval=0.01)
+        writer.add([1])
+        time.sleep(0.1)
+        self.assertEqual([[[1]]], self.client.batches)
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.add([2])
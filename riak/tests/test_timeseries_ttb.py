@@ -121,6 +121,72 @@ class TimeseriesTtbUnitTests(unittest.TestCase):
             self.assertEqual(r[7], None)
             self.assertEqual(r[8], dr[8])
 
+    def test_compiled_row_encoder(self):
+        rows = [[bd0, 0, 1.2, ts0, True, None],
+                [bd1, 3, 4.5, unix_time_millis(ts1), False, blob0]]
+        c = TtbCodec()
+        encoder = c.compile_timeseries_row_encoder(
+            ['varchar', 'sint64', 'double', 'timestamp', 'boolean', 'blob'])
+        tsobj = TsObject(None, self.table, rows, None)
+        self.assertEqual(c.encode_timeseries_put(tsobj).data,
+                         c.encode_timeseries_put(tsobj, encoder).data)
+        tsobj = TsObject(None, self.table, [[bd0]], None)
+        with self.assertRaises(ValueError):
+            c.encode_timeseries_put(tsobj, encoder)
+
+    def test_compiled_row_encoder_matches_cell_types(self):
+        rows = [[str0, 3, 4, unix_time_millis(ts0), True, None],
+                [None, None, None, None, None, None],
+                [ts0, True, 1.5, ts1, 0, bd1]]
+        c = TtbCodec()
+        encoder = c.compile_timeseries_row_encoder(
+            ['varchar', 'sint64', 'double', 'timestamp', 'boolean', 'blob'])
+        tsobj = TsObject(None, self.table, rows, None)
+        self.assertEqual(c.encode_timeseries_put(tsobj).data,
+                         c.encode_timeseries_put(tsobj, encoder).data)
+        self.assertEqual(encode(([],) * 6)[1:], encoder(rows[1]))
+        self.assertEqual(encode((unix_time_millis(ts0), True, 1.5,
+                                 unix_time_millis(ts1), 0, bd1))[1:],
+                         encoder(rows[2]))
+
+    def test_compiled_row_encoder_edge_values(self):
+        ints = [0, 255, 256, -1, -2 ** 31, 2 ** 31 - 1, 2 ** 31, -2 ** 31 - 1,
+                2 ** 40, -2 ** 40, 2 ** 64 - 1, -2 ** 64 + 1, 2 ** 64, 2 ** 70]
+        rows = [[b'', i, float(i), i, bool(i), b'x' * 300] for i in ints]
+        rows.append([six.u('\u00e9'), 1, -0.0, ts1, False, blob0])
+        rows.append([str0, 1, 1e300, unix_time_millis(ts0), True, bd0])
+        c = TtbCodec()
+        encoder = c.compile_timeseries_row_encoder(
+            ['varchar', 'sint64', 'double', 'timestamp', 'boolean', 'blob'])
+        tsobj = TsObject(None, self.table, rows, None)
+        self.assertEqual(c.encode_timeseries_put(tsobj).data,
+                         c.encode_timeseries_put(tsobj, encoder).data)
+
+    def test_decode_columnar_data_from_get(self):
+        colnames = ["varchar", "sint64", "double", "timestamp",
+                    "boolean", "varchar2"]
+        coltypes = [varchar_a, sint64_a, double_a, timestamp_a,
+                    boolean_a, varchar_a]
+        r0 = (bd0, 0, 1.2, unix_time_millis(ts0), True, [])
+        r1 = (bd1, 3, 4.5, unix_time_millis(ts1), False, str1)
+        rsp_ttb = encode((tsgetresp_a, (colnames, coltypes, [r0, r1])))
+
+        tsobj = TsObject(None, self.table)
+        c = TtbCodec()
+        c.decode_timeseries(decode(rsp_ttb), tsobj, columnar=True)
+
+        self.assertIsNone(tsobj.rows)
+        arrays = list(tsobj.arrays.values())
+        self.assertEqual(6, len(arrays))
+        self.assertEqual([bd0.encode('utf-8'), bd1.encode('utf-8')],
+                         list(arrays[0]))
+        self.assertEqual([0, 3], list(arrays[1]))
+        self.assertEqual([1.2, 4.5], list(arrays[2]))
+        self.assertEqual([unix_time_millis(ts0), unix_time_millis(ts1)],
+                         list(arrays[3]))
+        self.assertEqual([True, False], list(arrays[4]))
+        self.assertEqual([None, str1.encode('ascii')], list(arrays[5]))
+
     def test_encode_data_for_put(self):
         r0 = (bd0, 0, 1.2, unix_time_millis(ts0), True, [])
         r1 = (bd1, 3, 4.5, unix_time_millis(ts1), False, [])
@@ -37,8 +37,16 @@ class FeatureDetection(object):
 
     :class:`FeatureDetection` is a parent class of
     :class:`Transport <riak.transports.transport.Transport>`.
+
+    Subclasses with a ``_node`` may also set :attr:`_features_key` to
+    share what they detect with other connections to that node, via
+    :meth:`RiakNode.get_feature <riak.node.RiakNode.get_feature>`.
     """
 
+    #: The key under which detected features are shared with other
+    #: connections to the same node, or None to not share them
+    _features_key = None
+
     def _server_version(self):
         """
         Gets the server version from the server. To be implemented by
@@ -208,4 +216,25 @@ class FeatureDetection(object):
 
     @lazy_property
     def server_version(self):
-        return LooseVersion(self._server_version())
+        return self._node_feature(
+            'server_version', lambda: LooseVersion(self._server_version()))
+
+    def _node_feature(self, name, detect):
+        """
+        Returns the value of ``detect()``, reusing the value another
+        connection to the same node detected if it is still fresh.
+
+        :param name: the name of the feature
+        :type name: string
+        :param detect: detects the feature from the server
+        :type detect: function
+        """
+        node = getattr(self, '_node', None)
+        if node is None or self._features_key is None:
+            return detect()
+        key = (self._features_key, name)
+        value = node.get_feature(key)
+        if value is None:
+            value = detect()
+            node.set_feature(key, value)
+        return value
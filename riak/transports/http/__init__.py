@@ -17,7 +17,7 @@ import select
 
 from six import PY2
 from riak.security import SecurityError, USE_STDLIB_SSL
-from riak.transports.pool import Pool
+from riak.transports.pool import Pool, POOL_OPTIONS
 from riak.transports.http.transport import HttpTransport
 
 if USE_STDLIB_SSL:
@@ -150,19 +150,24 @@ class RiakHTTPSConnection(HTTPSConnection):
 
 class HttpPool(Pool):
     """
-    A pool of HTTP(S) transport connections.
+    A pool of HTTP(S) transport connections. The sizing and eviction
+    options of :class:`~riak.transports.pool.Pool` may be given along
+    with the transport options.
     """
     def __init__(self, client, **options):
+        pool_options = dict((k, options.pop(k)) for k in POOL_OPTIONS
+                            if k in options)
         self.client = client
         self.options = options
         self.connection_class = NoNagleHTTPConnection
         if self.client._credentials:
             self.connection_class = RiakHTTPSConnection
 
-        super(HttpPool, self).__init__()
+        super(HttpPool, self).__init__(**pool_options)
 
-    def create_resource(self):
-        node = self.client._choose_node()
+    def create_resource(self, node=None):
+        if node is None:
+            node = self.client._choose_node()
         return HttpTransport(node=node,
                              client=self.client,
                              connection_class=self.connection_class,
@@ -171,6 +176,13 @@ class HttpPool(Pool):
     def destroy_resource(self, transport):
         transport.close()
 
+    def warm_resource(self, transport):
+        transport._connection.connect()
+        transport.server_version
+
+    def resource_key(self, transport):
+        return transport._node
+
 
 CONN_CLOSED_ERRORS = (
     NotConnected,
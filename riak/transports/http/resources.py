@@ -269,7 +269,7 @@ class HttpResources(object):
 
     @lazy_property
     def resources(self):
-        return self.get_resources()
+        return self._node_feature('resources', self.get_resources)
 
 
 def mkpath(*segments, **query):
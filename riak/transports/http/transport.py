@@ -45,6 +45,7 @@ class HttpTransport(Transport,
     The HttpTransport object holds information necessary to
     connect to Riak via HTTP.
     """
+    _features_key = 'http'
 
     def __init__(self, node=None,
                  client=None,
@@ -14,9 +14,19 @@
 
 from __future__ import print_function
 
+import six
 import threading
+import time
+import weakref
 
+from collections import deque
 from contextlib import contextmanager
+from riak.riak_error import PoolExhausted
+
+#: Options accepted by :class:`Pool` that subclasses should not pass
+#: on to the resources they create
+POOL_OPTIONS = ('max_size', 'min_idle', 'acquire_timeout',
+                'max_idle_time', 'max_lifetime')
 
 
 class BadResource(Exception):
@@ -73,6 +83,15 @@ class Resource(object):
         """True if this Resource errored."""
         self.errored = False
 
+        """The key the pool groups this resource under."""
+        self.key = None
+
+        """When the resource was created."""
+        self.created_at = time.time()
+
+        """When the resource was last released to the pool."""
+        self.released_at = self.created_at
+
     def release(self):
         """
         Releases this resource back to the pool it came from.
@@ -95,6 +114,16 @@ class Pool(object):
     a default value to be used as the resource if no resources are
     free.
 
+    Unclaimed resources are kept in one idle stack per
+    :meth:`resource_key` (the node, for transports), so claiming and
+    releasing a resource does not depend on the size of the pool.
+
+    By default the pool grows without limit. When ``max_size`` is
+    given, claims made while that many resources exist wait for one to
+    be released, raising :class:`~riak.riak_error.PoolExhausted` after
+    ``acquire_timeout`` seconds. Since the pool is reentrant, code that
+    claims a second resource while holding one should set a timeout.
+
     Example::
 
         from riak.transports.pool import Pool
@@ -113,18 +142,52 @@ class Pool(object):
             print(repr(resource2)) # should be [1]
     """
 
-    def __init__(self):
+    def __init__(self, max_size=None, min_idle=0, acquire_timeout=None,
+                 max_idle_time=None, max_lifetime=None):
         """
         Creates a new Pool. This should be called manually if you
         override the :meth:`__init__` method in a subclass.
+
+        :param max_size: the most resources that may exist at once, or
+            None for no limit
+        :type max_size: int
+        :param min_idle: the number of unclaimed resources that are
+            kept even when they exceed ``max_idle_time``
+        :type min_idle: int
+        :param acquire_timeout: seconds to wait for a resource when the
+            pool is full, or None to wait indefinitely
+        :type acquire_timeout: float
+        :param max_idle_time: seconds after which an unclaimed resource
+            is destroyed
+        :type max_idle_time: float
+        :param max_lifetime: seconds after which a resource is
+            destroyed rather than reused
+        :type max_lifetime: float
         """
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be a positive integer")
+        self.max_size = max_size
+        self.min_idle = min_idle
+        self.acquire_timeout = acquire_timeout
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
         self.lock = threading.RLock()
         self.releaser = threading.Condition(self.lock)
-        self.resources = list()
-
-    def acquire(self, _filter=None, default=None):
+        self.resources = set()
+        # Unclaimed resources by key, most recently released last.
+        # Keys whose stack is empty are removed.
+        self._idle = {}
+        # The number of unclaimed resources across all keys
+        self._free = 0
+        # Iterators waiting on claimed resources, by resource
+        self._awaiting = {}
+        self._reaper_stop = None
+        if max_idle_time or max_lifetime:
+            self._start_reaper()
+
+    def acquire(self, _filter=None, default=None, key=None, timeout=None):
         """
-        acquire(_filter=None, default=None)
+        acquire(_filter=None, default=None, key=None, timeout=None)
 
         Claims a resource from the pool for manual use. Resources are
         created as needed when all members of the pool are claimed or
@@ -136,29 +199,155 @@ class Pool(object):
         :type _filter: callable
         :param default: a value that will be used instead of calling
             :meth:`create_resource` if a new resource needs to be created
+        :param key: only claim resources kept under this
+            :meth:`resource_key`, passing it to :meth:`create_resource`
+            if a new resource needs to be created
+        :type key: hashable
+        :param timeout: seconds to wait for a resource when the pool is
+            full, overriding ``acquire_timeout``
+        :type timeout: float
         :rtype: Resource
+        :raises: :class:`~riak.riak_error.PoolExhausted` if the pool is
+            full and no resource is released within the timeout
         """
-        if not _filter:
-            def _filter(obj):
-                return True
-        elif not callable(_filter):
+        if timeout is None:
+            timeout = self.acquire_timeout
+        if _filter and not callable(_filter):
             raise TypeError("_filter is not a callable")
 
-        resource = None
-        with self.lock:
-            for e in self.resources:
-                if not e.claimed and _filter(e.object):
-                    resource = e
-                    break
-            if resource is None:
+        deadline = None
+        # Resources removed while the lock is held, destroyed after
+        # it is released
+        doomed = []
+        try:
+            with self.lock:
+                while True:
+                    resource = self._claim_idle(_filter, key)
+                    if resource is not None:
+                        if self._expired(resource, time.time()):
+                            self._remove(resource)
+                            doomed.append(resource)
+                            continue
+                        return resource
+                    if self.max_size is None or \
+                            len(self.resources) < self.max_size:
+                        break
+                    # Full: make room by dropping an unclaimed resource
+                    # the filter rejected, or wait for one to be
+                    # released
+                    victim = self._oldest_idle()
+                    if victim is not None:
+                        self._remove(victim)
+                        doomed.append(victim)
+                        continue
+                    remaining = None
+                    if timeout is not None:
+                        if deadline is None:
+                            deadline = time.time() + timeout
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise PoolExhausted(
+                                "no resource was released within {0}s; "
+                                "the pool is at its max_size of {1}".format(
+                                    timeout, self.max_size))
+                    self.releaser.wait(remaining)
+
                 if default is not None:
                     resource = Resource(default, self)
+                elif key is not None:
+                    resource = Resource(self.create_resource(key), self)
                 else:
                     resource = Resource(self.create_resource(), self)
-                self.resources.append(resource)
+                resource.key = self.resource_key(resource.object)
+                resource.claimed = True
+                self.resources.add(resource)
+            return resource
+        finally:
+            for victim in doomed:
+                self.destroy_resource(victim.object)
+
+    def add_resource(self, obj):
+        """
+        Adds an already-created resource to the pool, unclaimed, as
+        though it had been created by :meth:`create_resource` and
+        released.
+
+        :param obj: the resource to add
+        :rtype: boolean, False if the pool is already at ``max_size``
+        """
+        with self.lock:
+            if self.max_size is not None and \
+                    len(self.resources) >= self.max_size:
+                return False
+            resource = Resource(obj, self)
+            resource.key = self.resource_key(obj)
             resource.claimed = True
+            self.resources.add(resource)
+            self.release(resource)
+        return True
+
+    def _claim_idle(self, _filter, key=None):
+        """
+        Claims the most recently released idle resource that passes
+        the filter, and has the given key if any, or returns None.
+        Must be called with the lock held.
+        """
+        if not self._free:
+            return None
+        if key is None:
+            stacks = six.iteritems(self._idle)
+        elif key in self._idle:
+            stacks = [(key, self._idle[key])]
+        else:
+            return None
+        for key, idle in stacks:
+            if _filter is None or _filter(idle[-1].object):
+                resource = idle.pop()
+                break
+            if key is not None:
+                # Filters select by what the key tells apart, so a
+                # stack whose top is rejected is rejected as a whole
+                continue
+            matches = [r for r in idle if _filter(r.object)]
+            if matches:
+                resource = matches[-1]
+                idle.remove(resource)
+                break
+        else:
+            return None
+        if not idle:
+            del self._idle[key]
+        self._free -= 1
+        resource.claimed = True
         return resource
 
+    def _oldest_idle(self):
+        """
+        Returns the unclaimed resource released longest ago, or None.
+        Must be called with the lock held.
+        """
+        oldest = None
+        for idle in six.itervalues(self._idle):
+            if oldest is None or idle[0].released_at < oldest.released_at:
+                oldest = idle[0]
+        return oldest
+
+    def _expired(self, resource, now):
+        return self.max_lifetime is not None and \
+            now - resource.created_at > self.max_lifetime
+
+    def _take(self, resource):
+        """
+        Claims a specific idle resource. Must be called with the lock
+        held.
+        """
+        idle = self._idle[resource.key]
+        idle.remove(resource)
+        if not idle:
+            del self._idle[resource.key]
+        self._free -= 1
+        resource.claimed = True
+
     def release(self, resource):
         """release(resource)
 
@@ -169,14 +358,48 @@ class Pool(object):
 
         :param resource: Resource
         """
-        with self.releaser:
-            resource.claimed = False
-            self.releaser.notify_all()
+        now = time.time()
+        with self.lock:
+            if not resource.claimed or resource not in self.resources:
+                # Deleted, or already released
+                resource.claimed = False
+                return
+            expired = self._expired(resource, now)
+            if expired:
+                self._remove(resource)
+            else:
+                self._return(resource, now)
+        if expired:
+            self.destroy_resource(resource.object)
+
+    def _return(self, resource, now):
+        """
+        Hands a released resource to a waiting iterator, or keeps it
+        as idle. Must be called with the lock held.
+        """
+        waiting = self._awaiting.get(resource)
+        if waiting:
+            # Pass the resource straight to the first iterator
+            # waiting for it, so it stays claimed
+            iterator = waiting.pop(0)
+            if not waiting:
+                del self._awaiting[resource]
+            iterator._handoff(resource)
+            return
+        resource.claimed = False
+        resource.released_at = now
+        idle = self._idle.get(resource.key)
+        if idle is None:
+            idle = self._idle[resource.key] = deque()
+        idle.append(resource)
+        self._free += 1
+        self.releaser.notify()
 
     @contextmanager
-    def transaction(self, _filter=None, default=None, yield_resource=False):
+    def transaction(self, _filter=None, default=None, yield_resource=False,
+                    key=None, timeout=None):
         """
-        transaction(_filter=None, default=None)
+        transaction(_filter=None, default=None, key=None, timeout=None)
 
         Claims a resource from the pool for use in a thread-safe,
         reentrant manner (as part of a with statement). Resources are
@@ -191,8 +414,15 @@ class Pool(object):
         :param yield_resource: set to True to yield the Resource object
             itself
         :type yield_resource: boolean
+        :param key: only claim resources kept under this
+            :meth:`resource_key`; see :meth:`acquire`
+        :type key: hashable
+        :param timeout: seconds to wait for a resource when the pool is
+            full; see :meth:`acquire`
+        :type timeout: float
         """
-        resource = self.acquire(_filter=_filter, default=default)
+        resource = self.acquire(_filter=_filter, default=default, key=key,
+                                timeout=timeout)
         try:
             if yield_resource:
                 yield resource
@@ -216,10 +446,71 @@ class Pool(object):
         :type resource: Resource
         """
         with self.lock:
-            self.resources.remove(resource)
+            if resource not in self.resources:
+                return
+            self._remove(resource)
         self.destroy_resource(resource.object)
         del resource
 
+    def _remove(self, resource):
+        """
+        Removes a resource that is in the pool, without destroying it.
+        Must be called with the lock held.
+        """
+        if not resource.claimed:
+            self._take(resource)
+        self.resources.remove(resource)
+        for waiting in self._awaiting.pop(resource, ()):
+            waiting._forget(resource)
+        if self.max_size is not None:
+            # There is room for a waiting claimant to create one
+            self.releaser.notify()
+
+    def reap(self):
+        """
+        Destroys unclaimed resources that have been idle longer than
+        ``max_idle_time`` (leaving at least ``min_idle`` of them) or
+        that have outlived ``max_lifetime``. Called periodically by a
+        background thread when either option is set.
+        """
+        now = time.time()
+        stale = []
+        with self.lock:
+            keep = self._free - (self.min_idle or 0)
+            for idle in list(six.itervalues(self._idle)):
+                for resource in list(idle):
+                    if self._expired(resource, now):
+                        pass
+                    elif self.max_idle_time is not None and keep > 0 and \
+                            now - resource.released_at > self.max_idle_time:
+                        keep -= 1
+                    else:
+                        continue
+                    self._take(resource)
+                    stale.append(resource)
+        for resource in stale:
+            self.delete_resource(resource)
+
+    def _start_reaper(self):
+        interval = min(t for t in (self.max_idle_time, self.max_lifetime)
+                       if t) / 2.0
+        interval = min(max(interval, 0.01), 30)
+        stop = self._reaper_stop = threading.Event()
+        # Hold the pool weakly so an abandoned pool can be collected
+        ref = weakref.ref(self)
+
+        def _run():
+            while not stop.wait(interval):
+                pool = ref()
+                if pool is None:
+                    return
+                pool.reap()
+                del pool
+
+        reaper = threading.Thread(target=_run, name='riak-pool-reaper')
+        reaper.daemon = True
+        reaper.start()
+
     def __iter__(self):
         """
         Iterator callback to iterate over the resources of the pool.
@@ -234,13 +525,44 @@ class Pool(object):
         for resource in self:
             self.delete_resource(resource)
 
+    def close(self):
+        """
+        Stops the background reaper, if any, and clears the pool.
+        """
+        if self._reaper_stop is not None:
+            self._reaper_stop.set()
+        self.clear()
+
     def create_resource(self):
         """
         Implemented by subclasses to allocate a new resource for use
-        in the pool.
+        in the pool. Pools whose resources are claimed by ``key``
+        must also accept the key as an argument.
         """
         raise NotImplementedError
 
+    def warm_resource(self, obj):
+        """
+        Prepares a newly created resource for use ahead of time; for
+        connections, this opens them. The default implementation is a
+        no-op.
+
+        :param obj: the resource to prepare
+        """
+        pass
+
+    def resource_key(self, obj):
+        """
+        Returns the key under which an unclaimed resource is kept, so
+        that resources which filters tell apart are grouped together.
+        Subclasses pooling connections return the node. The default
+        implementation keeps all resources together.
+
+        :param obj: the pooled resource
+        :rtype: hashable
+        """
+        return None
+
     def destroy_resource(self, obj):
         """
         Called when removing a resource from the pool so that it can
@@ -269,19 +591,20 @@ class PoolIterator(object):
 
     def __init__(self, pool):
         with pool.lock:
-            self.targets = pool.resources[:]
+            self.targets = set(pool.resources)
         self.unlocked = []
+        self.pool = pool
         self.lock = pool.lock
-        self.releaser = pool.releaser
+        self.releaser = threading.Condition(pool.lock)
 
     def __iter__(self):
         return self
 
     def next(self):
         # Python 2.x version
-        if len(self.targets) == 0:
-            raise StopIteration
-        if len(self.unlocked) == 0:
+        while not self.unlocked:
+            if not self.targets:
+                raise StopIteration
             self.__claim_resources()
         return self.unlocked.pop(0)
 
@@ -289,19 +612,41 @@ class PoolIterator(object):
         # Python 3.x version
         return self.next()
 
+    def _handoff(self, resource):
+        # Called by the pool, with its lock held, when a resource we
+        # are waiting for is released
+        self.targets.discard(resource)
+        self.unlocked.append(resource)
+        self.releaser.notify()
+
+    def _forget(self, resource):
+        # Called by the pool, with its lock held, when a resource we
+        # are waiting for is deleted
+        self.targets.discard(resource)
+        self.releaser.notify()
+
     def __claim_resources(self):
+        pool = self.pool
         with self.lock:
-            with self.releaser:
-                if self.__all_claimed():
-                    self.releaser.wait()
-            for resource in self.targets:
-                if not resource.claimed:
-                    self.targets.remove(resource)
+            for resource in list(self.targets):
+                if resource not in pool.resources:
+                    self.targets.discard(resource)
+                elif not resource.claimed:
+                    pool._take(resource)
+                    self.targets.discard(resource)
                     self.unlocked.append(resource)
-                    resource.claimed = True
-
-    def __all_claimed(self):
-        for resource in self.targets:
-            if not resource.claimed:
-                return False
-        return True
+            if self.unlocked or not self.targets:
+                return
+            # Everything left is claimed: ask the pool to hand us
+            # each one as it is released, then wait for the first
+            for resource in self.targets:
+                pool._awaiting.setdefault(resource, []).append(self)
+            try:
+                self.releaser.wait()
+            finally:
+                for resource in self.targets:
+                    waiting = pool._awaiting.get(resource)
+                    if waiting and self in waiting:
+                        waiting.remove(self)
+                        if not waiting:
+                            del pool._awaiting[resource]
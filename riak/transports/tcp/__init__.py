@@ -15,21 +15,26 @@
 import errno
 import socket
 
-from riak.transports.pool import Pool, ConnectionClosed
+from riak.transports.pool import Pool, ConnectionClosed, POOL_OPTIONS
 from riak.transports.tcp.transport import TcpTransport
 
 
 class TcpPool(Pool):
     """
-    A resource pool of TCP transports.
+    A resource pool of TCP transports. The sizing and eviction
+    options of :class:`~riak.transports.pool.Pool` may be given along
+    with the transport options.
     """
     def __init__(self, client, **options):
-        super(TcpPool, self).__init__()
+        pool_options = dict((k, options.pop(k)) for k in POOL_OPTIONS
+                            if k in options)
+        super(TcpPool, self).__init__(**pool_options)
         self._client = client
         self._options = options
 
-    def create_resource(self):
-        node = self._client._choose_node()
+    def create_resource(self, node=None):
+        if node is None:
+            node = self._client._choose_node()
         return TcpTransport(node=node,
                             client=self._client,
                             **self._options)
@@ -37,6 +42,14 @@ class TcpPool(Pool):
     def destroy_resource(self, tcp):
         tcp.close()
 
+    def warm_resource(self, tcp):
+        # Connects, negotiates security and detects features
+        tcp._connect()
+        tcp.server_version
+
+    def resource_key(self, tcp):
+        return tcp._node
+
 
 # These are a specific set of socket errors
 # that could be raised on send/recv that indicate
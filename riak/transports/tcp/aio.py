@@ -0,0 +1,377 @@
+# Copyright 2010-present Basho Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+An asyncio implementation of the Protocol Buffers transport, used by
+:class:`~riak.client.aio.AsyncRiakClient`. Requires Python 3.6 or
+later.
+"""
+
+import asyncio
+import collections
+import socket
+import struct
+
+from distutils.version import LooseVersion
+
+import riak.pb.messages
+
+from riak import RiakError
+from riak.client.index_page import CONTINUATION
+from riak.codecs import Codec, Msg
+from riak.codecs.pbuf import PbufCodec
+from riak.codecs.ttb import TtbCodec
+from riak.pb.messages import MSG_CODE_TS_TTB_MSG
+from riak.security import SecurityError, USE_STDLIB_SSL
+from riak.transports.feature_detect import FeatureDetection
+from riak.transports.pool import BadResource, ConnectionClosed
+from riak.transports.tcp.connection import TcpConnection
+from riak.ts_object import TsObject
+from riak.util import decode_index_value, bytes_to_str
+
+if USE_STDLIB_SSL:
+    from riak.transports.security import configure_ssl_context
+
+#: The default maximum number of connections an
+#: :class:`AsyncTcpPool` opens at once
+DEFAULT_MAX_CONNECTIONS = 64
+
+
+class AsyncTcpConnection(FeatureDetection):
+    """
+    A single Protocol Buffers connection to a Riak node, driven by
+    asyncio streams. Requests are encoded and decoded with the same
+    codecs and framing as :class:`~riak.transports.tcp.TcpTransport`.
+    """
+    _features_key = 'pbc'
+
+    def __init__(self, node=None, client=None, timeout=None, **options):
+        self._node = node
+        self._client = client
+        self._timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._pbuf_c = None
+        self._ttb_c = None
+        self._socket_tcp_options = options.get('socket_tcp_options', {})
+        self._socket_keepalive = options.get('socket_keepalive', False)
+        self._ts_convert_timestamp = options.get('ts_convert_timestamp',
+                                                 False)
+        self._use_ttb = options.get('use_ttb', True)
+
+    async def connect(self):
+        """
+        Opens the connection, negotiates security if the client has
+        credentials, and detects the server version.
+        """
+        if self._writer is not None:
+            return
+        opening = asyncio.open_connection(self._node.host,
+                                          self._node.pb_port)
+        if self._timeout:
+            opening = asyncio.wait_for(opening, self._timeout)
+        self._reader, self._writer = await opening
+        sock = self._writer.get_extra_info('socket')
+        if sock is not None:
+            for k, v in self._socket_tcp_options.items():
+                sock.setsockopt(socket.SOL_TCP, k, v)
+            if self._socket_keepalive:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if self._client._credentials:
+            await self._init_security()
+        key = (self._features_key, 'server_version')
+        version = self._node.get_feature(key)
+        if version is None:
+            server_info = await self.get_server_info()
+            version = LooseVersion(server_info['server_version'])
+            self._node.set_feature(key, version)
+        self.server_version = version
+
+    async def _init_security(self):
+        resp_code, _ = await self._send_recv(
+            riak.pb.messages.MSG_CODE_START_TLS)
+        if resp_code != riak.pb.messages.MSG_CODE_START_TLS:
+            raise SecurityError("Could not start TLS connection")
+        if not USE_STDLIB_SSL or not hasattr(self._writer, 'start_tls'):
+            raise SecurityError("Secure asyncio connections require the "
+                                "standard library ssl module and "
+                                "StreamWriter.start_tls")
+        credentials = self._client._credentials
+        try:
+            await self._writer.start_tls(configure_ssl_context(credentials),
+                                         server_hostname=self._node.host)
+        except Exception as e:
+            raise SecurityError(e)
+        msg = PbufCodec().encode_auth(credentials.username,
+                                      credentials.password or '')
+        resp_code, _ = await self._send_recv(msg.msg_code, msg.data)
+        if resp_code != riak.pb.messages.MSG_CODE_AUTH_RESP:
+            raise SecurityError("Could not authorize connection")
+
+    def close(self):
+        """
+        Closes the underlying stream.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+    def _server_version(self):
+        raise RiakError("the connection has not been opened")
+
+    def _get_pbuf_codec(self):
+        if not self._pbuf_c:
+            self._pbuf_c = PbufCodec(
+                    self.client_timeouts(), self.quorum_controls(),
+                    self.tombstone_vclocks(), self.bucket_types())
+        return self._pbuf_c
+
+    def _get_ts_codec(self):
+        if not self._use_ttb:
+            return self._get_pbuf_codec()
+        if not self._ttb_c:
+            self._ttb_c = TtbCodec()
+        return self._ttb_c
+
+    async def _send_recv(self, msg_code, data=None):
+        try:
+            self._writer.write(TcpConnection._encode_msg(msg_code, data))
+            await self._writer.drain()
+        except (ConnectionError, OSError) as e:
+            raise ConnectionClosed(e)
+        return await self._recv_msg()
+
+    async def _recv_msg(self, mid_stream=False):
+        reading = self._recv_frame()
+        if self._timeout:
+            reading = asyncio.wait_for(reading, self._timeout)
+        try:
+            frame = await reading
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionClosed(e, mid_stream)
+        except (ConnectionError, OSError) as e:
+            raise ConnectionClosed(e, mid_stream)
+        except asyncio.TimeoutError as e:
+            # A late reply would be mixed up with the next request's,
+            # so the connection cannot be re-used.
+            raise BadResource(e, mid_stream)
+        return frame[0], frame[1:]
+
+    async def _recv_frame(self):
+        msglen, = struct.unpack('!I', await self._reader.readexactly(4))
+        return await self._reader.readexactly(msglen)
+
+    async def _request(self, msg, codec):
+        if not isinstance(msg, Msg):
+            raise ValueError('expected a Msg argument')
+        if not isinstance(codec, Codec):
+            raise ValueError('expected a Codec argument')
+
+        resp_code, data = await self._send_recv(msg.msg_code, msg.data)
+        codec.maybe_riak_error(resp_code, data)
+        codec.maybe_incorrect_code(resp_code, msg.resp_code)
+        if resp_code == MSG_CODE_TS_TTB_MSG or \
+           resp_code in riak.pb.messages.MESSAGE_CLASSES:
+            return resp_code, codec.parse_msg(resp_code, data)
+        else:
+            raise BadResource('unknown msg code {}'.format(resp_code))
+
+    async def get_server_info(self):
+        codec = PbufCodec()
+        msg = Msg(riak.pb.messages.MSG_CODE_GET_SERVER_INFO_REQ, None,
+                  riak.pb.messages.MSG_CODE_GET_SERVER_INFO_RESP)
+        resp_code, resp = await self._request(msg, codec)
+        return codec.decode_get_server_info(resp)
+
+    async def ping(self):
+        codec = self._get_pbuf_codec()
+        resp_code, _ = await self._request(codec.encode_ping(), codec)
+        return resp_code == riak.pb.messages.MSG_CODE_PING_RESP
+
+    async def get(self, robj, **options):
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_get(robj, **options)
+        resp_code, resp = await self._request(msg, codec)
+        return codec.decode_get(robj, resp)
+
+    async def put(self, robj, **options):
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_put(robj, **options)
+        resp_code, resp = await self._request(msg, codec)
+        return codec.decode_put(robj, resp)
+
+    async def delete(self, robj, **options):
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_delete(robj, **options)
+        await self._request(msg, codec)
+        return self
+
+    async def fetch_datatype(self, bucket, key, **options):
+        if bucket.bucket_type.is_default():
+            raise NotImplementedError("Datatypes cannot be used in the default"
+                                      " bucket-type.")
+        if not self.datatypes():
+            raise NotImplementedError("Datatypes are not supported.")
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_fetch_datatype(bucket, key, **options)
+        resp_code, resp = await self._request(msg, codec)
+        return codec.decode_dt_fetch(resp)
+
+    async def update_datatype(self, datatype, **options):
+        if datatype.bucket.bucket_type.is_default():
+            raise NotImplementedError("Datatypes cannot be used in the default"
+                                      " bucket-type.")
+        if not self.datatypes():
+            raise NotImplementedError("Datatypes are not supported.")
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_update_datatype(datatype, **options)
+        resp_code, resp = await self._request(msg, codec)
+        codec.decode_update_datatype(datatype, resp, **options)
+        return True
+
+    async def stream_index(self, bucket, index, startkey, endkey=None,
+                           return_terms=None, max_results=None,
+                           continuation=None, timeout=None,
+                           term_regex=None):
+        """
+        Sends a streaming secondary index query and yields the decoded
+        result batches. The caller must consume the generator fully or
+        discard the connection.
+        """
+        if not self.stream_indexes():
+            raise NotImplementedError("Secondary index streaming is not "
+                                      "supported")
+        if term_regex and not self.index_term_regex():
+            raise NotImplementedError("Secondary index term_regex is not "
+                                      "supported")
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_index_req(bucket, index, startkey, endkey,
+                                     return_terms, max_results,
+                                     continuation, timeout,
+                                     term_regex, streaming=True)
+        expect = riak.pb.messages.MSG_CODE_INDEX_RESP
+        resp_code, data = await self._send_recv(msg.msg_code, msg.data)
+        while True:
+            codec.maybe_riak_error(resp_code, data)
+            codec.maybe_incorrect_code(resp_code, expect)
+            resp = codec.parse_msg(expect, data)
+            if return_terms and resp.results:
+                yield [(decode_index_value(index, r.key),
+                        bytes_to_str(r.value))
+                       for r in resp.results]
+            elif resp.keys:
+                yield [bytes_to_str(key) for key in resp.keys]
+            if resp.continuation:
+                yield CONTINUATION(bytes_to_str(resp.continuation))
+            if resp.done:
+                return
+            resp_code, data = await self._recv_msg(mid_stream=True)
+
+    async def ts_get(self, table, key):
+        codec = self._get_ts_codec()
+        msg = codec.encode_timeseries_keyreq(table, key)
+        resp_code, resp = await self._request(msg, codec)
+        tsobj = TsObject(self._client, table)
+        codec.decode_timeseries(resp, tsobj, self._ts_convert_timestamp)
+        return tsobj
+
+    async def ts_put(self, tsobj):
+        codec = self._get_ts_codec()
+        msg = codec.encode_timeseries_put(tsobj,
+                                          tsobj.table._row_encoder(codec))
+        resp_code, resp = await self._request(msg, codec)
+        return codec.validate_timeseries_put_resp(resp_code, resp)
+
+    async def ts_delete(self, table, key):
+        codec = self._get_pbuf_codec()
+        msg = codec.encode_timeseries_keyreq(table, key, is_delete=True)
+        resp_code, resp = await self._request(msg, codec)
+        if resp is not None:
+            return True
+        else:
+            raise RiakError("missing response object")
+
+    async def ts_query(self, table, query, interpolations=None):
+        codec = self._get_ts_codec()
+        msg = codec.encode_timeseries_query(table, query, interpolations)
+        resp_code, resp = await self._request(msg, codec)
+        tsobj = TsObject(self._client, table)
+        codec.decode_timeseries(resp, tsobj, self._ts_convert_timestamp)
+        return tsobj
+
+
+class AsyncTcpPool(object):
+    """
+    A pool of :class:`AsyncTcpConnection` objects. At most
+    ``max_connections`` connections are open at once, whether in use
+    or idle; coroutines acquiring beyond that wait for a connection to
+    be released. Idle connections that do not pass the filter of an
+    acquire, e.g. those to failing nodes, are closed rather than kept.
+    """
+
+    def __init__(self, client, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 **options):
+        self._client = client
+        self._options = options
+        self._idle = collections.deque()
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def acquire(self, _filter=None, node=None):
+        """
+        Claims a connection, opening a new one to ``node`` (or to a node
+        chosen by the client) if no idle connection passes ``_filter``.
+
+        :rtype: AsyncTcpConnection
+        """
+        # NB: only connections in use hold a slot, but a connection is
+        # opened only once every idle one has been taken or closed, so
+        # at most max_connections are ever open
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                conn = self._idle.pop()
+                if _filter is None or _filter(conn):
+                    return conn
+                conn.close()
+            if node is None:
+                node = self._client._choose_node()
+            conn = AsyncTcpConnection(node=node, client=self._client,
+                                      **self._options)
+            try:
+                await conn.connect()
+            except BaseException:
+                conn.close()
+                raise
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, errored=False):
+        """
+        Returns a connection to the pool, closing it if it errored.
+        """
+        if errored:
+            conn.close()
+        else:
+            self._idle.append(conn)
+        self._slots.release()
+
+    def clear(self):
+        """
+        Closes all idle connections.
+        """
+        while self._idle:
+            self._idle.popleft().close()
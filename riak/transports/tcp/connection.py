@@ -14,6 +14,7 @@
 
 import errno
 import logging
+import os
 import socket
 import struct
 import six
@@ -32,20 +33,49 @@ else:
     from OpenSSL.SSL import Connection
     from riak.transports.security import configure_pyopenssl_context
 
+#: The size of the buffer each connection receives into. Frames that
+#: do not fit are read into a buffer of their own.
+RECV_BUFFER_SIZE = 65536
+
+
+def _iov_max():
+    try:
+        return os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+        # The POSIX minimum
+        return 16
+
+
+#: The most buffers passed to a single sendmsg call
+SENDMSG_MAX_BUFFERS = _iov_max()
 
-class TcpConnection(object):
-    def __init__(self):
-        self.bytes_required = False
 
+class TcpConnection(object):
     """
     Connection-related methods for TcpTransport.
     """
-    def _encode_msg(self, msg_code, data=None):
+    def __init__(self):
+        self._rbuf = None
+        self._rpos = 0
+        self._rend = 0
+
+    @staticmethod
+    def _encode_msg(msg_code, data=None):
         if data is None:
             return struct.pack("!iB", 1, msg_code)
         hdr = struct.pack("!iB", 1 + len(data), msg_code)
         return hdr + data
 
+    @staticmethod
+    def _frame_buffers(msg_code, data=None):
+        """
+        Returns the header and body of a frame as separate buffers, so
+        the body need not be copied to prepend the header.
+        """
+        if data is None:
+            return [struct.pack("!iB", 1, msg_code)]
+        return [struct.pack("!iB", 1 + len(data), msg_code), data]
+
     def _send_recv(self, msg_code, data=None):
         self._send_msg(msg_code, data)
         return self._recv_msg()
@@ -62,13 +92,79 @@ class TcpConnection(object):
         self._non_connect_send_msg(msg.msg_code, msg.data)
         return self._recv_msg()
 
+    def _send_recv_many(self, msgs):
+        """
+        Writes all of the given messages back-to-back before reading
+        any replies. Riak answers requests on a connection in the
+        order they were received, so the replies are yielded in the
+        same order as the messages. As with :meth:`_recv_msg`, each
+        reply's data is only valid until the next one is read.
+
+        :param msgs: the messages to send
+        :type msgs: list of :class:`~riak.codecs.Msg`
+        :rtype: generator of (msg_code, data) tuples
+        """
+        self._connect()
+        self._non_connect_send_msgs(msgs)
+        for _ in msgs:
+            yield self._recv_msg()
+
     def _non_connect_send_msg(self, msg_code, data):
         """
         Similar to self._send, but doesn't try to initiate a connection,
         thus preventing an infinite loop.
         """
+        self._non_connect_send_buffers(self._frame_buffers(msg_code, data))
+
+    def _non_connect_send_msgs(self, msgs):
+        """
+        Writes several messages with as few send calls as possible.
+        """
+        buffers = []
+        for m in msgs:
+            buffers.extend(self._frame_buffers(m.msg_code, m.data))
+        self._non_connect_send_buffers(buffers)
+
+    def _non_connect_send_buffers(self, buffers):
+        """
+        Writes the buffers in order with scatter/gather sendmsg calls.
+        Sockets without a usable sendmsg (SSL sockets, and all sockets
+        on Python 2) are sent the buffers joined together instead.
+        """
+        if not self._can_sendmsg():
+            self._non_connect_sendall(b''.join(buffers))
+            return
+        try:
+            while buffers:
+                batch = buffers[:SENDMSG_MAX_BUFFERS]
+                sent = self._socket.sendmsg(batch)
+                # Drop what was written, which may end part-way
+                # through a buffer
+                done = 0
+                for buf in batch:
+                    if sent < len(buf):
+                        break
+                    sent -= len(buf)
+                    done += 1
+                buffers = buffers[done:]
+                if sent:
+                    buffers[0] = memoryview(buffers[0])[sent:]
+        except (IOError, socket.error) as e:
+            if e.errno == errno.EPIPE:
+                raise ConnectionClosed(e)
+            else:
+                raise
+
+    def _can_sendmsg(self):
+        sock = self._socket
+        if USE_STDLIB_SSL and isinstance(sock, ssl.SSLSocket):
+            # NB: SSLSocket.sendmsg raises NotImplementedError
+            return False
+        return hasattr(sock, 'sendmsg')
+
+    def _non_connect_sendall(self, buf):
         try:
-            self._socket.sendall(self._encode_msg(msg_code, data))
+            self._socket.sendall(buf)
         except (IOError, socket.error) as e:
             if e.errno == errno.EPIPE:
                 raise ConnectionClosed(e)
@@ -179,11 +275,16 @@ class TcpConnection(object):
 
     def _recv_msg(self, mid_stream=False):
         """
+        Reads the next frame from the socket. To avoid copying, the
+        data returned is a view of the connection's receive buffer
+        that is only valid until the next call.
+
         :param mid_stream: are we receiving in a streaming operation?
         :type mid_stream: boolean
+        :rtype: (msg_code, memoryview) tuple
         """
         try:
-            msgbuf = self._recv_pkt()
+            return self._recv_frame()
         except BadResource as e:
             e.mid_stream = mid_stream
             raise
@@ -193,61 +294,74 @@ class TcpConnection(object):
             # subsequent request.
             # https://github.com/basho/riak-python-client/issues/425
             raise BadResource(e, mid_stream)
-        mv = memoryview(msgbuf)
-        mcb = mv[0:1]
-        if self.bytes_required:
-            mcb = mcb.tobytes()
-        try:
-            msg_code, = struct.unpack("B", mcb)
-        except struct.error:
-            # NB: Python 2.7.3 requires this
-            # http://bugs.python.org/issue10212
-            msg_code, = struct.unpack("B", mv[0:1].tobytes())
-            self.bytes_required = True
-        data = mv[1:].tobytes()
-        return (msg_code, data)
-
-    def _recv_pkt(self):
-        # TODO FUTURE re-use buffer
-        msglen_buf = self._recv(4)
+
+    def _recv_frame(self):
+        if self._rbuf is None:
+            self._rbuf = bytearray(RECV_BUFFER_SIZE)
+        self._fill(4)
         # NB: msg length is an unsigned int
-        if self.bytes_required:
-            msglen_buf = bytes(msglen_buf)
-        try:
-            msglen, = struct.unpack('!I', msglen_buf)
-        except struct.error:
-            # NB: Python 2.7.3 requires this
-            # http://bugs.python.org/issue10212
-            msglen, = struct.unpack('!I', bytes(msglen_buf))
-            self.bytes_required = True
-        return self._recv(msglen)
-
-    def _recv(self, msglen):
-        # TODO FUTURE re-use buffer
+        msglen, = struct.unpack_from('!I', self._rbuf, self._rpos)
+        if msglen == 0:
+            raise BadResource(RiakError('received a frame without a '
+                                        'message code'))
+        if 4 + msglen <= len(self._rbuf):
+            self._fill(4 + msglen)
+            start = self._rpos + 4
+            self._rpos = start + msglen
+            msg_code, = struct.unpack_from('B', self._rbuf, start)
+            frame = memoryview(self._rbuf)[start:self._rpos]
+        else:
+            # Too big for the shared buffer: move what has arrived of
+            # it into a buffer of its own and read the rest in there
+            start = self._rpos + 4
+            buffered = self._rend - start
+            buf = bytearray(msglen)
+            buf[:buffered] = self._rbuf[start:self._rend]
+            self._rpos = self._rend = 0
+            frame = memoryview(buf)
+            self._recv_into(frame[buffered:], msglen - buffered)
+            msg_code, = struct.unpack_from('B', buf, 0)
+        return (msg_code, frame[1:])
+
+    def _fill(self, nbytes):
+        """
+        Reads from the socket until the receive buffer holds at least
+        ``nbytes`` unread bytes, taking whatever else has arrived too.
+        """
+        unread = self._rend - self._rpos
+        if unread >= nbytes:
+            return
+        if len(self._rbuf) - self._rpos < nbytes:
+            # Move the partial frame to the front to make room
+            self._rbuf[:unread] = self._rbuf[self._rpos:self._rend]
+            self._rpos, self._rend = 0, unread
+        view = memoryview(self._rbuf)
+        while self._rend - self._rpos < nbytes:
+            self._rend += self._recv_some(view[self._rend:],
+                                          len(self._rbuf) - self._rend,
+                                          nbytes - (self._rend - self._rpos))
+
+    def _recv_into(self, view, toread):
         # http://stackoverflow.com/a/15964489
-        msgbuf = bytearray(msglen)
-        view = memoryview(msgbuf)
-        nread = 0
-        toread = msglen
         while toread:
-            nbytes = self._socket.recv_into(view, toread)
-            # https://docs.python.org/2/howto/sockets.html#using-a-socket
-            # https://github.com/basho/riak-python-client/issues/399
-            if nbytes == 0:
-                msg = 'socket recv returned zero bytes unexpectedly, ' \
-                      'expected {}'.format(toread)
-                ex = RiakError(msg)
-                raise ConnectionClosed(ex)
+            nbytes = self._recv_some(view, toread, toread)
             view = view[nbytes:]  # slicing views is cheap
             toread -= nbytes
-            nread += nbytes
-        if nread != msglen:
-            raise RiakError("Socket returned short packet %d - expected %d"
-                            % (nread, msglen))
-        return msgbuf
+
+    def _recv_some(self, view, room, expected):
+        nbytes = self._socket.recv_into(view, room)
+        # https://docs.python.org/2/howto/sockets.html#using-a-socket
+        # https://github.com/basho/riak-python-client/issues/399
+        if nbytes == 0:
+            msg = 'socket recv returned zero bytes unexpectedly, ' \
+                  'expected {}'.format(expected)
+            ex = RiakError(msg)
+            raise ConnectionClosed(ex)
+        return nbytes
 
     def _connect(self):
         if not self._socket:
+            self._rpos = self._rend = 0
             if self._timeout:
                 self._socket = socket.create_connection(self._address,
                                                         self._timeout)
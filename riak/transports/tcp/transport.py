@@ -32,12 +32,24 @@ from riak.transports.tcp.stream import (PbufKeyStream,
                                         PbufIndexStream,
                                         PbufTsKeyStream)
 
+#: The default maximum number of requests written to a connection
+#: before their replies are read, when pipelining
+DEFAULT_PIPELINE_DEPTH = 32
+
+#: The default maximum number of request bytes written to a connection
+#: before their replies are read, when pipelining. Keeping this below
+#: the socket buffer sizes ensures that writing a batch never blocks
+#: on the server draining its replies.
+DEFAULT_PIPELINE_MAX_BYTES = 65536
+
 
 class TcpTransport(Transport, TcpConnection):
     """
     The TcpTransport object holds a connection to the TCP
     socket on the Riak server.
     """
+    _features_key = 'pbc'
+
     def __init__(self,
                  node=None,
                  client=None,
@@ -60,6 +72,10 @@ class TcpTransport(Transport, TcpConnection):
             kwargs.get('ts_convert_timestamp', False)
         self._use_ttb = \
             kwargs.get('use_ttb', True)
+        self._pipeline_depth = \
+            kwargs.get('pipeline_depth') or DEFAULT_PIPELINE_DEPTH
+        self._pipeline_max_bytes = \
+            kwargs.get('pipeline_max_bytes', DEFAULT_PIPELINE_MAX_BYTES)
 
     def _get_pbuf_codec(self):
         if not self._pbuf_c:
@@ -168,24 +184,92 @@ class TcpTransport(Transport, TcpConnection):
         resp_code, resp = self._request(msg, codec)
         return codec.decode_put(robj, resp)
 
+    def pipeline(self, requests, results=None):
+        """
+        Sends a batch of get, put and delete requests back-to-back and
+        matches the replies in order. Requests are written in windows of at
+        most ``pipeline_depth`` messages and ``pipeline_max_bytes``
+        bytes. Errors that Riak reports for an individual request are
+        returned in that request's slot rather than raised.
+
+        :param requests: ``(operation, robj, options)`` triples, where
+           operation is ``'get'``, ``'put'`` or ``'delete'``
+        :type requests: list
+        :param results: a list to append each request's result to as
+           its reply arrives, so that the results of the requests
+           answered before a failure are kept
+        :type results: list
+        :rtype: list of :class:`~riak.riak_object.RiakObject`, True for
+           deletes, or :class:`~riak.riak_error.RiakError`
+        """
+        codec = self._get_pbuf_codec()
+        if results is None:
+            results = []
+        window = []
+        nbytes = 0
+        for op, robj, options in requests:
+            if op == 'get':
+                msg = codec.encode_get(robj, **options)
+            elif op == 'put':
+                msg = codec.encode_put(robj, **options)
+            elif op == 'delete':
+                msg = codec.encode_delete(robj, **options)
+            else:
+                raise ValueError('cannot pipeline operation {}'.format(op))
+            if window and (len(window) >= self._pipeline_depth or
+                           nbytes + len(msg.data) > self._pipeline_max_bytes):
+                self._pipeline_window(codec, window, results)
+                window = []
+                nbytes = 0
+            window.append((op, robj, msg))
+            nbytes += len(msg.data)
+        if window:
+            self._pipeline_window(codec, window, results)
+        return results
+
+    def _pipeline_window(self, codec, window, results):
+        # NB: the replies are read one at a time, each only valid until
+        # the next, so they must not be zipped eagerly on Python 2
+        replies = self._send_recv_many([msg for _, _, msg in window])
+        for (op, robj, msg), (resp_code, data) in \
+                six.moves.zip(window, replies):
+            if resp_code != riak.pb.messages.MSG_CODE_ERROR_RESP and \
+               resp_code != msg.resp_code:
+                # NB: the replies are out of step with the requests,
+                # so this connection must not be re-used
+                raise BadResource('unexpected msg code {}, expected {}'
+                                  .format(resp_code, msg.resp_code))
+            try:
+                codec.maybe_riak_error(resp_code, data)
+                resp = codec.parse_msg(resp_code, data)
+                if op == 'get':
+                    results.append(codec.decode_get(robj, resp))
+                elif op == 'put':
+                    results.append(codec.decode_put(robj, resp))
+                else:
+                    results.append(True)
+            except RiakError as e:
+                results.append(e)
+
     def ts_describe(self, table):
         query = 'DESCRIBE {table}'.format(table=table.name)
         return self.ts_query(table, query)
 
-    def ts_get(self, table, key):
+    def ts_get(self, table, key, columnar=False):
         msg_code = MSG_CODE_TS_TTB_MSG
         codec = self._get_codec(msg_code)
         msg = codec.encode_timeseries_keyreq(table, key)
         resp_code, resp = self._request(msg, codec)
         tsobj = TsObject(self._client, table)
         codec.decode_timeseries(resp, tsobj,
-                                self._ts_convert_timestamp)
+                                self._ts_convert_timestamp, columnar)
         return tsobj
 
     def ts_put(self, tsobj):
         msg_code = MSG_CODE_TS_TTB_MSG
         codec = self._get_codec(msg_code)
-        msg = codec.encode_timeseries_put(tsobj)
+        msg = codec.encode_timeseries_put(tsobj,
+                                          tsobj.table._row_encoder(codec))
         resp_code, resp = self._request(msg, codec)
         return codec.validate_timeseries_put_resp(resp_code, resp)
 
@@ -199,14 +283,14 @@ class TcpTransport(Transport, TcpConnection):
         else:
             raise RiakError("missing response object")
 
-    def ts_query(self, table, query, interpolations=None):
+    def ts_query(self, table, query, interpolations=None, columnar=False):
         msg_code = riak.pb.messages.MSG_CODE_TS_QUERY_REQ
         codec = self._get_codec(msg_code)
         msg = codec.encode_timeseries_query(table, query, interpolations)
         resp_code, resp = self._request(msg, codec)
         tsobj = TsObject(self._client, table)
         codec.decode_timeseries(resp, tsobj,
-                                self._ts_convert_timestamp)
+                                self._ts_convert_timestamp, columnar)
         return tsobj
 
     def ts_stream_keys(self, table, timeout=None):
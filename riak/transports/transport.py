@@ -94,7 +94,7 @@ class Transport(FeatureDetection):
         """
         raise NotImplementedError
 
-    def ts_get(self, table, key):
+    def ts_get(self, table, key, columnar=False):
         """
         Retrieves a timeseries object.
         """
@@ -112,7 +112,7 @@ class Transport(FeatureDetection):
         """
         raise NotImplementedError
 
-    def ts_query(self, table, query, interpolations=None):
+    def ts_query(self, table, query, interpolations=None, columnar=False):
         """
         Query timeseries data.
         """
@@ -24,6 +24,11 @@ class TsObject(object):
     """
     The TsObject holds information about Timeseries data, plus the data
     itself.
+
+    Data fetched in the ``'columnar'`` format is held in
+    :attr:`arrays`, an :class:`~collections.OrderedDict` mapping each
+    column name to an array of the column's values, and :attr:`rows`
+    is None.
     """
     def __init__(self, client, table, rows=None, columns=None):
         """
@@ -57,6 +62,8 @@ class TsObject(object):
         else:
             self.columns = columns
 
+        self.arrays = None
+
     def store(self):
         """
         Store the timeseries data in Riak.
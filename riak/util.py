@@ -19,7 +19,7 @@ import sys
 import warnings
 
 from collections import Mapping
-from six import string_types, PY2
+from six import integer_types, string_types, PY2
 
 epoch = datetime.datetime.utcfromtimestamp(0)
 try:
@@ -148,3 +148,24 @@ def str_to_long(value, base=10):
         return long(value, base)  # noqa
     else:
         return int(value, base)
+
+
+def _validate_timeout(timeout, infinity_ok=False):
+    """
+    Raises an exception if the given timeout is an invalid value.
+    """
+    if timeout is None:
+        return
+
+    if timeout == 'infinity':
+        if infinity_ok:
+            return
+        else:
+            raise ValueError(
+                'timeout must be a positive integer '
+                '("infinity" is not valid)')
+
+    if isinstance(timeout, integer_types) and timeout > 0:
+        return
+
+    raise ValueError('timeout must be a positive integer')